@@ -0,0 +1,467 @@
+'''
+Cover art for published tracks, out of the audio file's own tags.
+
+ArtSink sits with the other output sinks but only hands the track's path to
+ArtWorker, whose thread does the slow part: reading tags off what may well be a USB
+drive. Only the tag blocks are read, never the audio: ID3v2 (MP3, and AIFF/WAV with
+an ID3 chunk), FLAC PICTURE blocks and the 'covr' atom of MP4 files (M4A, ALAC).
+
+The front cover is written next to the text output as <name>-cover.jpg, plus a
+<name>-cover-<size>.jpg per configured size. Scaling needs Pillow, which is optional
+and imported on first need; without it just the full size image is written, as
+found in the tags. When a track has no art its files are removed, so an overlay can hide them.
+
+ArtCache keeps images by path, mtime and size of the audio file: the last few in
+memory, and all of them, scaled variants included, in a folder with a size cap
+that drops the least recently used first. A track coming back, in this run or a
+later one, costs a stat and a copy.
+'''
+
+import hashlib
+import io
+import os
+import struct
+import threading
+import traceback
+from collections import OrderedDict, namedtuple
+from time import perf_counter
+
+from output import Sink, atomic_write
+
+MEMORY_BYTES = 16 << 20  # images kept in memory
+ENTRY_COST = 4096  # disk use counted per cached file on top of its size, so no-art markers count too
+TAG_LIMIT = 32 << 20  # tag blocks bigger than this are taken for garbage
+FRONT_COVER = 3  # ID3v2/FLAC picture type
+JPEG_QUALITY = 85
+NO_ART = b''  # cached for tracks that have none, so they aren't read again
+
+ArtConf = namedtuple('ArtConf', 'sizes cachedir limit')  # variant sizes in px, cache folder, its cap in bytes
+
+pillow = None  # PIL.Image once imported, False if it isn't installed
+
+
+class ArtSink(Sink):  # cover art next to the text output; the work happens on an ArtWorker
+    def __init__(self, path, worker, conf):
+        super().__init__(path)
+        self.target = os.path.splitext(path)[0]
+        self.worker = worker
+        self.conf = conf
+
+    @property
+    def key(self):
+        return type(self), self.path, self.conf
+
+    def write(self, text, rec):
+        self.worker.submit(self.target, rec.path if rec is not None and text else '', self.conf)
+        return False  # not written yet; ArtWorker reports when it is
+
+
+class ArtWorker:  # extracts, scales, caches and writes cover art on its own thread
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = OrderedDict()  # target -> newest (path, conf) not done yet
+        self.busy = False
+        self.thread = None
+        self.cache = None
+        self.written = {}  # output file -> cache name of the image in it
+        self.report = None  # report(seconds) after each track's art is written, if set
+
+    def submit(self, target, path, conf):  # queue a track's art; a newer track for the same target replaces it
+        with self.cond:
+            self.pending[target] = (path, conf)
+            self.pending.move_to_end(target)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='artwork', daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def flush(self, timeout=None):  # wait until everything submitted so far is written
+        with self.cond:
+            return self.cond.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending)
+                target, (path, conf) = self.pending.popitem(last=False)
+                self.busy = True
+            t0 = perf_counter()
+            try:
+                self._write(target, path, conf)
+            except Exception:  # a broken file must not take the worker down
+                traceback.print_exc()
+            if self.report is not None:
+                self.report(perf_counter() - t0)
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+    def _write(self, target, path, conf):
+        if self.cache is None or self.cache.directory != conf.cachedir:
+            self.cache = ArtCache(conf.cachedir, conf.limit)
+        self.cache.limit = conf.limit
+        images = self.images(locate(path), conf.sizes) if path else {}
+        for size in (0,) + conf.sizes:
+            out = '%s-cover%s.jpg' % (target, '-%d' % size if size else '')
+            name, data = images.get(size, (None, None))
+            if name == self.written.get(out, ''):
+                continue
+            try:
+                if name is None:
+                    os.remove(out)
+                else:
+                    atomic_write(out, data)
+                    print("writing artwork...")
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print("could not write %s: %s" % (out, e))
+                continue
+            self.written[out] = name
+
+    def images(self, path, sizes):  # {size: (cache name, jpeg)} for path's art, size 0 being full size
+        try:
+            st = os.stat(path)
+        except OSError:
+            return {}
+        digest = hashlib.sha1(('%s\0%d\0%d' % (path, st.st_mtime_ns, st.st_size)).encode('utf-8',
+                                                                                          'surrogatepass'))
+        digest = digest.hexdigest()[:24]
+        name = digest + '.jpg'
+        original = self.cache.get(name)
+        if original is None:
+            original = extract(path)
+            self.cache.put(name, original)
+        if not original:
+            return {}
+        images = {0: (name, original)}
+        for size in sizes:
+            name = '%s-%d.jpg' % (digest, size)
+            data = self.cache.get(name)
+            if data is None:
+                data = scaled(original, size)
+                if data is None:  # no Pillow
+                    break
+                self.cache.put(name, data)
+            if data:
+                images[size] = (name, data)
+        return images
+
+
+class ArtCache:  # images by name: an LRU in memory over a size-capped folder
+    def __init__(self, directory, limit):
+        self.directory = directory
+        self.limit = limit  # bytes on disk
+        self.memory = OrderedDict()  # name -> bytes
+        self.held = 0  # bytes in memory
+        self.files = None  # name -> cost on disk, least recently used first; listed on first use
+        self.used = 0
+
+    def get(self, name):  # bytes, NO_ART for a track known to have none, or None if not cached
+        data = self.memory.get(name)
+        if data is not None:
+            self.memory.move_to_end(name)
+            if name in self._listed():
+                self.files.move_to_end(name)
+            return data
+        if name not in self._listed():
+            return None
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path)  # recently used, for the next run's listing
+        except OSError:
+            self._forget(name)
+            return None
+        self.files.move_to_end(name)
+        self._remember(name, data)
+        return data
+
+    def put(self, name, data):
+        self._remember(name, data)
+        files = self._listed()
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            atomic_write(os.path.join(self.directory, name), data)
+        except OSError as e:
+            print("could not cache artwork: %s" % e)
+            return
+        self.used -= files.pop(name, 0)
+        files[name] = len(data) + ENTRY_COST
+        self.used += files[name]
+        while self.used > self.limit and len(files) > 1:
+            old = next(iter(files))
+            try:
+                os.remove(os.path.join(self.directory, old))
+            except OSError:
+                pass
+            self._forget(old)
+
+    def _listed(self):
+        if self.files is None:
+            entries = []
+            try:
+                with os.scandir(self.directory) as it:
+                    for entry in it:
+                        if entry.is_file() and not entry.name.startswith('.'):
+                            st = entry.stat()
+                            entries.append((st.st_mtime, entry.name, st.st_size + ENTRY_COST))
+            except OSError:  # not created yet
+                pass
+            self.files = OrderedDict((name, cost) for _, name, cost in sorted(entries))
+            self.used = sum(self.files.values())
+        return self.files
+
+    def _forget(self, name):
+        cost = self.files.pop(name, None)
+        if cost is not None:
+            self.used -= cost
+        data = self.memory.pop(name, None)
+        if data is not None:
+            self.held -= len(data)
+
+    def _remember(self, name, data):
+        old = self.memory.pop(name, None)
+        if old is not None:
+            self.held -= len(old)
+        self.memory[name] = data
+        self.held += len(data)
+        while self.held > MEMORY_BYTES and len(self.memory) > 1:
+            self.held -= len(self.memory.popitem(last=False)[1])
+
+
+def locate(path):  # the database keeps paths relative to the volume root
+    if not os.path.isabs(path) and os.sep == '/':
+        return '/' + path
+    return path
+
+
+def extract(path):  # the track's front cover as JPEG, or NO_ART
+    try:
+        data = embedded(path)
+    except (OSError, ValueError, IndexError, struct.error) as e:
+        print("could not read artwork from %s: %s" % (path, e))
+        return NO_ART
+    if data is None:
+        return NO_ART
+    if data[:3] != b'\xff\xd8\xff' and loadpillow():  # PNG and such, so <name>-cover.jpg is what it says
+        data = encode(data, None) or data
+    return data
+
+
+def scaled(data, size):  # data fit into size x size as JPEG, NO_ART if it can't be read, None without Pillow
+    if not loadpillow():
+        return None
+    return encode(data, size)
+
+
+def encode(data, size):
+    try:
+        img = pillow.open(io.BytesIO(data))
+        if size:
+            img.draft('RGB', (size, size))  # lets JPEGs decode at a fraction of their size
+            img = img.convert('RGB')
+            img.thumbnail((size, size))
+        else:
+            img = img.convert('RGB')
+        buf = io.BytesIO()
+        img.save(buf, 'JPEG', quality=JPEG_QUALITY)
+        return buf.getvalue()
+    except (OSError, ValueError) as e:
+        print("could not scale artwork: %s" % e)
+        return NO_ART
+
+
+def loadpillow():
+    global pillow
+    if pillow is None:
+        try:
+            from PIL import Image
+            pillow = Image
+        except ImportError:
+            print("Pillow is not installed: artwork is written at full size only")
+            pillow = False
+    return pillow
+
+
+# TAG READERS ####
+def embedded(path):  # image bytes of the front cover (or else the first picture), None if there's none
+    with open(path, 'rb') as f:
+        head = f.read(12)
+        start = 0
+        if head[:3] == b'ID3':
+            found = id3(f, 0)
+            if found is not None:
+                return found
+            # FLAC files sometimes carry an ID3 tag in front
+            start = 10 + syncsafe(head[6:10]) + (10 if head[5] & 0x10 else 0)
+            f.seek(start)
+            head = f.read(12)
+        if head[:4] == b'fLaC':
+            f.seek(start + 4)
+            return flac(f)
+        if head[4:8] == b'ftyp':
+            return mp4(f, os.fstat(f.fileno()).st_size)
+        if head[:4] == b'FORM' and head[8:12] in (b'AIFF', b'AIFC'):
+            return iff(f, '>I')
+        if head[:4] == b'RIFF' and head[8:12] == b'WAVE':
+            return iff(f, '<I')
+    return None
+
+
+def pick(pictures):  # pictures: (type, data)
+    for ptype, data in pictures:
+        if ptype == FRONT_COVER and data:
+            return data
+    for ptype, data in pictures:
+        if data:
+            return data
+    return None
+
+
+def syncsafe(b):  # 7 bits per byte
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def id3(f, pos):  # the ID3v2 tag at pos
+    f.seek(pos)
+    head = f.read(10)
+    version, flags, size = head[3], head[5], syncsafe(head[6:10])
+    if version not in (2, 3, 4) or size > TAG_LIMIT:
+        return None
+    data = f.read(size)
+    if flags & 0x80 and version < 4:  # whole tag unsynchronised
+        data = data.replace(b'\xff\x00', b'\xff')
+    start = 0
+    if flags & 0x40 and version > 2:  # extended header
+        start = struct.unpack('>I', data[:4])[0] + 4 if version == 3 else syncsafe(data[:4])
+    pictures = []
+    for fid, body in id3frames(data, start, version):
+        if fid in (b'APIC', b'PIC'):
+            pictures.append(apic(body, version))
+    return pick(pictures)
+
+
+def id3frames(data, pos, version):  # (frame id, body)
+    idlen, headlen = (3, 6) if version == 2 else (4, 10)
+    while pos + headlen <= len(data):
+        fid = data[pos:pos + idlen]
+        if fid[0] == 0:  # padding
+            return
+        if version == 2:
+            size, flags = int.from_bytes(data[pos + 3:pos + 6], 'big'), 0
+        else:
+            size = syncsafe(data[pos + 4:pos + 8]) if version == 4 else struct.unpack_from('>I', data, pos + 4)[0]
+            flags = data[pos + 9]
+        body = data[pos + headlen:pos + headlen + size]
+        pos += headlen + size
+        if version == 3:
+            if flags & 0xc0:  # compressed or encrypted
+                continue
+            if flags & 0x20:  # group id
+                body = body[1:]
+        elif version == 4:
+            if flags & 0x0c:
+                continue
+            if flags & 0x40:
+                body = body[1:]
+            if flags & 0x01:  # data length indicator
+                body = body[4:]
+            if flags & 0x02:
+                body = body.replace(b'\xff\x00', b'\xff')
+        yield fid, body
+
+
+def apic(body, version):  # (picture type, data) of an APIC/PIC frame
+    encoding = body[0]
+    if version == 2:  # 3 character image format instead of a MIME type
+        pos = 4
+    else:
+        pos = body.index(b'\0', 1) + 1
+    ptype = body[pos]
+    pos += 1
+    if encoding in (1, 2):  # UTF-16 description, ended by an aligned double zero
+        end = pos
+        while True:
+            end = body.index(b'\0\0', end)
+            if (end - pos) % 2 == 0:
+                break
+            end += 1
+        pos = end + 2
+    else:
+        pos = body.index(b'\0', pos) + 1
+    return ptype, body[pos:]
+
+
+def flac(f):  # PICTURE metadata blocks, f just past 'fLaC'
+    pictures = []
+    while True:
+        head = f.read(4)
+        if len(head) < 4:
+            break
+        btype, length = head[0] & 0x7f, int.from_bytes(head[1:4], 'big')
+        if btype == 6:
+            block = f.read(length)
+            ptype, mlen = struct.unpack_from('>II', block, 0)
+            pos = 8 + mlen
+            dlen = struct.unpack_from('>I', block, pos)[0]
+            pos += 4 + dlen + 16  # description, then width, height, depth and colours
+            size = struct.unpack_from('>I', block, pos)[0]
+            pictures.append((ptype, block[pos + 4:pos + 4 + size]))
+        else:
+            f.seek(length, 1)
+        if head[0] & 0x80:  # last metadata block
+            break
+    return pick(pictures)
+
+
+def atoms(f, start, end):  # (type, body start, end) of each MP4 atom in [start, end)
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, kind = struct.unpack('>I4s', f.read(8))
+        head = 8
+        if size == 1:
+            size, head = struct.unpack('>Q', f.read(8))[0], 16
+        elif size == 0:
+            size = end - pos
+        if size < head:
+            return
+        yield kind, pos + head, pos + size
+        pos += size
+
+
+def mp4(f, size):  # moov/udta/meta/ilst/covr, seeking past the audio
+    start, end = 0, size
+    for name in (b'moov', b'udta', b'meta', b'ilst', b'covr'):
+        for kind, body, stop in atoms(f, start, end):
+            if kind == name:
+                start, end = body, stop
+                if name == b'meta':
+                    f.seek(body + 4)
+                    if f.read(4) != b'hdlr':  # iTunes style: a full box with 4 bytes of version and flags
+                        start += 4
+                break
+        else:
+            return None
+    pictures = []
+    for kind, body, stop in atoms(f, start, end):
+        if kind == b'data' and 8 < stop - body <= TAG_LIMIT:
+            f.seek(body + 8)  # type and locale
+            pictures.append((FRONT_COVER, f.read(stop - body - 8)))
+    return pick(pictures)
+
+
+def iff(f, fmt):  # AIFF/WAV: the ID3 chunk, if any
+    f.seek(0, os.SEEK_END)
+    end = f.tell()
+    pos = 12
+    while pos + 8 <= end:
+        f.seek(pos)
+        cid = f.read(4)
+        size = struct.unpack(fmt, f.read(4))[0]
+        if cid in (b'ID3 ', b'id3 '):
+            return id3(f, pos + 8)
+        pos += 8 + size + (size & 1)
+    return None
@@ -0,0 +1,10 @@
+'''
+Benchmarks for the Now Playing hot paths.
+
+Run from the Serato-Now-Playing folder, e.g.:
+    python -m benchmarks.bench_session
+
+bench_stages times every stage of a poll against regression thresholds and exits
+non-zero when one got slower. replay runs the whole app against a simulated Serato
+session and reports missed tracks, false positives and latency percentiles.
+'''
@@ -0,0 +1,95 @@
+'''
+Cover art: pulling it out of MP3, FLAC and M4A files of album-track size compared
+with reading the whole file, then the same track again from the memory cache and
+from the disk cache of a fresh worker (the next run), and whether the disk cache
+stays under its cap.
+'''
+
+import io
+import os
+import tempfile
+from contextlib import redirect_stdout
+from timeit import default_timer as timer
+
+from artwork import ArtCache, ArtConf, ArtSink, ArtWorker, ENTRY_COST, embedded
+from session import TrackRecord
+from benchmarks import synth
+
+AUDIO_MB = (10, 50)
+ART_KB = 500
+REPEATS = 20
+CAP_TRACKS = 40  # tracks with art pushed through a cache capped at a quarter of that
+
+
+def per_call(fn, calls=REPEATS):
+    t0 = timer()
+    for _ in range(calls):
+        fn()
+    return (timer() - t0) / calls
+
+
+def whole(path):
+    with open(path, 'rb') as f:
+        while f.read(1 << 20):
+            pass
+
+
+def run():
+    art = synth.jpeg(ART_KB << 10)
+    print('%-14s %14s %14s %14s %14s' % ('file', 'read all ms', 'extract ms', 'memory us', 'disk us'))
+    with tempfile.TemporaryDirectory() as tmp:
+        conf = ArtConf((), os.path.join(tmp, 'cache'), 256 << 20)
+        for mb in AUDIO_MB:
+            for kind in ('mp3', 'flac', 'm4a'):
+                path = os.path.join(tmp, '%d.%s' % (mb, kind))
+                with open(path, 'wb') as f:
+                    f.write(getattr(synth, kind)(art, mb << 20))
+                assert embedded(path) == art
+
+                read = per_call(lambda: whole(path), 3)
+                extract = per_call(lambda: embedded(path))
+                worker = ArtWorker()
+                worker.cache = ArtCache(conf.cachedir, conf.limit)
+                worker.images(path, ())
+                memory = per_call(lambda: worker.images(path, ()), 1000)
+
+                def disk():
+                    worker.cache = ArtCache(conf.cachedir, conf.limit)
+                    assert worker.images(path, ())[0][1] == art
+                print('%-14s %14.2f %14.2f %14.1f %14.1f' % ('%d MB %s' % (mb, kind), read * 1e3, extract * 1e3,
+                                                          memory * 1e6, per_call(disk) * 1e6))
+
+        # whole path: ArtSink on the output thread -> worker -> <name>-cover.jpg
+        worker = ArtWorker()
+        sink = ArtSink(os.path.join(tmp, 'nowplaying.txt'), worker, conf)
+        rec = TrackRecord('Björk', 'Jóga')
+        rec.path = os.path.join(tmp, '50.flac')
+        t0 = timer()
+        sink.write('Björk - Jóga', rec)
+        queued = timer() - t0
+        worker.flush()
+        total = timer() - t0
+        with open(os.path.join(tmp, 'nowplaying-cover.jpg'), 'rb') as f:
+            assert f.read() == art
+        print('sink write returns in %.1f us, cover written after %.2f ms' % (queued * 1e6, total * 1e3))
+
+        limit = CAP_TRACKS * (ART_KB << 10) // 4
+        capped = ArtConf((), os.path.join(tmp, 'capped'), limit)
+        with redirect_stdout(io.StringIO()):
+            for i in range(CAP_TRACKS):
+                path = os.path.join(tmp, 'track%d.mp3' % i)
+                with open(path, 'wb') as f:
+                    f.write(synth.mp3(art[:-2] + bytes((i,)) + art[-1:], 1 << 16))
+                rec.path = path
+                sink = ArtSink(os.path.join(tmp, 'capped.txt'), worker, capped)
+                sink.write('track %d' % i, rec)
+                worker.flush()
+        used = sum(os.path.getsize(os.path.join(capped.cachedir, name)) + ENTRY_COST
+                   for name in os.listdir(capped.cachedir))
+        print('disk cache after %d tracks: %.1f MB of %.1f MB allowed' % (CAP_TRACKS, used / 2 ** 20,
+                                                                          limit / 2 ** 20))
+        assert used <= limit
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,107 @@
+'''
+UdpSink against a local receiver: what a track change costs the output thread,
+for a new track (encode and send) and for one coming back from the render cache
+(send only), in OSC and JSON, to one destination and to four. The receiver checks
+every datagram arrived whole and measures send-to-receive latency.
+'''
+
+import socket
+import threading
+from time import perf_counter
+
+from broadcast import UdpConf, UdpSink, osc
+from session import TrackRecord
+from benchmarks import synth
+
+CHANGES = 2000
+DISTINCT = 4  # tracks cycled through for the cached case, within the render cache
+
+
+class Receiver:  # counts datagrams on a local port and when each arrived
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.5)
+        self.port = self.sock.getsockname()[1]
+        self.arrived = []  # (perf_counter, payload)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except socket.timeout:
+                continue
+            except OSError:  # closed
+                return
+            self.arrived.append((perf_counter(), data))
+
+    def close(self):
+        self.sock.close()
+        self.thread.join()
+
+
+def records(n):
+    recs = []
+    for i in range(n):
+        rec = TrackRecord.from_text('%s - %s %d' % (synth.ARTISTS[i % len(synth.ARTISTS)],
+                                                    synth.TITLES[i % len(synth.TITLES)], i))
+        rec.album, rec.genre, rec.bpm, rec.key, rec.deck = 'Discovery', 'House', '124.00', 'Am', 1 + i % 2
+        recs.append(('%s - %s' % (rec.artist, rec.title), rec))
+    return recs
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def measure(fmt, receivers, cached):  # (send us p50, p99, latency us p50, datagrams lost)
+    for r in receivers:
+        r.arrived.clear()
+    sink = UdpSink(UdpConf(tuple(('127.0.0.1', r.port) for r in receivers), fmt))
+    tracks = records(DISTINCT if cached else CHANGES)
+    sink.write(*tracks[0])  # resolve and open the socket outside the timing
+    for r in receivers:
+        while not r.arrived:
+            pass
+        r.arrived.clear()
+    costs, sent = [], []
+    for i in range(CHANGES):
+        text, rec = tracks[i % len(tracks)]
+        t0 = perf_counter()
+        sink.write(text, rec)
+        t1 = perf_counter()
+        costs.append(t1 - t0)
+        sent.append(t0)
+        while len(receivers[-1].arrived) <= i:  # one change at a time, like a DJ set, only faster
+            pass
+    latencies = [at - t0 for r in receivers for t0, (at, _) in zip(sent, r.arrived)]
+    lost = sum(CHANGES - len(r.arrived) for r in receivers) + sink.dropped
+    for r in receivers:
+        assert all(data == sink.rendered(*tracks[i % len(tracks)]) for i, (_, data) in enumerate(r.arrived))
+    return percentile(costs, 0.5) * 1e6, percentile(costs, 0.99) * 1e6, percentile(latencies, 0.5) * 1e6, lost
+
+
+def run():
+    text, rec = records(1)[0]
+    print('payload: osc %d bytes, json %d bytes' % (len(osc(text, rec)),
+                                                    len(UdpSink(UdpConf((), 'json')).render(text, rec))))
+    receivers = [Receiver() for _ in range(4)]
+    print('%-5s %-5s %-7s %14s %14s %16s %5s' % ('fmt', 'dests', 'track', 'write p50 us', 'write p99 us',
+                                                 'receive p50 us', 'lost'))
+    for fmt in ('osc', 'json'):
+        for n in (1, 4):
+            for cached in (False, True):
+                p50, p99, latency, lost = measure(fmt, receivers[:n], cached)
+                print('%-5s %-5d %-7s %14.1f %14.1f %16.1f %5d' % (fmt, n, 'cached' if cached else 'new', p50, p99,
+                                                                    latency, lost))
+                assert lost == 0 and p99 < 1000, 'a send cost a millisecond or more, or was lost'
+    for r in receivers:
+        r.close()
+
+
+if __name__ == '__main__':
+    run()
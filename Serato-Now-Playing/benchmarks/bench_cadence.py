@@ -0,0 +1,72 @@
+'''
+Remote polling on a simulated clock: the fixed interval against the Cadence
+learned from track changes, over sets with steady, varied and mixed track lengths
+(the last with the odd track cut short after a minute or so).
+
+For each it prints HTTP requests per hour and how long a change on the playlist
+page took to be seen, on average and at the 95th percentile.
+'''
+
+import random
+from bisect import bisect_right
+
+from watcher import Cadence
+
+HOURS = 4
+INTERVAL = 10  # the default interval
+BOUNDS = (2, 30)  # the default interval_min, interval_max
+SEEDS = (1, 2, 3, 4, 5)
+
+
+def lengths(kind, rng):  # track lengths in seconds, enough for the set
+    out, total = [], 0
+    while total < HOURS * 3600:
+        if kind == 'steady':
+            length = rng.gauss(240, 30)
+        elif kind == 'varied':
+            length = rng.uniform(120, 420)
+        else:
+            length = rng.uniform(30, 90) if rng.random() < 0.1 else rng.gauss(270, 60)
+        out.append(max(20, length))
+        total += out[-1]
+    return out
+
+
+def poll(changes, cadence, rng):  # (requests, [latency per change seen])
+    t = rng.uniform(0, INTERVAL)
+    seen = requests = 0
+    latencies = []
+    while t < changes[-1]:
+        requests += 1
+        current = bisect_right(changes, t)
+        if cadence is not None:
+            cadence.changed(t, current - seen)
+        if current > seen:
+            latencies.append(t - changes[current - 1])
+            seen = current
+        t += INTERVAL if cadence is None else cadence.step(t)
+    return requests, latencies
+
+
+def run():
+    print('%-7s %-9s %10s %9s %9s' % ('set', 'polling', 'req/hour', 'mean s', 'p95 s'))
+    for kind in ('steady', 'varied', 'mixed'):
+        for name in ('fixed', 'adaptive'):
+            requests, latencies, hours = 0, [], 0
+            for seed in SEEDS:
+                rng = random.Random(seed)
+                changes, t = [], 0
+                for length in lengths(kind, rng):
+                    t += length
+                    changes.append(t)
+                n, lat = poll(changes, Cadence(INTERVAL, *BOUNDS) if name == 'adaptive' else None, rng)
+                requests += n
+                latencies += lat
+                hours += changes[-1] / 3600
+            latencies.sort()
+            print('%-7s %-9s %10.0f %9.1f %9.1f' % (kind, name, requests / hours, sum(latencies) / len(latencies),
+                                                    latencies[int(0.95 * len(latencies))]))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,65 @@
+'''
+Restarting mid-set: the first poll of a fresh process with and without the
+warm-start state, against a big History folder and a long current session, plus
+what saving the state after a publish costs.
+'''
+
+import os
+import tempfile
+from time import time
+from timeit import default_timer as timer
+
+from checkpoint import Checkpoint, capture, restore
+from session import SessionIndex, SessionReader
+from benchmarks import synth
+
+HISTORY_FILES = 5000
+SESSION_MB = 32
+RUNS = 20
+
+
+def first_poll(directory, index, reader):
+    path = index.newest(directory)
+    return reader.decode(path, reader.last_chunk(path))
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = synth.history(os.path.join(tmp, '_Serato_'), HISTORY_FILES)
+        path = os.path.join(directory, '%d.session' % HISTORY_FILES)
+        with open(path, 'wb') as f:
+            f.write(synth.sized(SESSION_MB << 20))
+            f.write(synth.track(1000000, 'Sigur Rós', 'Hoppípolla'))
+        os.utime(directory, (0, 0))  # listed long ago, as after a restart
+
+        index, reader = SessionIndex(), SessionReader()
+        assert first_poll(directory, index, reader).title == 'Hoppípolla'
+        statefile = os.path.join(tmp, 'state.json')
+        ckpt = Checkpoint()
+        t0 = timer()
+        for i in range(RUNS):
+            ckpt.saved = None
+            ckpt.save(statefile, {'time': i, 'text': 'Sigur Rós - Hoppípolla', 'session': capture(index, reader)})
+        save = (timer() - t0) / RUNS
+        ckpt.save(statefile, {'time': time(), 'session': capture(index, reader)})
+
+        t0 = timer()
+        for _ in range(RUNS):
+            assert first_poll(directory, SessionIndex(), SessionReader()).title == 'Hoppípolla'
+        cold = (timer() - t0) / RUNS
+
+        t0 = timer()
+        for _ in range(RUNS):
+            index, reader = SessionIndex(), SessionReader()
+            assert restore(index, reader, ckpt.load(statefile), directory)
+            assert first_poll(directory, index, reader).title == 'Hoppípolla'
+        warm = (timer() - t0) / RUNS
+
+    print('%d sessions in History, %d MB current session' % (HISTORY_FILES, SESSION_MB))
+    print('first poll, cold start   %8.2f ms' % (cold * 1e3))
+    print('first poll, warm start   %8.2f ms  (load + validate state included)' % (warm * 1e3))
+    print('state save               %8.1f us' % (save * 1e6))
+
+
+if __name__ == '__main__':
+    run()
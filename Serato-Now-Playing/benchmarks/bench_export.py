@@ -0,0 +1,66 @@
+'''
+Exporting a multi-year History: the first export to SQLite one file at a time and
+in the process pool, a re-run with nothing changed, one after the current session
+grew, and a CSV export.
+'''
+
+import os
+import sqlite3
+import tempfile
+from timeit import default_timer as timer
+
+from export import export
+from benchmarks import synth
+
+FILES = 1000  # about three years of weekly gigs
+TRACKS = 60  # per session
+
+
+def timed(fn):
+    t0 = timer()
+    result = fn()
+    return timer() - t0, result
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = synth.history(os.path.join(tmp, '_Serato_'), FILES, TRACKS)
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        played = sum(1 for row in range(1, TRACKS + 1) if row % 7)  # deckset() pulls every 7th off unplayed
+        print('%d session files, %.1f MB, %d plays' % (FILES, size / 2 ** 20, FILES * played))
+
+        serial = os.path.join(tmp, 'serial.db')
+        took, (done, skipped, written) = timed(lambda: export(directory, serial, workers=1))
+        print('sqlite, one process     %8.2f s' % took)
+
+        db = os.path.join(tmp, 'setlists.db')
+        took, (done, skipped, written) = timed(lambda: export(directory, db))
+        print('sqlite, process pool    %8.2f s  (%d files, %d plays)' % (took, done, written))
+        assert written == FILES * played
+
+        took, (done, skipped, written) = timed(lambda: export(directory, db))
+        print('re-run, nothing changed %8.3f s  (%d parsed, %d skipped)' % (took, done, skipped))
+        assert done == 0
+
+        with open(os.path.join(directory, '%d.session' % FILES), 'ab') as f:
+            f.write(synth.track(TRACKS + 1, 'Björk', 'Jóga'))
+        took, (done, skipped, written) = timed(lambda: export(directory, db))
+        print('re-run, one file grew   %8.3f s  (%d parsed, %d skipped)' % (took, done, skipped))
+        assert done == 1
+
+        with sqlite3.connect(db) as conn:
+            count, = conn.execute('SELECT count(*) FROM plays').fetchone()
+            t0 = timer()
+            top = conn.execute('SELECT artist, title, count(*) AS n FROM plays GROUP BY artist COLLATE NOCASE, '
+                               'title COLLATE NOCASE ORDER BY n DESC LIMIT 10').fetchall()
+            query = timer() - t0
+        conn.close()
+        assert count == FILES * played + 1, count
+        print('top 10 query            %8.3f s  (%s - %s, %d plays)' % (query, top[0][0], top[0][1], top[0][2]))
+
+        took, (done, skipped, written) = timed(lambda: export(directory, os.path.join(tmp, 'setlists.csv')))
+        print('csv, process pool       %8.2f s  (%d plays)' % (took, written))
+
+
+if __name__ == '__main__':
+    run()
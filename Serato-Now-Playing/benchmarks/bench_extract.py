@@ -0,0 +1,60 @@
+'''
+Cost of pulling the newest track name(s) out of a live playlist page.
+
+"xpath" is what remote mode used to do (html.fromstring + XPath over the whole
+DOM), "target" runs the whole page through the streaming parser target, and
+"incremental" is PlaylistExtractor on a page that grew by one track since the
+previous poll.
+'''
+
+from timeit import default_timer as timer
+
+from lxml import html
+
+from remote import PlaylistExtractor
+from benchmarks import synth
+
+SIZES = (10, 100, 1000)
+ROUNDS = 50
+
+
+def xpath(page):
+    tree = html.fromstring(page)
+    return tree.xpath('(//div[@class="playlist-trackname"]/text())[last()]')
+
+
+def timed(fn, *args):
+    t0 = timer()
+    for _ in range(ROUNDS):
+        fn(*args)
+    return (timer() - t0) / ROUNDS * 1e6
+
+
+def run():
+    print('%8s %10s %12s %12s %14s' % ('tracks', 'page KB', 'xpath us', 'target us', 'incremental us'))
+    for n in SIZES:
+        before = synth.playlist_html(n - 1)
+        page = synth.playlist_html(n)
+        extractor = PlaylistExtractor()
+
+        def incremental():
+            extractor.reset()
+            extractor.extract(before)
+            t0 = timer()
+            names = extractor.extract(page)
+            elapsed = timer() - t0
+            assert [s.strip() for s in names] == [xpath(page)[0].strip()]
+            return elapsed
+
+        inc = sum(incremental() for _ in range(ROUNDS)) / ROUNDS * 1e6
+        print('%8d %10d %12.1f %12.1f %14.1f' % (n, len(page) // 1024, timed(xpath, page),
+                                                 timed(extractor.parse, page), inc))
+
+    # several tracks between two polls are all reported
+    extractor = PlaylistExtractor()
+    extractor.extract(synth.playlist_html(20))
+    print('reported after a 3 track gap:', [s.strip() for s in extractor.extract(synth.playlist_html(23))])
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,73 @@
+'''
+database V2 lookups: building the index, looking up a track per change, and
+re-indexing after Serato appended tracks or rewrote the file. "stale us" is an
+enrich() right after Serato rewrote the file in place: it is answered from the old
+index while the new one is built in the background, so it must stay in microseconds.
+'''
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+from library import Library
+from session import TrackRecord
+from benchmarks import synth
+
+SIZES = (1000, 20000, 100000)  # tracks in the library
+LOOKUPS = 2000
+APPENDED = 100
+
+
+def run():
+    print('%8s %9s %12s %12s %12s %14s %12s' % ('tracks', 'size MB', 'index ms', 'lookup us', 'enrich us',
+                                                 'append ms', 'stale us'))
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'database V2')
+        for n in SIZES:
+            with open(path, 'wb') as f:
+                f.write(synth.database(n))
+            lib = Library(path)
+
+            t0 = timer()
+            lib.refresh()
+            build = timer() - t0
+
+            t0 = timer()
+            for row in range(1, LOOKUPS + 1):
+                i = row * 7919 % n + 1  # spread over the library, mostly cache misses
+                track = lib.lookup('/Music/%s %d - %s.mp3' % (synth.ARTISTS[i % 7], i, synth.TITLES[i % 7]))
+            lookup = (timer() - t0) / LOOKUPS
+            assert track is not None and track.bpm == '%d.00' % (100 + i % 40), track
+
+            t0 = timer()
+            for row in range(1, LOOKUPS + 1):
+                i = row % n + 1
+                rec = TrackRecord('%s %d' % (synth.ARTISTS[i % 7], i), synth.TITLES[i % 7])  # by name, no path
+                lib.enrich(rec)
+            enrich = (timer() - t0) / LOOKUPS
+            assert rec.key == 'Am', rec.key
+
+            with open(path, 'ab') as f:
+                f.write(synth.database(APPENDED, n + 1)[len(synth.database(0)):])
+            t0 = timer()
+            lib.refresh()
+            append = timer() - t0
+            assert lib.lookup(artist='%s %d' % (synth.ARTISTS[(n + 1) % 7], n + 1),
+                              title=synth.TITLES[(n + 1) % 7]) is not None
+
+            with open(path, 'r+b') as f:  # one byte rewritten in place, e.g. a track flagged as played
+                f.seek(os.path.getsize(path) // 2)
+                f.write(b'\0')
+            rec = TrackRecord('%s %d' % (synth.ARTISTS[1], 1), synth.TITLES[1])
+            t0 = timer()
+            lib.enrich(rec)
+            stale = timer() - t0
+            assert rec.key == 'Am', rec.key
+
+            print('%8d %9.1f %12.1f %12.1f %12.1f %14.2f %12.1f' % (n, os.path.getsize(path) / 2 ** 20, build * 1000,
+                                                                    lookup * 1e6, enrich * 1e6, append * 1000,
+                                                                    stale * 1e6))
+
+
+if __name__ == '__main__':
+    run()
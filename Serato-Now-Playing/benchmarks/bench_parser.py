@@ -0,0 +1,61 @@
+'''
+Throughput of decoding 'oent' chunks into TrackRecords.
+
+parse_track() walks the adat fields over a memoryview; "legacy" is the marker
+search getlasttrack() used to run over the latin-1 decoded chunk, for comparison.
+The legacy search only pulls two fields and garbles anything outside latin-1, so
+it is a lower bound rather than a like-for-like number.
+'''
+
+from timeit import default_timer as timer
+
+from session import CHUNK_HEAD, TRACK_TAG, iter_tracks, parse_track, walk_chunks
+from benchmarks import synth
+
+SIZES = (1000, 5000, 20000)
+
+
+def legacy(byt):
+    sx = byt.find('\x00\x00\x00\x00\x06')
+    sy = byt.find('\x00\x00\x00\x00\x07')
+    ax = byt.find('\x00\x00\x00\x00\x07')
+    ay = byt.find('\x00\x00\x00\x00\x08')
+    return byt[ax + 4:ay].replace('\x00', '')[2:] + ' - ' + byt[sx + 4:sy].replace('\x00', '')[2:]
+
+
+def chunks(buf):  # every oent payload in a session image
+    mv = memoryview(buf)
+    pos = 0
+    while pos < len(mv):
+        tag, length = CHUNK_HEAD.unpack_from(mv, pos)
+        if tag == TRACK_TAG:
+            yield mv[pos + CHUNK_HEAD.size:pos + CHUNK_HEAD.size + length]
+        pos += CHUNK_HEAD.size + length
+
+
+def run():
+    print('%8s %10s %14s %12s %14s' % ('tracks', 'size KB', 'tracks/s', 'MB/s', 'legacy tr/s'))
+    for n in SIZES:
+        buf = synth.session(n)
+        assert walk_chunks(buf, None)[2]
+
+        t0 = timer()
+        count = sum(1 for _ in iter_tracks(buf))
+        elapsed = timer() - t0
+        assert count == n
+
+        t0 = timer()
+        for c in chunks(buf):
+            legacy(bytes(c).decode('latin'))
+        legacy_elapsed = timer() - t0
+
+        print('%8d %10d %14d %12.1f %14d' % (n, len(buf) // 1024, n / elapsed,
+                                             len(buf) / elapsed / 1e6, n / legacy_elapsed))
+
+    # Unicode survives the round trip now
+    rec = parse_track(next(chunks(synth.session(3))))
+    print('sample:', rec, rec.album, rec.start)
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,83 @@
+'''
+PlaylistFetcher against a local stand-in for the Serato Live playlist page.
+
+The server adds a track every few requests and honours If-None-Match, so the run
+shows how many polls are answered with a 304, how many pages actually get parsed,
+and that a hung server costs one timeout followed by backoff rather than a stall.
+'''
+
+import threading
+from time import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from timeit import default_timer as timer
+
+from remote import PlaylistFetcher
+from benchmarks import synth
+
+POLLS = 200
+GROW_EVERY = 10  # requests per new track
+
+
+class Playlist(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    hits = 0
+    connections = set()
+    hang = False
+
+    def do_GET(self):
+        cls = type(self)
+        cls.hits += 1
+        cls.connections.add(self.client_address)
+        if cls.hang:
+            threading.Event().wait(2)
+            return
+        tracks = 1 + cls.hits // GROW_EVERY
+        etag = '"%d"' % tracks
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = synth.playlist_html(tracks).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Playlist)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/playlists/bench/live' % server.server_port
+
+    fetcher = PlaylistFetcher(timeout=(0.5, 0.5), backoff_base=0.2)
+    changed = 0
+    t0 = timer()
+    for _ in range(POLLS):
+        if fetcher.fetch(url) is not None:
+            changed += 1
+    elapsed = timer() - t0
+    print('%d polls in %.3fs (%.2f ms each): %d pages parsed, %d not modified, %d connection(s)' % (
+        POLLS, elapsed, elapsed / POLLS * 1000, changed, POLLS - changed, len(Playlist.connections)))
+
+    Playlist.hang = True
+    t0 = timer()
+    fetcher.fetch(url)  # times out
+    first = timer() - t0
+    t0 = timer()
+    fetcher.fetch(url)  # inside the backoff window, no request at all
+    second = timer() - t0
+    print('hung server: first poll %.2fs (timeout), next poll %.4fs (backing off, retry in %.2fs)' % (
+        first, second, fetcher.retry_at - time()))
+    Playlist.hang = False
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    run()
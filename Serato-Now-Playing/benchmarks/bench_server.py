@@ -0,0 +1,106 @@
+'''
+Load test for the now-playing server: hundreds of local SSE and WebSocket
+subscribers, a burst of track changes published from another thread.
+
+Reports what publish() costs the poller thread and how long each change takes to
+reach every subscriber. The subscribers run in a separate process so they don't
+compete with the app for the GIL, as they wouldn't in real life.
+'''
+
+import asyncio
+import base64
+import multiprocessing
+import os
+import threading
+from time import perf_counter as timer
+
+from history import PlayHistory
+from server import NowPlayingServer
+from session import TrackRecord
+
+SSE_CLIENTS = 250
+WS_CLIENTS = 250
+CHANGES = 20
+
+
+async def sse(port, got):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /events HTTP/1.1\r\nHost: x\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    await reader.readuntil(b'\n\n')  # current track on connect
+    for i in range(CHANGES):
+        await reader.readuntil(b'\n\n')
+        got[i].append(timer())
+    writer.close()
+
+
+async def ws(port, got):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    key = base64.b64encode(os.urandom(16))
+    writer.write(b'GET /ws HTTP/1.1\r\nHost: x\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                 b'Sec-WebSocket-Key: ' + key + b'\r\nSec-WebSocket-Version: 13\r\n\r\n')
+    await reader.readuntil(b'\r\n\r\n')
+    for i in range(-1, CHANGES):
+        b1, n = await reader.readexactly(2)
+        if n == 126:
+            n = int.from_bytes(await reader.readexactly(2), 'big')
+        await reader.readexactly(n)
+        if i >= 0:
+            got[i].append(timer())
+    writer.close()
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def subscribers(port, ready):
+    got = [[] for _ in range(CHANGES)]
+    clients = [asyncio.ensure_future(sse(port, got)) for _ in range(SSE_CLIENTS)] + \
+        [asyncio.ensure_future(ws(port, got)) for _ in range(WS_CLIENTS)]
+    await asyncio.sleep(1)  # let everyone connect
+    ready.set()
+    await asyncio.gather(*clients)
+    return [max(g) for g in got]
+
+
+def client_process(port, ready, results):
+    results.put(asyncio.run(subscribers(port, ready)))
+
+
+def run():
+    server = NowPlayingServer(PlayHistory(), port=0)
+    server.start()
+    ready = multiprocessing.Event()
+    results = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=client_process, args=(server.port, ready, results))
+    proc.start()
+    ready.wait()
+    while server.clients < SSE_CLIENTS + WS_CLIENTS:
+        threading.Event().wait(0.01)
+
+    sent = []
+    cost = []
+    for i in range(CHANGES):  # this thread stands in for the poller
+        t0 = timer()
+        server.publish('Artist %d - Title %d' % (i, i), TrackRecord('Artist %d' % i, 'Title %d' % i))
+        cost.append(timer() - t0)
+        sent.append(t0)
+        threading.Event().wait(0.05)
+
+    received = results.get()
+    proc.join()
+    server.stop()
+
+    latency = [(r - s) * 1000 for r, s in zip(received, sent)]
+    print('%d subscribers (%d SSE, %d WebSocket), %d changes' % (SSE_CLIENTS + WS_CLIENTS, SSE_CLIENTS,
+                                                                 WS_CLIENTS, CHANGES))
+    print('publish() on the poller thread: mean %.1f us, max %.1f us' % (
+        sum(cost) / len(cost) * 1e6, max(cost) * 1e6))
+    print('change reached all subscribers: p50 %.1f ms, p95 %.1f ms, max %.1f ms' % (
+        pct(latency, 0.5), pct(latency, 0.95), max(latency)))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,65 @@
+'''
+Per-poll cost of finding the newest track chunk while a session file grows.
+
+Compares SessionReader (offset tracking + reverse scan on a cold start) with the
+old approach of reading the whole file and splitting it on 'oent' every poll.
+'''
+
+import os
+import tempfile
+from timeit import default_timer as timer
+
+from session import SessionReader
+from benchmarks import synth
+
+SIZES = (100, 1000, 5000, 20000)  # tracks in the session file
+POLLS = 50
+
+
+def legacy(path):
+    with open(path, 'rb') as f:
+        raw = f.read()
+    return raw.decode('latin').rsplit('oent')[-1]
+
+
+def run():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.session')
+        with open(path, 'wb') as f:
+            f.write(synth.header())
+
+        reader = SessionReader()
+        written = 0
+        print('%8s %10s %14s %14s %14s' % ('tracks', 'size KB', 'cold ms', 'poll us', 'legacy us'))
+        for size in SIZES:
+            with open(path, 'ab') as f:
+                for t in synth.tracks(size - written, written + 1):
+                    f.write(t)
+            written = size
+
+            cold = SessionReader()
+            t0 = timer()
+            cold.last_chunk(path)
+            cold_ms = (timer() - t0) * 1000
+
+            reader.last_chunk(path)
+            poll_total = 0
+            for row in range(written + 1, written + POLLS + 1):
+                with open(path, 'ab') as f:  # one new track per poll, like Serato would
+                    f.write(synth.track(row, 'Artist %d' % row, 'Title %d' % row))
+                t0 = timer()
+                reader.last_chunk(path)
+                poll_total += timer() - t0
+            written += POLLS
+
+            t0 = timer()
+            for _ in range(POLLS):
+                legacy(path)
+            legacy_total = timer() - t0
+
+            print('%8d %10d %14.3f %14.1f %14.1f' % (size, os.path.getsize(path) // 1024, cold_ms,
+                                                     poll_total / POLLS * 1e6, legacy_total / POLLS * 1e6))
+
+
+if __name__ == '__main__':
+    run()
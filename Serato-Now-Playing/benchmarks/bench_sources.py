@@ -0,0 +1,77 @@
+'''
+CPU and latency of the multi-source engine as sources are added.
+
+Each round runs N local libraries through one Engine and appends a track to every
+library in turn, then idles. Per-track CPU and per-source idle CPU should stay flat
+as N grows, since a source costs an inotify watch and a timer rather than its own
+thread and event loop. CPU per track includes this script appending and watching
+for the output, which is the same work at every N.
+'''
+
+import os
+import tempfile
+from statistics import median
+from time import perf_counter, process_time, sleep
+
+from output import TextSink
+from sources import Engine, SourceConf
+from template import Template
+from benchmarks import synth
+
+SOURCES = (1, 10, 50, 200)
+ROUNDS = 5  # tracks appended per source
+IDLE = 2  # seconds of idling measured per round
+
+
+def run():
+    tpl = Template('{artist} - {title}')
+    print('%8s %16s %14s %14s %18s' % ('sources', 'CPU us/track', 'p50 ms', 'max ms', 'idle CPU us/s/src'))
+    for n in SOURCES:
+        with tempfile.TemporaryDirectory() as tmp:
+            confs, sessions, outs = [], [], []
+            for i in range(n):
+                lib = os.path.join(tmp, 'lib%d' % i)
+                directory = os.path.join(lib, 'History', 'Sessions')
+                os.makedirs(directory)
+                sessions.append(os.path.join(directory, '1.session'))
+                with open(sessions[-1], 'wb') as f:
+                    f.write(synth.header())
+                outs.append(os.path.join(tmp, 'out%d.txt' % i))
+                confs.append(SourceConf('room %d' % i, True, directory, '', outs[-1], '', '', 10.0, tpl, tpl))
+
+            engine = Engine(lambda conf: [TextSink(conf.file)])
+            engine.configure(confs)
+            engine.start()
+            sleep(0.5)
+
+            lags = []
+            cpu = process_time()
+            for row in range(1, ROUNDS + 1):
+                for i in range(n):
+                    want = 'Björk %d - Jóga %d' % (i, row)
+                    t0 = perf_counter()
+                    with open(sessions[i], 'ab') as f:
+                        f.write(synth.track(row, 'Björk %d' % i, 'Jóga %d' % row))
+                    while True:
+                        try:
+                            with open(outs[i], encoding='utf-8') as f:
+                                if f.read() == want:
+                                    break
+                        except OSError:
+                            pass
+                        sleep(0.0002)
+                    lags.append(perf_counter() - t0)
+            busy = process_time() - cpu
+
+            sleep(0.5)
+            cpu = process_time()
+            sleep(IDLE)
+            idle = process_time() - cpu
+            engine.stop()
+
+            print('%8d %16.0f %14.2f %14.2f %18.1f' % (n, busy / len(lags) * 1e6, median(lags) * 1000,
+                                                       max(lags) * 1000, idle / IDLE / n * 1e6))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,137 @@
+'''
+Every stage of the poll, timed against a regression threshold.
+
+    getsessfile     newest session in a History folder with thousands of files,
+                    cold (first listing) and warm (folder unchanged)
+    getlasttrack    last played track of session files up to tens of MB, cold
+                    (reverse scan) and warm (one track appended since the last poll)
+    cleanup         turning a record into the output text (template render) and
+                    a Live playlist name into a record
+    remote parse    new track names out of a Live playlist page, first page and
+                    one new track since the previous page
+
+Exits with status 1 if any stage is slower than its threshold, so a parser or I/O
+change can be judged by numbers. Thresholds are per call and roomy for an ordinary
+laptop; scale them for slower machines, e.g.:
+
+    python -m benchmarks.bench_stages --factor 3
+'''
+
+import argparse
+import os
+import sys
+import tempfile
+from timeit import default_timer as timer
+
+import nowplaying
+from session import SessionIndex, SessionReader, TrackRecord
+from benchmarks import synth
+
+HISTORY_FILES = (100, 1000, 5000)
+SESSION_MB = (1, 8, 32)
+PLAYLIST_TRACKS = (50, 500, 2000)
+
+THRESHOLDS = {  # stage -> max seconds per call
+    'getsessfile cold %d files': lambda n: 20e-6 * n + 2e-3,
+    'getsessfile warm %d files': lambda n: 50e-6,
+    'getlasttrack cold %d MB': lambda mb: 5e-3,
+    'getlasttrack warm %d MB': lambda mb: 200e-6,
+    'cleanup template render': lambda _: 30e-6,
+    'cleanup playlist name': lambda _: 10e-6,
+    'remote parse first %d tracks': lambda n: 1e-6 * n + 200e-6,
+    'remote parse next %d tracks': lambda n: 1e-6 * n + 200e-6,
+}
+
+
+def per_call(fn, calls, setup=None):  # best mean of a few rounds, seconds per call
+    best = None
+    for _ in range(3):
+        total = 0
+        for _ in range(calls):
+            if setup is not None:
+                setup()
+            t0 = timer()
+            fn()
+            total += timer() - t0
+        best = total / calls if best is None else min(best, total / calls)
+    return best
+
+
+def sessfile_stages(tmp):
+    for files in HISTORY_FILES:
+        directory = synth.history(os.path.join(tmp, 'lib%d' % files), files)
+
+        def cold():
+            nowplaying.sessindex = SessionIndex()
+        yield 'getsessfile cold %d files', files, per_call(lambda: nowplaying.getsessfile(directory), 5, cold)
+        assert nowplaying.getsessfile(directory).endswith('%d.session' % files)
+        yield 'getsessfile warm %d files', files, per_call(lambda: nowplaying.getsessfile(directory), 1000)
+
+
+def lasttrack_stages(tmp):
+    for mb in SESSION_MB:
+        directory = os.path.join(tmp, 'big%d' % mb, 'History', 'Sessions')
+        os.makedirs(directory)
+        path = os.path.join(directory, 'current.session')
+        with open(path, 'wb') as f:
+            f.write(synth.sized(mb << 20))
+            f.write(synth.track(1000000, 'Sigur Rós', 'Hoppípolla', deck=1))
+
+        def cold():
+            nowplaying.sessreader = SessionReader()
+        yield 'getlasttrack cold %d MB', mb, per_call(lambda: nowplaying.getlasttrack(directory), 5, cold)
+        assert nowplaying.getlasttrack(directory)[0].title == 'Hoppípolla'
+
+        rows = iter(range(1000001, 2000000))
+
+        def append():
+            with open(path, 'ab') as f:
+                f.write(synth.track(next(rows), 'Björk', 'Jóga', deck=2))
+        yield 'getlasttrack warm %d MB', mb, per_call(lambda: nowplaying.getlasttrack(directory), 200, append)
+
+
+def cleanup_stages(tmp):
+    conf = nowplaying.ConfigFile(os.path.join(tmp, 'missing.ini'), {
+        'local': 'True', 'libpath': '', 'url': '', 'file': '', 'interval': '', 'delay': '', 'multi': 'False',
+        'quote': 'True', 'a_pref': '', 'a_suff': '', 's_pref': '', 's_suff': '', 'notif': 'False'})
+    recs = [TrackRecord('%s %d' % (synth.ARTISTS[i % 7], i), synth.TITLES[i % 7]) for i in range(1000)]
+    it = iter(recs * 3)  # more distinct tracks than the render cache holds
+    yield 'cleanup template render', None, per_call(lambda: conf.text_tpl.render(next(it)), 1000)
+    name = '\n      %s - %s\n  ' % (synth.ARTISTS[3], synth.TITLES[3])
+    yield 'cleanup playlist name', None, per_call(lambda: TrackRecord.from_text(name), 1000)
+
+
+def remote_stages(tmp):
+    from remote import PlaylistExtractor
+    for n in PLAYLIST_TRACKS:
+        page = synth.playlist_html(n)
+        extractor = PlaylistExtractor()
+        yield 'remote parse first %d tracks', n, per_call(lambda: extractor.extract(page), 20, extractor.reset)
+
+        prev = synth.playlist_html(n - 1)
+        yield 'remote parse next %d tracks', n, per_call(lambda: extractor.extract(page), 20,
+                                                         lambda: (extractor.reset(), extractor.extract(prev)))
+        assert extractor.extract(synth.playlist_html(n + 1))[-1].strip().startswith(synth.ARTISTS[(n + 1) % 7])
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description='time each poll stage against its regression threshold')
+    parser.add_argument('--factor', type=float, default=1.0, help='multiply every threshold by this')
+    args = parser.parse_args(argv)
+
+    slow = 0
+    print('%-34s %12s %12s' % ('stage', 'us/call', 'limit us'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for stages in (sessfile_stages, lasttrack_stages, cleanup_stages, remote_stages):
+            for name, arg, took in stages(tmp):
+                limit = THRESHOLDS[name](arg) * args.factor
+                label = name % arg if arg is not None else name
+                flag = '' if took <= limit else '  SLOW'
+                slow += bool(flag)
+                print('%-34s %12.1f %12.1f%s' % (label, took * 1e6, limit * 1e6, flag))
+    print('%d stage(s) over threshold' % slow if slow else 'all stages within thresholds')
+    return 1 if slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,83 @@
+'''
+Startup time of each entry mode, as a fresh process each run (PyInstaller
+bundles pay the same imports, only slower).
+
+    interpreter        python -c pass, the floor
+    eager imports      Qt + requests + lxml, what every start used to import first
+    headless local     --headless --once, until the track is on disk
+    headless remote    --headless --once against a local playlist page
+    tray               until the tray icon and poller are up (offscreen Qt)
+
+Also checks that importing the core leaves Qt, requests, lxml and asyncio unloaded.
+'''
+
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer
+from statistics import median
+from timeit import default_timer as timer
+
+from benchmarks import synth
+from benchmarks.bench_remote import Playlist
+
+RUNS = 7
+APP = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'SeratoNowPlaying.py'))
+HEAVY = ('PyQt5', 'requests', 'lxml', 'asyncio')
+
+
+def timed(args, until=None, env=None):  # seconds until exit, or until a line containing until is printed
+    start = timer()
+    proc = subprocess.Popen([sys.executable] + args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                            env=env, cwd=os.path.dirname(APP), universal_newlines=True)
+    if until is None:
+        proc.communicate()
+        return timer() - start
+    for line in proc.stdout:
+        if until in line:
+            break
+    took = timer() - start
+    proc.kill()
+    proc.communicate()
+    return took
+
+
+def run():
+    tmp = tempfile.mkdtemp()
+    lib = os.path.join(tmp, '_Serato_')
+    os.makedirs(os.path.join(lib, 'History', 'Sessions'))
+    with open(os.path.join(lib, 'History', 'Sessions', '1.session'), 'wb') as f:
+        f.write(synth.session(20))
+    with open(os.path.join(tmp, 'config.ini'), 'w') as f:
+        f.write(open(os.path.join(os.path.dirname(APP), 'bin', 'config.ini')).read())
+    out = os.path.join(tmp, 'out.txt')
+    common = [APP, '--config', os.path.join(tmp, 'config.ini'), '--file', out]
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Playlist)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = 'http://127.0.0.1:%d/playlists/bench/live' % server.server_port
+    offscreen = dict(os.environ, QT_QPA_PLATFORM='offscreen')
+
+    cases = [
+        ('interpreter', lambda: timed(['-c', 'pass'])),
+        ('eager imports', lambda: timed(['-c', 'import PyQt5.QtWidgets, requests, lxml.html'])),
+        ('headless local', lambda: timed(common + ['--headless', '--once', '--local', '--libpath', lib])),
+        ('headless remote', lambda: timed(common + ['--headless', '--once', '--remote', '--url', url])),
+        ('tray', lambda: timed(common + ['--local', '--libpath', lib], 'mode started', offscreen)),
+    ]
+    print('%-16s %9s %9s' % ('mode', 'median ms', 'min ms'))
+    for name, case in cases:
+        times = [case() for _ in range(RUNS)]
+        print('%-16s %9.0f %9.0f' % (name, median(times) * 1000, min(times) * 1000))
+
+    check = 'import sys, nowplaying; print(" ".join(m for m in %r if m in sys.modules) or "none")' % (HEAVY,)
+    loaded = subprocess.run([sys.executable, '-c', check], cwd=os.path.dirname(APP), stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout.strip()
+    print('heavy modules loaded by importing the core: ' + loaded)
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    run()
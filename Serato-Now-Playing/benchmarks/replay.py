@@ -0,0 +1,243 @@
+'''
+End-to-end replay: a simulated Serato writes a session while the headless app
+watches it, then the run is scored.
+
+The simulator writes into a temp _Serato_/History/Sessions the way Serato does:
+a new session file once the app is already running, then one 'oent' chunk per
+load, play and eject, each written in two parts so the reader sees it half done.
+The set is either generated (two decks, deck swaps, auditioned tracks pulled off
+again) or a recorded session file, replayed by its own load/eject timestamps. Time
+runs --speed times faster than the set, so hours of a set take minutes.
+
+The app runs in this process with the normal headless start-up. At the end it
+prints:
+
+    missed          tracks that were played but never published
+    false positive  publishes of a track that wasn't played (again) just then
+    detection       session write -> poller handing the track to main(), percentiles
+    end_to_end      session write -> output file written, from the metrics histograms
+    cpu, rss        process CPU share and memory over the run
+
+and exits with status 1 on any miss or false positive, or if the detection p95 is
+over --max-latency. Dedupe is off: it runs on wall clock time, which the replay
+compresses.
+
+    python -m benchmarks.replay --hours 3 --speed 120
+    python -m benchmarks.replay --session ~/Music/_Serato_/History/Sessions/123.session --speed 20
+'''
+
+import argparse
+import io
+import os
+import sys
+import tempfile
+import threading
+from contextlib import redirect_stdout
+from time import monotonic, perf_counter, process_time, sleep
+
+import nowplaying
+from history import trackkey
+from metrics import ms
+from session import CHUNK_HEAD, TRACK_TAG, parse_track
+from benchmarks import synth
+
+SETTLE = 2  # seconds to let the last track through before scoring
+SAMPLE_STEP = 1  # seconds between RSS samples
+SPREAD = 30  # set seconds at most between recorded writes that share a timestamp
+
+
+def generated(hours, length, seed):  # (session header, [(seconds, chunk)])
+    return synth.header(), synth.liveset(max(1, int(hours * 3600 / length)), length, seed)
+
+
+def recorded(path):  # (session header, [(seconds, chunk)]) timed by the chunks' own start/end times
+    with open(path, 'rb') as f:
+        buf = f.read()
+    header, events = b'', []
+    pos = 0
+    while pos + CHUNK_HEAD.size <= len(buf):
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        end = pos + CHUNK_HEAD.size + length
+        if end > len(buf):
+            break
+        if tag != TRACK_TAG:
+            if not events:
+                header += buf[pos:end]
+        else:
+            rec = parse_track(buf[pos + CHUNK_HEAD.size:end])
+            stamp = rec.end if rec.playtime is not None and rec.end else rec.start or 0
+            events.append((stamp, buf[pos:end]))
+        pos = end
+    first, last = (events[0][0] if events else 0), 0
+    stamps = []
+    for stamp, _ in events:  # file order wins over clocks that went backwards
+        last = max(last, stamp - first)
+        stamps.append(last)
+    # a load and the play that follows carry the same start time: spread such runs out
+    # towards the next timestamp, so each write can be seen before the next one lands
+    i = 0
+    while i < len(stamps):
+        j = i
+        while j < len(stamps) and stamps[j] == stamps[i]:
+            j += 1
+        gap = min((stamps[j] - stamps[i]) / (j - i) if j < len(stamps) else SPREAD, SPREAD)
+        for k in range(i, j):
+            stamps[k] += (k - i) * gap
+        i = j
+    return header, [(at, chunk) for at, (_, chunk) in zip(stamps, events)]
+
+
+def expected(events):  # [(index of the event, key)] of every play the app should publish
+    plays = []
+    for i, (_, chunk) in enumerate(events):
+        rec = parse_track(chunk[CHUNK_HEAD.size:])
+        if rec.playing and (rec.artist or rec.title):
+            plays.append((i, trackkey(rec)))
+    return plays
+
+
+class Simulator:  # writes the set into a session file on its own thread
+    def __init__(self, directory, header, events, speed):
+        self.path = os.path.join(directory, 'replay.session')
+        self.header = header
+        self.events = events
+        self.speed = speed
+        self.written = []  # monotonic time each event was completely written
+        self.thread = threading.Thread(target=self.run, name='simulator', daemon=True)
+
+    def run(self):
+        with open(self.path, 'wb') as f:
+            f.write(self.header)
+            f.flush()
+            t0 = monotonic()
+            for at, chunk in self.events:
+                delay = t0 + at / self.speed - monotonic()
+                if delay > 0:
+                    sleep(delay)
+                half = len(chunk) // 2
+                f.write(chunk[:half])
+                f.flush()
+                f.write(chunk[half:])
+                f.flush()
+                self.written.append(monotonic())
+
+
+def rss():  # resident set size in bytes, None where it can't be read
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        return None
+
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def score(plays, written, published):  # (missed keys, false positives, detection latencies)
+    missed, latencies = [], []
+    used = [False] * len(published)
+    for n, (i, key) in enumerate(plays):
+        if i >= len(written):  # run cut short
+            missed.append(key)
+            continue
+        until = written[plays[n + 1][0]] if n + 1 < len(plays) and plays[n + 1][0] < len(written) else None
+        for j, (at, pkey) in enumerate(published):
+            if not used[j] and pkey == key and at >= written[i] and (until is None or at < until):
+                used[j] = True
+                latencies.append(at - written[i])
+                break
+        else:
+            missed.append(key)
+    return missed, [key for (_, key), u in zip(published, used) if not u], latencies
+
+
+def run(argv=None):
+    parser = argparse.ArgumentParser(description='replay a Serato session into the headless app and score it')
+    parser.add_argument('--session', help='replay this recorded session file instead of a generated set')
+    parser.add_argument('--hours', type=float, default=3, help='length of the generated set (default 3)')
+    parser.add_argument('--track-length', type=float, default=240, help='seconds per generated track')
+    parser.add_argument('--speed', type=float, default=120, help='set seconds per real second, 1 for real time')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-latency', type=float, default=500, help='detection p95 limit in ms (default 500)')
+    parser.add_argument('--verbose', action='store_true', help="show the app's own output")
+    args = parser.parse_args(argv)
+
+    header, events = recorded(args.session) if args.session else \
+        generated(args.hours, args.track_length, args.seed)
+    plays = expected(events)
+    duration = (events[-1][0] if events else 0) / args.speed
+    print('replaying %d session writes, %d plays, over %.0f s' % (len(events), len(plays), duration))
+
+    published = []
+    samples = []
+    with tempfile.TemporaryDirectory() as tmp:
+        libpath = os.path.join(tmp, '_Serato_')
+        directory = nowplaying.sessdir(libpath)
+        os.makedirs(directory)
+        cfg = os.path.join(tmp, 'config.ini')
+        with open(os.path.join(nowplaying.bundle_dir, 'bin', 'config.ini')) as src, open(cfg, 'w') as dst:
+            dst.write(src.read())
+        nowplaying.confstore.use(cfg, {'local': 'True', 'libpath': libpath, 'file': os.path.join(tmp, 'np.txt'),
+                                       'delay': '0', 'dedupe': '0', 'metrics': 'True', 'metrics_log': '0'})
+
+        main = nowplaying.poller.publish
+
+        def publish(found):  # on the poller thread, as the track is handed on
+            published.append((monotonic(), trackkey(found[1])))
+            main(found)
+        nowplaying.poller.publish = publish
+
+        quiet = io.StringIO()
+        with redirect_stdout(sys.stdout if args.verbose else quiet):
+            wall, cpu = perf_counter(), process_time()
+            nowplaying.init()
+            nowplaying.start()
+            sim = Simulator(directory, header, events, args.speed)
+            sim.thread.start()
+            while sim.thread.is_alive():
+                samples.append(rss())
+                sim.thread.join(SAMPLE_STEP)
+            sleep(SETTLE)
+            samples.append(rss())
+            wall, cpu = perf_counter() - wall, process_time() - cpu
+            nowplaying.shutdown()
+
+    missed, false, latencies = score(plays, sim.written, published)
+    stages = nowplaying.metrics.stages
+    print('published %d of %d plays: %d missed, %d false positive(s)' % (len(plays) - len(missed), len(plays),
+                                                                         len(missed), len(false)))
+    for key in missed[:10]:
+        print('  missed: %s - %s' % key[:2])
+    for key in false[:10]:
+        print('  false positive: %s - %s' % key[:2])
+    p95 = percentile(latencies, 0.95)
+    print('detection   p50=%s p95=%s p99=%s max=%s' % (ms(percentile(latencies, 0.5)), ms(p95),
+                                                       ms(percentile(latencies, 0.99)), ms(max(latencies or [0]))))
+    if 'end_to_end' in stages:
+        hist = stages['end_to_end']
+        print('end_to_end  p50<=%s p95<=%s max=%s' % (ms(hist.quantile(0.5)), ms(hist.quantile(0.95)),
+                                                     ms(hist.max)))
+    print('cpu %.1f%% of one core over %.0f s' % (cpu / wall * 100, wall))
+    known = [s for s in samples if s]
+    if known:
+        print('rss start %.1f MB, end %.1f MB, max %.1f MB' % (known[0] / 2 ** 20, known[-1] / 2 ** 20,
+                                                                max(known) / 2 ** 20))
+
+    slow = p95 * 1000 > args.max_latency
+    if slow:
+        print('detection p95 over %.0f ms' % args.max_latency)
+    return 1 if missed or false or slow else 0
+
+
+if __name__ == '__main__':
+    sys.exit(run())
@@ -0,0 +1,219 @@
+'''
+Synthetic Serato data for benchmarking: session files of any size, whole History
+folders, Serato Live playlist pages and tagged audio files with cover art.
+'''
+
+import os
+import random
+import struct
+from time import time
+
+# adat field ids
+F_ROW = 1
+F_PATH = 2
+F_TITLE = 6
+F_ARTIST = 7
+F_ALBUM = 8
+F_GENRE = 9
+F_START = 28
+F_END = 29
+F_DECK = 31
+F_PLAYTIME = 45
+F_PLAYED = 50
+F_LOADED = 51
+
+# names with accents, CJK and astral-plane characters so UTF-16 decoding gets exercised
+ARTISTS = ('Daft Punk', 'Beyoncé', 'Sigur Rós', '坂本龍一', 'Mötley Crüe', 'Björk', 'DJ 🎧 Shadow')
+TITLES = ('One More Time', 'Déjà Vu', 'Hoppípolla', '戦場のメリークリスマス', 'Kickstart My Heart',
+          'Jóga', 'Midnight in a Perfect World')
+
+
+def chunk(tag, payload):
+    return tag + struct.pack('>I', len(payload)) + payload
+
+
+def field(fid, data):
+    return struct.pack('>II', fid, len(data)) + data
+
+
+def text(fid, s):  # strings are null terminated UTF-16BE
+    return field(fid, (s + '\0').encode('utf-16-be'))
+
+
+def integer(fid, n):
+    return field(fid, struct.pack('>I', n))
+
+
+def header():  # what Serato writes when a session is opened
+    return chunk(b'vrsn', '1.0/Serato Scratch LIVE Review'.encode('utf-16-be')) + \
+        chunk(b'oses', chunk(b'adat', integer(F_ROW, 0)))
+
+
+def track(row, artist, title, deck=1, played=True, album='', start=1600000000, playtime=None, loaded=False,
+          genre='', path=''):  # playtime marks an ejected track, loaded one sitting on a deck unplayed
+    adat = integer(F_ROW, row) + \
+        text(F_PATH, path or '/Music/%s - %s.mp3' % (artist, title)) + \
+        text(F_TITLE, title) + \
+        text(F_ARTIST, artist) + \
+        text(F_ALBUM, album) + \
+        text(F_GENRE, genre) + \
+        integer(F_START, start) + \
+        integer(F_DECK, deck) + \
+        field(F_PLAYED, b'\x01' if played else b'\x00')
+    if playtime is not None:
+        adat += integer(F_END, start + playtime) + integer(F_PLAYTIME, playtime)
+    if loaded:
+        adat += field(F_LOADED, b'\x01')
+    return chunk(b'oent', chunk(b'adat', adat))
+
+
+def tracks(n, start=1):
+    for row in range(start, start + n):
+        i = row % len(ARTISTS)
+        yield track(row, '%s %d' % (ARTISTS[i], row), TITLES[i], deck=row % 2 + 1,
+                    album='Album %d' % (row // 10), start=1600000000 + row * 240)
+
+
+def session(n):  # a whole session file image with n tracks
+    return header() + b''.join(tracks(n))
+
+
+def deckset(n, start=1):  # n tracks the way a two deck set writes them: load, play, eject the other deck
+    playing = {}
+    for row in range(start, start + n):
+        i = row % len(ARTISTS)
+        deck = row % 2 + 1
+        args = ('%s %d' % (ARTISTS[i], row), TITLES[i], deck)
+        kw = dict(album='Album %d' % (row // 10), genre='House', start=1600000000 + row * 240)
+        yield track(row, *args, played=False, loaded=True, **kw)
+        if row % 7 == 0:  # auditioned and pulled off again, never played
+            yield track(row, *args, played=False, playtime=5, **kw)
+            continue
+        yield track(row, *args, **kw)
+        other = playing.pop(3 - deck, None)
+        if other is not None:
+            yield other
+        playing[deck] = track(row, *args, playtime=210, **kw)
+
+
+def liveset(n, length=240, seed=1):  # (seconds into the set, chunk) for n tracks played the way a DJ does
+    rnd = random.Random(seed)
+    events = []
+    deck, previous = 1, None  # previous: (args, kw) of the track still on the other deck
+    for row in range(1, n + 1):
+        i = row % len(ARTISTS)
+        at = row * length + rnd.uniform(-length / 8, length / 8)
+        kw = dict(album='Album %d' % (row // 10), genre='House', start=1600000000 + int(at))
+        if previous is not None and rnd.random() < 0.2:  # next one goes on the same deck: stop and eject first
+            events.append((at - 110, track(*previous[0], playtime=length - 110, **previous[1])))
+            previous = None
+        else:
+            deck = 3 - deck
+        if rnd.random() < 1 / 7:  # something else auditioned and pulled off again first
+            other = (row + 100000, 'Cue %d' % row, TITLES[(i + 3) % len(TITLES)], deck)
+            events.append((at - 100, track(*other, played=False, loaded=True, **kw)))
+            events.append((at - 85, track(*other, played=False, playtime=15, **kw)))
+        args = (row, '%s %d' % (ARTISTS[i], row), TITLES[i], deck)
+        events.append((at - 60, track(*args, played=False, loaded=True, **kw)))
+        events.append((at, track(*args, **kw)))
+        if previous is not None:  # the outgoing track, once the mix is done
+            events.append((at + rnd.uniform(15, 45), track(*previous[0], playtime=length, **previous[1])))
+        previous = args, kw
+    return sorted(events, key=lambda e: e[0])
+
+
+def sized(nbytes):  # session file image of a realistic set, at least nbytes long
+    parts = [header()]
+    size = len(parts[0])
+    row = 1
+    while size < nbytes:
+        for t in deckset(100, row):
+            parts.append(t)
+            size += len(t)
+        row += 100
+    return b''.join(parts)
+
+
+def history(libpath, files, n=20):  # _Serato_/History/Sessions with files sessions, the last one current
+    directory = os.path.join(libpath, 'History', 'Sessions')
+    os.makedirs(directory, exist_ok=True)
+    image = header() + b''.join(deckset(n))
+    now = time()
+    for i in range(files):
+        path = os.path.join(directory, '%d.session' % (i + 1))
+        with open(path, 'wb') as f:
+            f.write(image)
+        mtime = now - (files - 1 - i) * 3600  # one an hour, oldest first
+        os.utime(path, (mtime, mtime))
+    os.utime(directory, (now - 60, now - 60))  # current session created a while ago, written to since
+    return directory
+
+
+def dbfield(tag, s):  # database V2 fields are keyed by 4 character tags, strings UTF-16BE
+    return chunk(tag, s.encode('utf-16-be'))
+
+
+def dbtrack(row, artist, title, bpm='124.00', key='Am'):  # one 'otrk' entry of _Serato_/database V2
+    return chunk(b'otrk', chunk(b'ttyp', 'mp3'.encode('utf-16-be')) +
+                 dbfield(b'pfil', 'Music/%s - %s.mp3' % (artist, title)) +
+                 dbfield(b'tsng', title) +
+                 dbfield(b'tart', artist) +
+                 dbfield(b'talb', 'Album %d' % (row // 10)) +
+                 dbfield(b'tgen', 'House') +
+                 dbfield(b'tbpm', bpm) +
+                 dbfield(b'tkey', key) +
+                 dbfield(b'ttyr', '2001') +
+                 dbfield(b'tcom', 'synthetic track %d' % row) +
+                 chunk(b'uadd', struct.pack('>I', 1600000000 + row)) +
+                 chunk(b'bmis', b'\0') + chunk(b'bply', b'\x01') + chunk(b'bcrt', b'\0'))
+
+
+def database(n, start=1):  # a database V2 image with n tracks, named like tracks()
+    parts = [chunk(b'vrsn', '2.0/Serato Scratch LIVE Database'.encode('utf-16-be'))]
+    for row in range(start, start + n):
+        i = row % len(ARTISTS)
+        parts.append(dbtrack(row, '%s %d' % (ARTISTS[i], row), TITLES[i], bpm='%d.00' % (100 + row % 40)))
+    return b''.join(parts)
+
+
+def jpeg(nbytes):  # bytes that pass for a JPEG: start of image, filler, end of image
+    return b'\xff\xd8\xff\xe0' + bytes(nbytes - 6) + b'\xff\xd9'
+
+
+def mp3(art, audio=1 << 20):  # ID3v2.3 tag with a title and front cover, then the audio
+    frames = b''
+    for fid, body in ((b'TIT2', b'\x00' + TITLES[0].encode('latin-1')),
+                      (b'APIC', b'\x00image/jpeg\x00\x03cover\x00' + art)):
+        frames += fid + struct.pack('>I', len(body)) + b'\0\0' + body
+    size = bytes((len(frames) >> shift) & 0x7f for shift in (21, 14, 7, 0))  # syncsafe
+    return b'ID3\x03\x00\x00' + size + frames + bytes(audio)
+
+
+def flac(art, audio=1 << 20):  # STREAMINFO, then a PICTURE block, then the audio
+    mime = b'image/jpeg'
+    picture = struct.pack('>II', 3, len(mime)) + mime + struct.pack('>IIIIII', 0, 500, 500, 24, 0, len(art)) + art
+    return b'fLaC' + bytes((0,)) + (34).to_bytes(3, 'big') + bytes(34) + \
+        bytes((0x86,)) + len(picture).to_bytes(3, 'big') + picture + bytes(audio)
+
+
+def atom(kind, payload):
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+
+def m4a(art, audio=1 << 20):  # iTunes style tags after the audio, as most encoders write them
+    ilst = atom(b'ilst', atom(b'covr', atom(b'data', struct.pack('>II', 13, 0) + art)))
+    meta = atom(b'meta', bytes(4) + atom(b'hdlr', bytes(25)) + ilst)
+    return atom(b'ftyp', b'M4A \0\0\0\0M4A mp42isom') + atom(b'mdat', bytes(audio)) + \
+        atom(b'moov', atom(b'mvhd', bytes(100)) + atom(b'udta', meta))
+
+
+def playlist_html(n):  # a Serato Live playlist page with n tracks, oldest first
+    rows = []
+    for row in range(1, n + 1):
+        i = row % len(ARTISTS)
+        rows.append('<div class="playlist-track">\n'
+                    '  <div class="playlist-tracktime">%02d:%02d</div>\n'
+                    '  <div class="playlist-trackname">\n      %s %d - %s\n  </div>\n'
+                    '</div>' % (row // 60 % 24, row % 60, ARTISTS[i], row, TITLES[i]))
+    return ('<!DOCTYPE html>\n<html><head><meta charset="utf-8"><title>Live playlist</title></head>\n'
+            '<body><div class="playlist-tracks">\n%s\n</div></body></html>\n' % '\n'.join(rows))
@@ -0,0 +1,141 @@
+'''
+Track changes pushed over the LAN as UDP datagrams, for lighting and visuals rigs.
+
+UdpSink sits with the file sinks and sends each published track to every
+configured host:port, whether a single machine, a broadcast address or a multicast
+group. It sends either an OSC bundle or the JSON that JsonSink writes. The bundle
+holds one message per field, so a VJ or lighting desk can map /nowplaying/title
+straight onto a text layer:
+
+    /nowplaying/text    s   the formatted line, as in the text file
+    /nowplaying/artist  s
+    /nowplaying/title   s
+    /nowplaying/album   s
+    /nowplaying/genre   s
+    /nowplaying/bpm     f   0 when unknown
+    /nowplaying/key     s
+    /nowplaying/deck    i   0 when unknown
+
+On shutdown a blank track is sent: the same bundle with empty strings and
+zeros, or {} in JSON.
+
+The payload is encoded once per track and kept in the sink's render cache, so a
+send is one sendto() per destination on a non-blocking socket. It runs on the
+output thread like every other sink and never waits on the network: a datagram
+the kernel won't take right away is dropped rather than queued. Host names are
+resolved on the first send, on that same thread, and kept.
+'''
+
+import socket
+import struct
+from collections import namedtuple
+
+from output import Sink, tojson
+
+FORMATS = ('osc', 'json')
+OSC_PREFIX = '/nowplaying/'
+OSC_FIELDS = ('text', 'artist', 'title', 'album', 'genre', 'bpm', 'key', 'deck')
+BUNDLE_HEAD = b'#bundle\0' + struct.pack('>Q', 1)  # time tag 1: act on it immediately
+MULTICAST_TTL = 1  # hops a multicast datagram may take; 1 keeps it on the local network
+
+UdpConf = namedtuple('UdpConf', 'destinations format')  # ((host, port), ...), 'osc' or 'json'
+
+
+def destinations(spec):  # 'host:port, [v6 host]:port ...' -> ((host, port), ...), bad entries skipped
+    found = []
+    for item in spec.replace(',', ' ').split():
+        host, sep, port = item.rpartition(':')
+        host = host.strip('[]')
+        if not sep or not host or not port.isdigit() or not 0 < int(port) < 65536:
+            print("ignoring udp destination %r: expected host:port" % item)
+            continue
+        found.append((host, int(port)))
+    return tuple(found)
+
+
+class UdpSink(Sink):  # datagrams to each destination, pre-encoded per track
+    def __init__(self, conf):
+        super().__init__('udp ' + ' '.join('%s:%d' % d for d in conf.destinations))
+        self.conf = conf
+        self.targets = None  # [(socket, address)], resolved on the first send
+        self.sockets = {}  # address family -> socket
+        self.dropped = 0  # datagrams the kernel had no room for
+
+    @property
+    def key(self):
+        return type(self), self.conf
+
+    def render(self, text, rec):
+        if self.conf.format == 'json':
+            return tojson(text, rec).encode('utf-8')
+        return osc(text, rec)
+
+    def write(self, text, rec):  # True once the datagram went out to at least one destination
+        payload = self.rendered(text, rec)
+        if self.targets is None:
+            self.targets = self.resolve()
+        sent = False
+        for sock, address in self.targets:
+            try:
+                sock.sendto(payload, address)
+                sent = True
+            except BlockingIOError:  # send buffer full: skip rather than hold up the other sinks
+                self.dropped += 1
+            except OSError as e:  # unreachable network and the like; try again with the next track
+                print("could not send to %s: %s" % (address[0], e))
+        return sent
+
+    def resolve(self):
+        targets = []
+        for host, port in self.conf.destinations:
+            try:
+                family, _, _, _, address = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0]
+            except (OSError, UnicodeError) as e:
+                print("could not resolve udp destination %s: %s" % (host, e))
+                continue
+            targets.append((self.socket(family), address))
+        return targets
+
+    def socket(self, family):  # one non-blocking socket per address family, for every destination
+        sock = self.sockets.get(family)
+        if sock is None:
+            sock = self.sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            if family == socket.AF_INET:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+                sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, MULTICAST_TTL)
+            elif family == socket.AF_INET6:
+                sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_MULTICAST_HOPS, MULTICAST_TTL)
+        return sock
+
+
+def osc(text, rec):  # the OSC bundle for a track, or the blank one
+    if rec is None or text == '':
+        text, fields = '', ('', '', '', '', 0.0, '', 0)
+    else:
+        try:
+            bpm = float(rec.bpm or 0)
+        except ValueError:
+            bpm = 0.0
+        fields = (rec.artist, rec.title, rec.album, rec.genre, bpm, rec.key or '', rec.deck or 0)
+    parts = [BUNDLE_HEAD]
+    for name, value in zip(OSC_FIELDS, (text,) + fields):
+        data = message(OSC_PREFIX + name, value)
+        parts.append(struct.pack('>i', len(data)))
+        parts.append(data)
+    return b''.join(parts)
+
+
+def message(address, value):  # one OSC message with a single string, float or int argument
+    if isinstance(value, float):
+        tag, arg = ',f', struct.pack('>f', value)
+    elif isinstance(value, int):
+        tag, arg = ',i', struct.pack('>i', value)
+    else:
+        tag, arg = ',s', padded(value or '')
+    return padded(address) + padded(tag) + arg
+
+
+def padded(s):  # OSC string: UTF-8, null terminated, padded to a multiple of 4 bytes
+    data = s.encode('utf-8')
+    return data + b'\0' * (4 - len(data) % 4)
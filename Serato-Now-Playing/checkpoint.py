@@ -0,0 +1,90 @@
+'''
+Warm-start state, so a restart mid-set carries on where the last run stopped.
+
+After each publish the core saves a small JSON file next to config.ini: the track
+it published, and for a local library the current session file (path, inode, size,
+mtime), the reader's offset past the last complete chunk along with that chunk, and
+the Sessions folder scan. On start-up restore() hands the session part back only
+while it still describes what is on disk: the same file, still the newest session,
+not shrunk and not rewritten in place. The reader then goes on from the saved
+offset, reading only what Serato appended in the meantime, and the current track
+counts as published already instead of being written and announced again.
+
+A clean shutdown blanks the outputs, so it saves the session part without a track
+and the next start publishes the current track as usual.
+'''
+
+import base64
+import json
+import os
+from time import time
+
+from output import atomic_write
+
+STATE_FILE = 'state.json'
+VERSION = 1
+MAX_AGE = 6 * 3600  # seconds; older state is from another set
+
+
+class Checkpoint:  # the state file; save() skips the write when nothing changed
+    def __init__(self):
+        self.saved = None  # (path, content) last written
+
+    def load(self, path):  # state dict, or None if there's none worth resuming from
+        try:
+            with open(path, encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(state, dict) or state.get('version') != VERSION or \
+                not 0 <= time() - state.get('time', 0) <= MAX_AGE:
+            return None
+        return state
+
+    def save(self, path, state):
+        content = json.dumps(dict(state, version=VERSION), ensure_ascii=False, sort_keys=True)
+        if (path, content) == self.saved:
+            return
+        try:
+            atomic_write(path, content)
+        except OSError as e:
+            print("could not save state: %s" % e)
+            return
+        self.saved = path, content
+
+
+def capture(index, reader):  # the session part of the state, None without a current session
+    path = index.last
+    saved = reader.save(path) if path else None
+    if saved is None:
+        return None
+    ino, offset, last = saved
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return {'directory': index.directory, 'dir_mtime': index.mtime, 'scanned': index.scanned, 'first': index.first,
+            'path': path, 'inode': ino, 'offset': offset, 'size': st.st_size, 'mtime': st.st_mtime_ns,
+            'chunk': None if last is None else base64.b64encode(last).decode('ascii')}
+
+
+def restore(index, reader, state, directory):  # resume index and reader from state; True if it still holds
+    sess = state.get('session')
+    if not sess or sess.get('directory') != directory:
+        return False
+    try:
+        st = os.stat(sess['path'])
+        dst = os.stat(directory)
+        if st.st_ino != sess['inode'] or st.st_size < sess['size'] or \
+                (st.st_size == sess['size'] and st.st_mtime_ns != sess['mtime']):
+            return False  # replaced, truncated or rewritten in place
+        if dst.st_mtime_ns == sess['dir_mtime']:
+            index.resume(directory, sess['dir_mtime'], sess['scanned'], sess['first'], sess['path'])
+        if index.newest(directory) != sess['path']:  # a newer session started meanwhile
+            return False
+        chunk = sess['chunk']
+        reader.resume(sess['path'], sess['inode'], sess['offset'],
+                      None if chunk is None else base64.b64decode(chunk))
+    except (OSError, KeyError, TypeError, ValueError):
+        return False
+    return True
@@ -0,0 +1,160 @@
+'''
+Track polling loop and timers.
+
+Poller runs check() on a worker thread and hands each new track to publish(). Between
+checks it blocks on a watcher (see watcher.py) rather than sleeping, so pause() and
+stop() take effect immediately, and while paused the thread just waits on an Event.
+
+Timers runs callbacks at a deadline on one thread of its own, for work that has to
+wait (the configured write delay, retrying a locked session file) without holding
+up the poller. A timer can be cancelled until it fires, e.g. when a newer track
+makes a delayed one stale.
+'''
+
+import heapq
+import itertools
+import threading
+import traceback
+from time import monotonic
+
+
+class Poller:  # start/pause/resume/stop-able track polling loop
+    def __init__(self, check, publish, watcher, timeout=None):
+        self.check = check  # returns new track info, or something falsy if nothing changed
+        self.publish = publish  # called on the poller thread with each new track
+        self.watcher = watcher  # returns the watcher to block on between checks
+        self.timeout = timeout  # longest wait between checks, None to leave it to the watcher
+        self.thread = None
+        self._running = threading.Event()  # set while not paused
+        self._stopped = threading.Event()
+        self._current = None  # watcher the loop is blocked on, so pause/stop can interrupt it
+
+    @property
+    def started(self):
+        return self.thread is not None
+
+    @property
+    def paused(self):
+        return self.started and not self._running.is_set()
+
+    def start(self):
+        if self.thread is None:
+            self._running.set()
+            self.thread = threading.Thread(target=self.run, name='poller', daemon=True)
+            self.thread.start()
+
+    def pause(self):
+        self._running.clear()
+        self._interrupt()
+
+    def resume(self):
+        self._running.set()
+
+    def wake(self):  # cut the current wait short and check again right away
+        self._interrupt()
+
+    def stop(self, timeout=5):  # end the loop and wait for the thread to finish
+        self._stopped.set()
+        self._running.set()  # let a paused loop notice the stop
+        self._interrupt()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+
+    def run(self):
+        while True:
+            self._running.wait()
+            if self._stopped.is_set():
+                break
+
+            try:
+                new = self.check()
+            except Exception:  # keep polling through e.g. network errors
+                traceback.print_exc()
+                new = None
+
+            if self._stopped.is_set():
+                break
+            if not self._running.is_set():  # paused mid-check, drop the result
+                continue
+            if new:
+                self.publish(new)
+                continue
+
+            self._current = self.watcher()
+            if self._running.is_set() and not self._stopped.is_set():
+                self._current.wait(self.timeout)
+            self._current = None
+
+    def _interrupt(self):
+        current = self._current
+        if current is not None:
+            current.interrupt()
+
+
+class Timer:  # one scheduled call; see Timers.cancel
+    __slots__ = ('deadline', 'fn', 'args', 'cancelled')
+
+    def __init__(self, deadline, fn, args):
+        self.deadline = deadline
+        self.fn = fn
+        self.args = args
+        self.cancelled = False
+
+
+class Timers:  # deadline-ordered callbacks on one thread
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.heap = []  # (deadline, seq, Timer)
+        self.seq = itertools.count()  # keeps equal deadlines in call order
+        self.busy = False
+        self.thread = None
+
+    def call_later(self, delay, fn, *args):  # run fn(*args) in delay seconds; returns the Timer
+        timer = Timer(monotonic() + delay, fn, args)
+        with self.cond:
+            heapq.heappush(self.heap, (timer.deadline, next(self.seq), timer))
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='timers', daemon=True)
+                self.thread.start()
+            self.cond.notify()
+        return timer
+
+    def cancel(self, timer):  # True if timer hadn't fired yet and now never will
+        with self.cond:
+            if timer.cancelled or timer.fn is None:
+                return False
+            timer.cancelled = True
+            self.cond.notify()
+            return True
+
+    def flush(self, timeout=None):  # wait until every timer due so far has run
+        with self.cond:
+            return self.cond.wait_for(lambda: not self._live() and not self.busy, timeout)
+
+    def _live(self):
+        while self.heap and self.heap[0][2].cancelled:
+            heapq.heappop(self.heap)
+        return bool(self.heap)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while True:
+                    if not self._live():
+                        self.cond.notify_all()
+                        self.cond.wait()
+                        continue
+                    wait = self.heap[0][0] - monotonic()
+                    if wait <= 0:
+                        break
+                    self.cond.wait(wait)
+                timer = heapq.heappop(self.heap)[2]
+                fn, args, timer.fn, timer.args = timer.fn, timer.args, None, None  # fired: no longer cancellable
+                self.busy = True
+            try:
+                fn(*args)
+            except Exception:  # keep the other timers going
+                traceback.print_exc()
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
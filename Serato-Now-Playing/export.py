@@ -0,0 +1,134 @@
+'''
+Setlists out of the whole Serato History, for royalty reports and play statistics.
+
+export() parses every session file in History/Sessions, in a process pool when
+there are more than a handful, each file read through mmap. Serato appends a new
+'oent' entry for the same row as a track is loaded, played and ejected, so the last
+entry per row is the play as it ended; rows that were never played (loaded and
+pulled off again) are left out.
+
+Into SQLite (the default), plays go in with executemany, one transaction per run,
+in WAL mode, with indexes on start time, artist and title. The database also
+keeps each session file's size and mtime, so a re-run only parses new and changed
+files; plays of session files deleted since stay in. A .csv target is written
+from scratch every time.
+
+    python SeratoNowPlaying.py --export setlists.db --libpath /path/to/_Serato_
+'''
+
+import csv
+import mmap
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+from session import iter_tracks
+
+POOL_MIN = 8  # files to parse before a process pool pays for its start-up
+CHUNKSIZE = 4  # files handed to a worker at a time
+COLUMNS = ('file', 'row', 'start', 'end', 'playtime', 'deck', 'artist', 'title', 'album', 'genre', 'path')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER);
+CREATE TABLE IF NOT EXISTS plays (file TEXT, row INTEGER, start INTEGER, end INTEGER, playtime INTEGER,
+                                  deck INTEGER, artist TEXT, title TEXT, album TEXT, genre TEXT, path TEXT,
+                                  PRIMARY KEY (file, row));
+'''
+INDEXES = '''
+CREATE INDEX IF NOT EXISTS plays_start ON plays (start);
+CREATE INDEX IF NOT EXISTS plays_artist ON plays (artist COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS plays_title ON plays (title COLLATE NOCASE);
+'''
+
+
+def sessions(directory):  # [(path, size, mtime_ns)] of every session file, oldest first
+    found = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+            st = entry.stat()
+            found.append((entry.path, st.st_size, st.st_mtime_ns))
+    return sorted(found, key=lambda f: (f[2], f[0]))
+
+
+def plays(path):  # (path, [row tuples]) of one session file; runs in the pool
+    name = os.path.basename(path)
+    latest = {}  # row -> newest record of it
+    try:
+        if os.path.getsize(path) == 0:  # just created, nothing to map
+            return path, []
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for i, rec in enumerate(iter_tracks(mm)):
+                latest[rec.row if rec.row is not None else (i,)] = rec
+    except (OSError, ValueError) as e:  # e.g. gone since the listing
+        print("could not read %s: %s" % (path, e))
+        return path, []
+    return path, [(name, rec.row, rec.start, rec.end, rec.playtime, rec.deck, rec.artist, rec.title, rec.album,
+                   rec.genre, rec.path)
+                  for rec in latest.values() if rec.played and (rec.artist or rec.title)]
+
+
+def parsed(paths, workers=None):  # yield plays(path) for each path, in a pool when it pays
+    workers = workers or os.cpu_count() or 1
+    if len(paths) < POOL_MIN or workers == 1:
+        for path in paths:
+            yield plays(path)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        yield from pool.map(plays, paths, chunksize=CHUNKSIZE)
+
+
+def export(directory, target, workers=None):  # (files parsed, files skipped, plays written)
+    files = sessions(directory)
+    if target.lower().endswith('.csv'):
+        return tocsv(files, target, workers)
+    return tosqlite(files, target, workers)
+
+
+def tosqlite(files, target, workers):
+    db = sqlite3.connect(target)
+    try:
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.executescript(SCHEMA)
+        known = {path: (size, mtime) for path, size, mtime in db.execute('SELECT path, size, mtime FROM files')}
+        todo = [f for f in files if known.get(f[0]) != (f[1], f[2])]
+        stamps = {path: (size, mtime) for path, size, mtime in todo}
+        written = 0
+        with db:  # one transaction for the whole run
+            for path, rows in parsed(list(stamps), workers):
+                db.execute('DELETE FROM plays WHERE file = ?', (os.path.basename(path),))
+                db.executemany('INSERT INTO plays VALUES (%s)' % ','.join('?' * len(COLUMNS)), rows)
+                db.execute('INSERT OR REPLACE INTO files VALUES (?, ?, ?)', (path,) + stamps[path])
+                written += len(rows)
+        db.executescript(INDEXES)  # after the first bulk load, rather than updated row by row
+    finally:
+        db.close()
+    return len(todo), len(files) - len(todo), written
+
+
+def tocsv(files, target, workers):
+    tmp = target + '.tmp'
+    written = 0
+    with open(tmp, 'w', newline='', encoding='utf-8') as f:
+        out = csv.writer(f)
+        out.writerow(COLUMNS)
+        for _, rows in parsed([path for path, _, _ in files], workers):
+            out.writerows(sorted(rows, key=lambda r: (r[2] or 0, r[1] or 0)))
+            written += len(rows)
+    os.replace(tmp, target)
+    return len(files), 0, written
+
+
+def run(directory, target):  # --export: report and return the exit status
+    t0 = perf_counter()
+    try:
+        done, skipped, written = export(directory, target)
+    except (OSError, sqlite3.Error) as e:
+        print("export failed: %s" % e)
+        return 1
+    print("exported %d plays from %d session files (%d unchanged) to %s in %.2f s" %
+          (written, done, skipped, target, perf_counter() - t0))
+    return 0
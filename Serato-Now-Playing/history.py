@@ -0,0 +1,84 @@
+'''
+In-memory play history.
+
+PlayHistory is a fixed-size ring buffer of Play entries plus a dict from each
+track's key to its newest entry, so "was this played in the last N seconds?" is a
+single lookup however long the set gets. All methods take a lock, so the tray menu,
+output sinks or the status server can read it while the poller adds to it.
+'''
+
+import threading
+from time import time
+
+CAPACITY = 500
+
+
+class Play:  # one published track
+    __slots__ = ('artist', 'title', 'rec', 'time')
+
+    def __init__(self, rec, when):
+        self.artist = rec.artist
+        self.title = rec.title
+        self.rec = rec
+        self.time = when
+
+    @property
+    def key(self):
+        return trackkey(self.rec)
+
+    def __repr__(self):
+        return 'Play(%r, %r, %r)' % (self.artist, self.title, self.time)
+
+
+class PlayHistory:  # bounded, thread-safe play log with O(1) "seen recently"
+    def __init__(self, capacity=CAPACITY):
+        self.lock = threading.Lock()
+        self.ring = [None] * capacity
+        self.next = 0  # slot the next play goes into
+        self.size = 0
+        self.latest = {}  # track key -> newest Play of it still in the ring
+
+    def add(self, rec, when=None):
+        play = Play(rec, time() if when is None else when)
+        with self.lock:
+            old = self.ring[self.next]
+            if old is not None and self.latest.get(old.key) is old:
+                del self.latest[old.key]
+            self.ring[self.next] = play
+            self.latest[play.key] = play
+            self.next = (self.next + 1) % len(self.ring)
+            self.size = min(self.size + 1, len(self.ring))
+        return play
+
+    def seen(self, rec, window, now=None):  # played within the last window seconds?
+        if window <= 0:
+            return False
+        with self.lock:
+            play = self.latest.get(trackkey(rec))
+        return play is not None and (time() if now is None else now) - play.time <= window
+
+    def last(self):
+        with self.lock:
+            return self.ring[self.next - 1] if self.size else None
+
+    def recent(self, n=10):  # newest first
+        with self.lock:
+            n = min(n, self.size)
+            return [self.ring[(self.next - 1 - i) % len(self.ring)] for i in range(n)]
+
+    def since(self, when):  # plays at or after when, newest first
+        with self.lock:
+            plays = []
+            for i in range(self.size):
+                play = self.ring[(self.next - 1 - i) % len(self.ring)]
+                if play.time < when:
+                    break
+                plays.append(play)
+            return plays
+
+    def __len__(self):
+        return self.size
+
+
+def trackkey(rec):  # identity of a track for dedupe, ignoring case
+    return rec.artist.casefold(), rec.title.casefold()
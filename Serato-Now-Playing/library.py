@@ -0,0 +1,201 @@
+'''
+Track lookups in Serato's library database, _Serato_/database V2.
+
+The database is a run of chunks like a session file ('vrsn', then one 'otrk' per
+track), but each track's fields are keyed by 4-character tags instead of numbers:
+'pfil' path, 'tsng' title, 'tart' artist, 'talb' album, 'tgen' genre, 'tbpm' BPM,
+'tkey' key, and so on. Strings are UTF-16BE.
+
+Library reads the file into memory once per rebuild and indexes every track's
+offset by its path and by its artist/title, looking only at the first few fields of
+each. A lookup reads and decodes just the one track it found. The index is only
+rebuilt when the database's mtime or size changes, and when Serato merely appended
+tracks only the new part gets indexed. The file is never mapped: Serato truncates
+and rewrites it in place, and touching a mapping past the new end of the file kills
+the process with SIGBUS. A read during a rewrite just returns short or mixed bytes,
+which the index stops at and the next rebuild replaces.
+
+Rebuilds run on a background thread and the finished index is swapped in, so a
+lookup never waits for one: while Serato's rewrite is being indexed, lookups are
+answered from the previous index, and a track whose offset moved is simply not
+found rather than mistaken for another.
+'''
+
+import os
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+CHUNK_HEAD = struct.Struct('>4sI')
+TRACK_TAG = b'otrk'
+KEY_TAGS = (b'pfil', b'tsng', b'tart')  # fields the index is built from
+LOOKUP_CACHE = 64  # decoded tracks kept
+
+TEXT_TAGS = {b'pfil': 'path', b'tsng': 'title', b'tart': 'artist', b'talb': 'album', b'tgen': 'genre',
+             b'tbpm': 'bpm', b'tkey': 'key', b'ttyr': 'year', b'tlbl': 'label', b'tcom': 'comment'}
+
+
+class LibraryTrack:  # the fields of one 'otrk' entry we care about
+    __slots__ = tuple(TEXT_TAGS.values())
+
+    def __init__(self):
+        for name in self.__slots__:
+            setattr(self, name, '')
+
+    def __repr__(self):
+        return 'LibraryTrack(%r, %r, bpm=%r, key=%r)' % (self.artist, self.title, self.bpm, self.key)
+
+
+class Library:  # indexed view of one database V2 file
+    def __init__(self, path):
+        self.path = path
+        self.stamp = None  # (mtime_ns, size) the index was built from
+        self.indexed = 0  # bytes of complete chunks indexed
+        self.crc = 0  # crc32 of those bytes, to tell an append from a rewrite
+        self.bypath = {}  # pathkey -> offset of the track chunk
+        self.byname = {}  # (artist, title) casefolded -> offset
+        self.cache = OrderedDict()  # offset -> LibraryTrack
+        self.lock = threading.Lock()  # the index and cache above
+        self.building = False  # background rebuild started and not finished
+        self.build_lock = threading.Lock()  # one rebuild at a time
+
+    def warm(self):  # build the index in the background, so the first lookup doesn't pay for it
+        with self.lock:
+            if self.building:
+                return
+            self.building = True
+        threading.Thread(target=self._rebuild, name='library', daemon=True).start()
+
+    def lookup(self, path='', artist='', title=''):  # LibraryTrack, or None if not in the library (yet)
+        try:
+            st = os.stat(self.path)
+        except OSError:  # no database here
+            return None
+        if (st.st_mtime_ns, st.st_size) != self.stamp:
+            self.warm()  # answer from the index we have meanwhile
+        with self.lock:
+            return self._lookup(path, artist, title)
+
+    def _lookup(self, path, artist, title):
+        try:
+            offset = self.bypath.get(pathkey(path)) if path else None
+            if offset is None:
+                offset = self.byname.get((artist.casefold(), title.casefold()))
+            if offset is None:
+                return None
+            track = self.cache.get(offset)
+            if track is None:
+                track = self._decode(offset)
+                if not (path and pathkey(track.path) == pathkey(path) or
+                        (track.artist.casefold(), track.title.casefold()) == (artist.casefold(), title.casefold())):
+                    return None  # the file was rewritten since this offset was indexed
+                self.cache[offset] = track
+                if len(self.cache) > LOOKUP_CACHE:
+                    self.cache.popitem(last=False)
+            return track
+        except (OSError, ValueError):  # no database here, or it's being rewritten right now
+            return None
+
+    def enrich(self, rec):  # fill in what the session record lacks; once per record
+        if rec.bpm is not None:
+            return rec
+        rec.bpm = rec.key = ''
+        track = self.lookup(rec.path, rec.artist, rec.title)
+        if track is not None:
+            rec.bpm, rec.key = track.bpm, track.key
+            rec.album = rec.album or track.album
+            rec.genre = rec.genre or track.genre
+            rec.path = rec.path or track.path
+        return rec
+
+    def refresh(self):  # bring the index up to date with the file, on the calling thread
+        with self.build_lock:
+            st = os.stat(self.path)
+            stamp = st.st_mtime_ns, st.st_size
+            if stamp == self.stamp:
+                return
+            with open(self.path, 'rb') as f:
+                view = memoryview(f.read())  # a snapshot: Serato may rewrite the file meanwhile
+            start, crc = 0, 0
+            if self.stamp is not None and len(view) > self.indexed and \
+                    zlib.crc32(view[:self.indexed]) == self.crc:
+                start, crc = self.indexed, self.crc  # only new tracks were appended
+                bypath, byname = dict(self.bypath), dict(self.byname)
+            else:
+                bypath, byname = {}, {}
+            end = index(view, start, bypath, byname)
+            crc = zlib.crc32(view[start:end], crc)
+            with self.lock:  # lookups see either the old index or the new one, never half of it
+                self.bypath, self.byname = bypath, byname
+                self.cache = OrderedDict()
+                self.stamp, self.indexed, self.crc = stamp, end, crc
+
+    def _rebuild(self):  # background thread started by warm()
+        try:
+            self.refresh()
+        except (OSError, ValueError):  # no database here, or it's being rewritten right now
+            pass
+        finally:
+            with self.lock:
+                self.building = False
+
+    def _decode(self, offset):  # read just the one track chunk at offset
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            head = f.read(CHUNK_HEAD.size)
+            if len(head) < CHUNK_HEAD.size:
+                raise ValueError('database shrank under the index')
+            tag, length = CHUNK_HEAD.unpack(head)
+            if tag != TRACK_TAG:
+                raise ValueError('database changed under the index')
+            body = f.read(length)
+        if len(body) < length:
+            raise ValueError('database shrank under the index')
+        track = LibraryTrack()
+        for ftag, data in fields(body, 0, length):
+            name = TEXT_TAGS.get(ftag)
+            if name is not None:
+                setattr(track, name, text(data))
+        return track
+
+
+def index(buf, pos, bypath, byname):  # add every complete track chunk from pos on; returns where it stopped
+    size = len(buf)
+    while pos + CHUNK_HEAD.size <= size:
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        end = pos + CHUNK_HEAD.size + length
+        if end > size:  # half written
+            break
+        if tag == TRACK_TAG:
+            keys = {}
+            for ftag, data in fields(buf, pos + CHUNK_HEAD.size, end):
+                if ftag in KEY_TAGS:
+                    keys[ftag] = data
+                    if len(keys) == len(KEY_TAGS):  # the rest of the track isn't needed for the index
+                        break
+            if b'pfil' in keys:
+                bypath[pathkey(text(keys[b'pfil']))] = pos
+            if b'tsng' in keys or b'tart' in keys:
+                byname[(text(keys.get(b'tart', b'')).casefold(), text(keys.get(b'tsng', b'')).casefold())] = pos
+        pos = end
+    return pos
+
+
+def fields(buf, pos, end):  # (tag, data) for each field of a track chunk
+    while pos + CHUNK_HEAD.size <= end:
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        pos += CHUNK_HEAD.size
+        yield tag, buf[pos:pos + length]
+        pos += length
+
+
+def text(data):
+    return str(data, 'utf-16-be', 'replace').rstrip('\0').strip()
+
+
+def pathkey(path):  # database paths are relative to the drive root, sessions' are absolute
+    path = path.replace('\\', '/')
+    if path[1:2] == ':':  # Windows drive letter
+        path = path[2:]
+    return path.lstrip('/').casefold()
@@ -0,0 +1,130 @@
+'''
+Latency metrics for the poll -> publish path.
+
+Metrics keeps a counter per event and a fixed-bucket histogram per stage (scan,
+read, parse, fetch, enrich, format, delay, notify, write, artwork, end_to_end) and
+renders them in the Prometheus text format or as a one-line log summary. Call
+sites bracket a stage with
+
+    t0 = metrics.now()
+    ...
+    metrics.took('read', t0)
+
+When metrics are disabled now() returns None and took() returns at once, so the
+instrumented hot path costs two method calls and no clock reads.
+'''
+
+import threading
+from bisect import bisect_left
+from time import perf_counter, sleep
+
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+           30)  # upper bounds in seconds; an implicit +Inf bucket follows
+PREFIX = 'nowplaying'
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q):  # upper bound of the bucket holding the q-th observation
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+
+class Metrics:  # thread-safe counters and stage histograms
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.stages = {}
+        self.thread = None
+
+    def now(self):  # start time for took(), or None while disabled
+        return perf_counter() if self.enabled else None
+
+    def took(self, stage, t0):  # record the time since now() returned t0
+        if t0 is not None:
+            self.observe(stage, perf_counter() - t0)
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            hist = self.stages.get(stage)
+            if hist is None:
+                hist = self.stages[stage] = Histogram()
+            hist.observe(seconds)
+
+    def count(self, event, n=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[event] = self.counters.get(event, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.stages.clear()
+
+    def prometheus(self):  # text exposition format, version 0.0.4
+        lines = ['# HELP %s_events_total Poll and publish events.' % PREFIX,
+                 '# TYPE %s_events_total counter' % PREFIX]
+        with self.lock:
+            for event, n in sorted(self.counters.items()):
+                lines.append('%s_events_total{event="%s"} %d' % (PREFIX, event, n))
+            lines += ['# HELP %s_stage_seconds Time spent in each stage, end_to_end being session file '
+                      'change to output written.' % PREFIX,
+                      '# TYPE %s_stage_seconds histogram' % PREFIX]
+            for stage, hist in sorted(self.stages.items()):
+                seen = 0
+                for bound, n in zip(BUCKETS + ('+Inf',), hist.counts):
+                    seen += n
+                    lines.append('%s_stage_seconds_bucket{stage="%s",le="%s"} %d' % (PREFIX, stage, bound, seen))
+                lines.append('%s_stage_seconds_sum{stage="%s"} %r' % (PREFIX, stage, hist.sum))
+                lines.append('%s_stage_seconds_count{stage="%s"} %d' % (PREFIX, stage, hist.count))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self):  # one line for the log, '' if nothing was recorded
+        with self.lock:
+            events = ' '.join('%s=%d' % kv for kv in sorted(self.counters.items()))
+            stages = ['%s n=%d p50=%s p95=%s max=%s' % (stage, h.count, ms(h.quantile(0.5)), ms(h.quantile(0.95)),
+                                                         ms(h.max))
+                      for stage, h in sorted(self.stages.items())]
+        if not events and not stages:
+            return ''
+        return 'metrics: ' + '; '.join(filter(None, [events] + stages))
+
+    def logevery(self, interval, log=print):  # print summary() every interval seconds while enabled
+        if self.thread is not None or interval <= 0:
+            return
+
+        def run():
+            while True:
+                sleep(interval)
+                line = self.summary() if self.enabled else ''
+                if line:
+                    log(line)
+        self.thread = threading.Thread(target=run, name='metrics', daemon=True)
+        self.thread.start()
+
+
+def ms(seconds):
+    return '%.2fms' % (seconds * 1000)
@@ -0,0 +1,541 @@
+'''
+Now Playing core: config, polling, track lookup and publishing, without any UI.
+
+Importing this module loads neither Qt nor the remote-mode dependencies. Qt
+belongs to ui.py, which only the tray entry point imports; requests and lxml
+load on the first remote poll, and asyncio with the status server. A headless
+capture box in local mode therefore starts with just the standard library.
+'''
+
+import configparser
+import os
+import sys
+import threading
+from time import time
+from session import SessionIndex, SessionReader, TrackRecord
+from watcher import Cadence, PollWatcher, watch
+from engine import Poller, Timers
+from output import HtmlSink, JsonSink, OutputWriter, TextSink
+from history import PlayHistory
+from template import DEFAULT_HTML, DEFAULT_NOTIF, Template, TemplateError, legacy
+from metrics import Metrics
+from sources import LOCKED, RETRY, Engine, fresh, played, playlisttrack, readsources, sessdir, sessfile, sessiontrack
+from library import Library
+from artwork import ArtConf, ArtSink, ArtWorker
+from broadcast import FORMATS, UdpConf, UdpSink, destinations
+from checkpoint import STATE_FILE, Checkpoint, capture, restore
+
+# define global variables
+track = ''
+watcher = watchkey = None
+cadence = None  # remote mode's polling step, learned from the track changes it saw
+WATCH_TIMEOUT = 5  # re-check at least this often without events, e.g. on network mounts
+
+# set paths for bundled files
+if getattr(sys, 'frozen', False) and sys.platform == "darwin":
+    bundle_dir = os.path.dirname(sys.executable)  # sys._MEIPASS
+else:
+    bundle_dir = os.path.dirname(os.path.abspath(__file__))
+config_file = os.path.abspath(os.path.join(bundle_dir, "bin/config.ini"))
+
+# create needed object instances
+sessindex = SessionIndex()
+sessreader = SessionReader()
+fetcher = extractor = None  # remote mode only, created on the first remote poll
+library = None  # database V2 of the configured libpath, for BPM/key and missing fields
+metrics = Metrics()
+output = OutputWriter()
+timers = Timers()  # the write delay and retries, so the poller never sleeps
+pending = None  # Timer of the track waiting out the write delay
+artwork = ArtWorker()  # cover art next to the text file, extracted off the output thread
+history = PlayHistory()
+state = Checkpoint()  # warm-start state, saved after each publish
+server = None
+notifiers = []  # callables taking the notification text, e.g. the tray's balloon
+
+
+class ConfigFile:  # read-only snapshot of config.ini, each with its own parser
+    def __init__(self, cfile, overrides=None):
+        self.cparser = configparser.ConfigParser()
+        self.cfile = cfile
+        settings = self.cparser
+
+        try:
+            self.cparser.read(self.cfile)
+            self.cparser.sections()
+            if overrides:  # command line flags win over config.ini, but are never saved to it
+                settings = configparser.ConfigParser()
+                settings.read_dict(self.cparser)
+                settings.read_dict({'Settings': overrides})
+
+            self.local = is_bool(settings.get('Settings', 'local'))
+            self.libpath = settings.get('Settings', 'libpath')
+            self.url = settings.get('Settings', 'url')
+            self.file = settings.get('Settings', 'file')
+            self.interval = settings.get('Settings', 'interval')
+            self.adaptive = is_bool(settings.get('Settings', 'adaptive', fallback='True'))
+            self.interval_min = settings.get('Settings', 'interval_min', fallback='2')
+            self.interval_max = settings.get('Settings', 'interval_max', fallback='30')
+            self.delay = settings.get('Settings', 'delay')
+            self.multi = is_bool(settings.get('Settings', 'multi'))
+            self.quote = is_bool(settings.get('Settings', 'quote'))
+            self.a_pref = settings.get('Settings', 'a_pref').replace("|_0", " ")
+            self.a_suff = settings.get('Settings', 'a_suff').replace("|_0", " ")
+            self.s_pref = settings.get('Settings', 's_pref').replace("|_0", " ")
+            self.s_suff = settings.get('Settings', 's_suff').replace("|_0", " ")
+            self.notif = is_bool(settings.get('Settings', 'notif'))
+            self.json_file = settings.get('Settings', 'json_file', fallback='')
+            self.html_file = settings.get('Settings', 'html_file', fallback='')
+            self.udp = settings.get('Settings', 'udp', fallback='')
+            self.udp_format = settings.get('Settings', 'udp_format', fallback='osc').strip().lower()
+            self.dedupe = settings.get('Settings', 'dedupe', fallback='30')
+            self.server_host = settings.get('Settings', 'server_host', fallback='127.0.0.1')
+            self.server_port = settings.get('Settings', 'server_port', fallback='')
+            self.metrics = is_bool(settings.get('Settings', 'metrics', fallback='False'))
+            self.metrics_log = settings.get('Settings', 'metrics_log', fallback='300')
+            self.artwork = is_bool(settings.get('Settings', 'artwork', fallback='False'))
+            self.artwork_sizes = settings.get('Settings', 'artwork_sizes', fallback='300')
+            self.artwork_cache = settings.get('Settings', 'artwork_cache', fallback='64')
+            self.template = settings.get('Settings', 'template', fallback='').replace("|_0", " ")
+            self.notif_template = settings.get('Settings', 'notif_template', fallback='').replace("|_0", " ")
+            self.html_template = settings.get('Settings', 'html_template', fallback='').replace("|_0", " ")
+
+            if is_number(self.interval) is False:
+                self.interval = 10
+            if is_number(self.interval_min) is False:
+                self.interval_min = 2
+            if is_number(self.interval_max) is False:
+                self.interval_max = 30
+            if is_number(self.delay) is False:
+                self.delay = 0
+            if is_number(self.dedupe) is False:
+                self.dedupe = 0
+            if is_number(self.metrics_log) is False:
+                self.metrics_log = 0
+            if is_number(self.artwork_cache) is False:
+                self.artwork_cache = 64
+            if self.udp_format not in FORMATS:
+                self.udp_format = 'osc'
+
+            self.interval = float(self.interval)
+            self.interval_min = max(0.5, float(self.interval_min))
+            self.interval_max = max(self.interval_min, float(self.interval_max))
+            self.delay = float(self.delay)
+            self.dedupe = float(self.dedupe)
+            self.metrics_log = float(self.metrics_log)
+            self.server_port = int(self.server_port) if self.server_port.isdigit() else 0
+            self.artwork_sizes = tuple(sorted({int(size) for size in self.artwork_sizes.replace(',', ' ').split()
+                                               if size.isdigit() and int(size) > 0}, reverse=True))
+            self.artwork_cache = float(self.artwork_cache)
+            art = None
+            if self.artwork:
+                art = ArtConf(self.artwork_sizes, os.path.join(os.path.dirname(os.path.abspath(self.cfile)),
+                                                               'artcache'), int(self.artwork_cache * (1 << 20)))
+
+            # compile templates once per snapshot; blank means the legacy prefix/suffix format
+            self.text_tpl = compiletemplate(self.template, legacy(self.a_pref, self.a_suff, self.s_pref,
+                                                                  self.s_suff, self.quote, self.multi))
+            self.notif_tpl = compiletemplate(self.notif_template, DEFAULT_NOTIF)
+            self.html_tpl = compiletemplate(self.html_template, DEFAULT_HTML)
+            self.art = art
+            udp = destinations(self.udp)
+            self.broadcast = UdpConf(udp, self.udp_format) if udp else None
+            self.cadence = (self.interval_min, self.interval_max) if self.adaptive else None
+            self.sources = readsources(settings, self.interval, self.text_tpl, self.html_tpl, art, self.cadence,
+                                       self.udp_format, self.delay)
+        except configparser.NoOptionError:
+            pass
+        self._frozen = True
+
+    def __setattr__(self, name, value):  # snapshots are shared between threads, so never change one
+        if getattr(self, '_frozen', False):
+            raise AttributeError('config snapshot is read-only')
+        super().__setattr__(name, value)
+
+    def values(self):  # comparable view of the parsed settings
+        return {k: v for k, v in vars(self).items() if k not in ('cparser', '_frozen')}
+
+    def put(self, local, libpath, url, file, interval, delay, multi, quote, a_pref, a_suff, s_pref, s_suff, notif,
+            template='', notif_template=''):
+        cparser = configparser.ConfigParser()
+        cparser.read_dict(self.cparser)
+        if not cparser.has_section('Settings'):
+            cparser.add_section('Settings')
+        cparser.set('Settings', 'local', local)
+        cparser.set('Settings', 'libpath', libpath)
+        cparser.set('Settings', 'url', url)
+        cparser.set('Settings', 'file', file)
+        cparser.set('Settings', 'interval', interval)
+        cparser.set('Settings', 'delay', delay)
+        cparser.set('Settings', 'multi', str(multi))
+        cparser.set('Settings', 'quote', str(quote))
+        cparser.set('Settings', 'a_pref', a_pref)
+        cparser.set('Settings', 'a_suff', a_suff)
+        cparser.set('Settings', 's_pref', s_pref)
+        cparser.set('Settings', 's_suff', s_suff)
+        cparser.set('Settings', 'notif', str(notif))
+        cparser.set('Settings', 'template', template)
+        cparser.set('Settings', 'notif_template', notif_template)
+
+        # write a temp file and swap it in, so a reader never sees a half written config
+        tmp = self.cfile + '.tmp'
+        with open(tmp, 'w') as cf:
+            cparser.write(cf)
+        os.replace(tmp, self.cfile)
+
+
+class ConfigStore:  # hands out the current ConfigFile snapshot, re-read only when config.ini changes
+    CHECK_INTERVAL = 1  # seconds between mtime checks
+
+    def __init__(self, cfile, overrides=None):
+        self.cfile = cfile
+        self.overrides = overrides or {}
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.mtime = None
+        self.checked = 0
+        self.snap = None
+
+    def get(self):  # current snapshot; cheap enough to call on every poll
+        now = time()
+        if self.snap is None or now - self.checked >= self.CHECK_INTERVAL:
+            self.checked = now
+            if self._mtime() != self.mtime:
+                self.reload()
+        return self.snap
+
+    def reload(self):  # parse config.ini now, e.g. right after the settings window saved it
+        with self.lock:
+            mtime = self._mtime()
+            new = ConfigFile(self.cfile, self.overrides)
+            old, self.snap = self.snap, new  # readers keep whichever snapshot they already hold
+            self.mtime = mtime
+        if old is not None and old.values() != new.values():
+            for listener in self.listeners:
+                listener(old, new)
+        return new
+
+    def saved(self):  # config.ini alone, without command line overrides: what the settings window shows and saves
+        return ConfigFile(self.cfile) if self.overrides else self.get()
+
+    def use(self, cfile, overrides=None):  # switch to another config.ini and/or command line overrides
+        self.cfile = cfile
+        self.overrides = overrides or {}
+        return self.reload()
+
+    def subscribe(self, listener):  # listener(old, new) runs on whichever thread noticed the change
+        self.listeners.append(listener)
+
+    def _mtime(self):
+        try:
+            return os.stat(self.cfile).st_mtime_ns
+        except OSError:
+            return None
+
+
+confstore = ConfigStore(config_file)
+
+
+# FUNCTIONS ####
+def is_number(s):  # test for number type
+    try:
+        float(s)
+        return True
+    except ValueError:
+        return False
+
+
+def compiletemplate(source, default):  # compiled template, or the default (source or Template) if blank or broken
+    if source:
+        try:
+            return Template(source)
+        except TemplateError as e:
+            print(e)
+    return default if isinstance(default, Template) else Template(default)
+
+
+def is_bool(s):  # test for bool type
+    if s == "False":
+        return 0
+    else:
+        return 1
+
+
+def init():  # start the optional services: metrics, extra sources and the status server
+    conf = confstore.get()
+    warmstart()
+    setmetrics(None, conf)
+    engine.configure(conf.sources, conf.dedupe)
+    if conf.libpath:
+        getlibrary(conf.libpath)  # starts indexing it
+    startserver()
+
+
+def start():  # poll the main source, if it has somewhere to write, and the extra ones
+    conf = confstore.get()
+    if conf.file or conf.json_file or conf.html_file or conf.broadcast:
+        poller.start()
+    engine.start()
+
+
+def paused():
+    return poller.paused or engine.paused
+
+
+def pause():
+    poller.pause()
+    engine.pause()
+
+
+def resume():
+    poller.resume()
+    engine.resume()
+
+
+def startserver():  # serve current/recent tracks to overlays, if a port is set
+    global server
+    conf = confstore.get()
+    if conf.server_port and server is None:
+        from server import NowPlayingServer  # pulls in asyncio, so only when serving
+        server = NowPlayingServer(history, conf.server_host, conf.server_port, metrics)
+        if not server.start():  # e.g. the port is taken: run without it
+            server = None
+
+
+def shutdown():  # stop polling and serving, and blank the output files
+    poller.stop()
+    engine.stop()
+    if pending is not None:
+        timers.cancel(pending)
+    if server is not None:
+        server.stop()
+    output.configure(getsinks(confstore.get()))
+    output.publish('')
+    for source in engine.sources:
+        source.write('')
+    output.flush(5)
+    artwork.flush(5)
+    savestate(confstore.get(), None, None)  # outputs are blank now: publish again on the next start
+
+
+def check():  # one poll for new track info
+    metrics.count('polls')
+    return gettrack(confstore.get(), track)
+
+
+def main(new):  # handle new track info found by the poller
+    global track, pending
+    conf = confstore.get()
+    new, rec, origin = new
+    track = new
+
+    # whatever was still waiting out the delay is stale now
+    if pending is not None and timers.cancel(pending):
+        print("superseded before the delay was up: " + pending.args[1])
+        metrics.count('superseded')
+    pending = None
+
+    # skip tracks that were already published a moment ago (reloads, A -> B -> A deck swaps)
+    if not fresh(history, rec, conf.dedupe):
+        print("played recently, skipping: " + new)
+        metrics.count('duplicates')
+        return
+    metrics.count('tracks')
+
+    # write new track info once the delay is up, without holding up the poller meanwhile
+    tinfo = new  # conf.pref + new + conf.suff
+    if 'No Song Data' in tinfo:
+        tinfo = ''
+    if conf.delay > 0:
+        pending = timers.call_later(conf.delay, publish, conf, tinfo, rec, origin, metrics.now())
+    else:
+        publish(conf, tinfo, rec, origin, None)
+
+
+def publish(conf, tinfo, rec, origin, t0):  # notify and write a track main() let through
+    metrics.took('delay', t0)
+    played(history, rec)
+
+    # display new track info in system notification
+    if conf.notif == 1:
+        t0 = metrics.now()
+        tip = conf.notif_tpl.render(rec) or tinfo
+        for notify in notifiers:
+            notify(tip)
+        metrics.took('notify', t0)
+
+    output.configure(getsinks(conf))
+    output.publish(tinfo, rec, origin)
+    if server is not None:
+        server.publish(tinfo, rec)
+    timers.call_later(0, savestate, conf, track, rec)
+
+
+def warmstart():  # warm start from the state the last run saved, if it still holds
+    global track
+    conf = confstore.get()
+    saved = state.load(statefile())
+    if saved is None or saved.get('local') != bool(conf.local) or saved.get('source') != source(conf):
+        return
+    if conf.local and not restore(sessindex, sessreader, saved, sessdir(conf.libpath)):
+        return
+    if saved.get('text') is None:  # shut down cleanly, outputs blank
+        return
+    rec = TrackRecord()
+    for name, value in (saved.get('track') or {}).items():
+        if name in TrackRecord.__slots__:
+            setattr(rec, name, value)
+    track = saved['text']
+    history.add(rec, saved['time'])
+    print("resuming after: " + track)
+
+
+def savestate(conf, text, rec):  # what warmstart() needs; text None once the outputs are blank
+    saved = {'time': time(), 'local': bool(conf.local), 'source': source(conf), 'text': text,
+             'track': None if rec is None else {name: getattr(rec, name) for name in TrackRecord.__slots__}}
+    if conf.local:
+        saved['session'] = capture(sessindex, sessreader)
+    state.save(statefile(), saved)
+
+
+def statefile():  # next to config.ini, like the artwork cache
+    return os.path.join(os.path.dirname(os.path.abspath(confstore.cfile)), STATE_FILE)
+
+
+def source(conf):
+    return conf.libpath if conf.local else conf.url
+
+
+def written(origin, took):  # output writer thread, once a track is on disk
+    metrics.observe('write', took)
+    if origin is not None:
+        metrics.observe('end_to_end', time() - origin)
+
+
+def setmetrics(old, new):
+    metrics.enabled = bool(new.metrics)
+    if new.metrics:
+        metrics.logevery(new.metrics_log)
+
+
+def getsinks(conf):  # output files configured in this snapshot
+    sinks = []
+    if conf.broadcast is not None:  # first, it's the one waiting on nothing
+        sinks.append(UdpSink(conf.broadcast))
+    if conf.file:
+        sinks.append(TextSink(conf.file))
+    if conf.json_file:
+        sinks.append(JsonSink(conf.json_file))
+    if conf.html_file:
+        sinks.append(HtmlSink(conf.html_file, conf.html_tpl))
+    if conf.file and conf.art is not None:
+        sinks.append(ArtSink(conf.file, artwork, conf.art))
+    return sinks
+
+
+def getwatcher():  # wait for session writes locally, poll the live playlist remotely
+    global watcher, watchkey, cadence
+    conf = confstore.get()
+    if conf.local:
+        key = (True, conf.libpath)
+    else:
+        key = (False, conf.interval, conf.cadence)
+
+    if watcher is None or key != watchkey:
+        if watcher is not None:
+            watcher.close()
+        if conf.local:
+            cadence = None
+            watcher = watch(sessdir(conf.libpath), timeout=WATCH_TIMEOUT)
+        else:
+            cadence = Cadence(conf.interval, *conf.cadence) if conf.cadence else None
+            watcher = PollWatcher(None, conf.interval, cadence)
+        watchkey = key
+    return watcher
+
+
+def getremote():  # live playlist fetcher and extractor; requests and lxml load here, on first use
+    global fetcher, extractor
+    if fetcher is None:
+        from remote import PlaylistExtractor, PlaylistFetcher
+        fetcher = PlaylistFetcher()
+        extractor = PlaylistExtractor()
+    return fetcher, extractor
+
+
+def getlibrary(libpath):  # index of libpath's database V2, kept while libpath stays the same
+    global library
+    path = os.path.join(libpath, "database V2")
+    if library is None or library.path != path:
+        library = Library(path)
+        library.warm()
+    return library
+
+
+def resetremote(old, new):  # re-render with new settings
+    if fetcher is not None:
+        fetcher.reset()
+        extractor.reset()
+
+
+poller = Poller(check, main, getwatcher)
+output.report = written
+artwork.report = lambda took: metrics.observe('artwork', took)
+confstore.subscribe(resetremote)
+confstore.subscribe(setmetrics)
+confstore.subscribe(lambda old, new: poller.wake())  # don't sit out a wait with stale settings
+engine = Engine(getsinks, timers)
+confstore.subscribe(lambda old, new: engine.configure(new.sources, new.dedupe))
+
+
+def gettrack(c, t):  # get last played track
+    conf = c
+    tk = t
+    print("checking...")
+    if conf.local:  # locally derived
+        found = getlasttrack(sessdir(conf.libpath))
+        if found is False:
+            return False
+        rec, origin = found
+    else:  # remotely derived
+        fetcher, extractor = getremote()
+        rec = playlisttrack(fetcher, extractor, cadence, conf.url, history, metrics)
+        if rec is None:
+            return False
+        origin = None  # no way to tell when Serato uploaded it
+
+    if conf.libpath:
+        t0 = metrics.now()
+        getlibrary(conf.libpath).enrich(rec)
+        metrics.took('enrich', t0)
+
+    t0 = metrics.now()
+    if rec.artist == '' and rec.title == '':
+        tdat = 'No Song Data'
+    else:
+        tdat = conf.text_tpl.render(rec)
+    metrics.took('format', t0)
+
+    if tdat != tk:
+        return tdat, rec, origin
+    else:
+        return False
+
+
+def getsessfile(directory, showlast=True):
+    file = sessfile(sessindex, directory, metrics, showlast)
+    return False if file is None else file
+
+
+def getlasttrack(s):  # last track played in the newest session file of s
+    found = sessiontrack(sessindex, sessreader, s, metrics)
+    if found is LOCKED:  # look again shortly rather than wait here
+        timers.call_later(RETRY, poller.wake)
+        return False
+    if found is None:
+        return False
+    rec, sess = found
+    return rec, os.path.getmtime(sess) if metrics.enabled else None  # when Serato wrote it, for end_to_end
+
+
+# END FUNCTIONS ####
@@ -0,0 +1,172 @@
+'''
+Writing published tracks out for OBS and other consumers.
+
+Every sink renders the track its own way (plain text, JSON, an HTML snippet) and
+writes its file through a temp file + os.replace, so a reader polling the file sees
+either the old or the new content and never a truncated one. A sink skips the write
+when its content didn't change, and keeps its last few renders so a track coming
+back (A -> B -> A) isn't rendered again.
+
+OutputWriter does the writing on its own thread. The poller only drops the newest
+track in a slot and moves on; if tracks arrive faster than the disk keeps up, the
+stale ones are skipped.
+'''
+
+import html
+import json
+import os
+import threading
+from collections import OrderedDict
+from time import perf_counter, sleep
+
+RENDER_CACHE = 8  # renders kept per sink
+REPLACE_RETRIES = 5  # Windows refuses os.replace while another process has the file open
+
+
+class Sink:  # one output file
+    def __init__(self, path):
+        self.path = path
+        self.written = None  # content last written, None until we know
+        self.cache = OrderedDict()
+
+    @property
+    def key(self):  # sinks with the same key can be reused across config changes
+        return type(self), self.path
+
+    def render(self, text, rec):  # subclasses turn a track into file content
+        raise NotImplementedError
+
+    def rendered(self, text, rec):
+        key = (text,) if rec is None else (text,) + fields(rec)  # every field, as any of them may be rendered
+        content = self.cache.get(key)
+        if content is None:
+            content = self.cache[key] = self.render(text, rec)
+            if len(self.cache) > RENDER_CACHE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return content
+
+    def write(self, text, rec):  # True if the file was actually written
+        content = self.rendered(text, rec)
+        if self.written is None:
+            self.written = read(self.path)
+        if content == self.written:
+            return False
+        atomic_write(self.path, content)
+        self.written = content
+        return True
+
+
+class TextSink(Sink):  # the formatted line(s), as before
+    def render(self, text, rec):
+        return text
+
+
+class JsonSink(Sink):  # structured fields for overlays
+    def render(self, text, rec):
+        return tojson(text, rec)
+
+
+class HtmlSink(Sink):  # snippet for a browser source, from a template
+    def __init__(self, path, template):
+        super().__init__(path)
+        self.template = template
+
+    @property
+    def key(self):
+        return type(self), self.path, self.template
+
+    def render(self, text, rec):
+        if rec is None or text == '':
+            return ''
+        return self.template.render(rec, html.escape)
+
+
+class OutputWriter:  # fans each published track out to every sink, off the poller thread
+    def __init__(self):
+        self.sinks = []
+        self.cond = threading.Condition()
+        self.pending = None  # newest (text, rec, origin) not written yet
+        self.busy = False
+        self.thread = None
+        self.report = None  # report(origin, seconds) after each track is written, if set
+
+    def configure(self, sinks):  # swap in a new sink list, keeping caches of unchanged sinks
+        with self.cond:
+            old = {s.key: s for s in self.sinks}
+            self.sinks = [old.get(s.key, s) for s in sinks]
+
+    def publish(self, text, rec=None, origin=None):  # queue a track; returns at once
+        with self.cond:
+            self.pending = (text, rec, origin)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='output', daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def flush(self, timeout=None):  # wait until everything published so far is on disk
+        with self.cond:
+            return self.cond.wait_for(lambda: self.pending is None and not self.busy, timeout)
+
+    def _run(self):
+        while True:
+            with self.cond:
+                self.cond.wait_for(lambda: self.pending is not None)
+                (text, rec, origin), self.pending = self.pending, None
+                sinks = self.sinks
+                self.busy = True
+            t0 = perf_counter()
+            for sink in sinks:
+                try:
+                    if sink.write(text, rec):
+                        print("writing...")
+                except OSError as e:
+                    print("could not write %s: %s" % (sink.path, e))
+            if self.report is not None:
+                self.report(origin, perf_counter() - t0)
+            with self.cond:
+                self.busy = False
+                self.cond.notify_all()
+
+
+def tojson(text, rec):  # a track as JsonSink writes it (and UdpSink sends it), {} once blanked
+    if rec is None or text == '':
+        return '{}'
+    return json.dumps({'text': text, 'artist': rec.artist, 'title': rec.title, 'album': rec.album,
+                       'genre': rec.genre, 'bpm': rec.bpm or '', 'key': rec.key or '', 'deck': rec.deck,
+                       'path': rec.path}, ensure_ascii=False)
+
+
+def fields(rec):  # every field of a track record, e.g. to key a render cache
+    return tuple(getattr(rec, name) for name in rec.__slots__)
+
+
+def read(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+
+def atomic_write(path, content):  # write next to path, then swap it into place
+    tmp = os.path.join(os.path.dirname(path), '.%s.tmp' % os.path.basename(path))
+    with opened(tmp, content) as f:
+        f.write(content)
+    for attempt in range(REPLACE_RETRIES):
+        try:
+            os.replace(tmp, path)
+            return
+        except PermissionError:
+            sleep(0.05 * (attempt + 1))
+    # still locked: fall back to writing in place rather than losing the update
+    os.remove(tmp)
+    with opened(path, content) as f:
+        f.write(content)
+
+
+def opened(path, content):  # bytes for images, UTF-8 text for the rest
+    if isinstance(content, bytes):
+        return open(path, 'wb')
+    return open(path, 'w', encoding='utf-8')
@@ -0,0 +1,172 @@
+'''
+Remote mode: fetching the Serato Live playlist page and pulling track names out of it.
+
+PlaylistFetcher keeps one pooled requests.Session for the life of the app (or uses
+one it's given, so several playlists share a connection pool), sends
+ETag/Last-Modified validators so an unchanged page costs a 304 instead of a download,
+skips bodies identical to the last one, never waits on the network longer than its
+timeouts, and backs off exponentially (with jitter) while the site is failing.
+
+PlaylistExtractor never builds a DOM. It counts the track-name markers in the raw
+page, cuts the page down to the entries added since the previous poll and runs only
+that tail through an lxml parser target, so parse cost follows the number of new
+tracks rather than the length of the set.
+'''
+
+import random
+import zlib
+from time import time
+
+import requests
+from lxml import etree
+from requests.adapters import HTTPAdapter
+
+TIMEOUT = (3.05, 5)  # connect, read
+BACKOFF_BASE = 2  # seconds after the first failure, doubled per failure after that
+BACKOFF_MAX = 120
+TRACK_CLASS = 'playlist-trackname'
+TRACK_MARKER = 'class="%s"' % TRACK_CLASS
+
+
+class PlaylistFetcher:  # conditional, pooled GETs with backoff
+    def __init__(self, timeout=TIMEOUT, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, session=None):
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.owned = session is None  # close() leaves a shared session alone
+        self.session = pooled(2) if session is None else session
+        self.reset()
+
+    def reset(self):  # forget validators and backoff, so the next fetch returns the page again
+        self.url = None
+        self.etag = self.modified = None
+        self.digest = None
+        self.failures = 0
+        self.retry_at = 0
+
+    def fetch(self, url):  # page text if it changed since the last call, else None
+        if url != self.url:
+            self.reset()
+            self.url = url
+        if time() < self.retry_at:  # still backing off
+            return None
+
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.modified:
+            headers['If-Modified-Since'] = self.modified
+
+        try:
+            page = self.session.get(url, headers=headers, timeout=self.timeout)
+            if page.status_code != 304:
+                page.raise_for_status()
+        except requests.RequestException as e:
+            self.failed(e)
+            return None
+
+        self.failures = 0
+        if page.status_code == 304:
+            return None
+        self.etag = page.headers.get('ETag')
+        self.modified = page.headers.get('Last-Modified')
+
+        digest = zlib.crc32(page.content)
+        if digest == self.digest:  # server ignores validators, but nothing changed
+            return None
+        self.digest = digest
+        return page.text
+
+    def failed(self, err):
+        self.failures += 1
+        delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+        delay *= random.uniform(0.5, 1)  # jitter, so restarts don't all retry in lockstep
+        self.retry_at = time() + delay
+        print("fetch failed (%s), retrying in %.1fs" % (err, delay))
+
+    def close(self):
+        if self.owned:
+            self.session.close()
+
+
+class TrackNameTarget:  # lxml parser target: direct text of each playlist-trackname div
+    def __init__(self):
+        self.names = []
+        self.text = None  # text parts of the div we're in, None when outside one
+        self.depth = 0  # elements nested inside that div
+
+    def start(self, tag, attrib):
+        if self.text is not None:
+            self.depth += 1
+        elif tag == 'div' and attrib.get('class') == TRACK_CLASS:
+            self.text = []
+
+    def end(self, tag):
+        if self.text is None:
+            return
+        if self.depth:
+            self.depth -= 1
+        else:
+            self.names.append(''.join(self.text))
+            self.text = None
+
+    def data(self, data):
+        if self.text is not None and not self.depth:
+            self.text.append(data)
+
+    def close(self):  # hand back the names and get ready for the next page
+        names, self.names, self.text, self.depth = self.names, [], None, 0
+        return names
+
+
+class PlaylistExtractor:  # track names added to the playlist since the previous page
+    def __init__(self):
+        self.target = TrackNameTarget()
+        self.parser = etree.HTMLParser(target=self.target)
+        self.reset()
+
+    def reset(self):  # next page counts as the first one again
+        self.count = 0
+        self.last = None
+        self.fresh = True
+
+    def parse(self, html):
+        return etree.fromstring(html, self.parser) or []
+
+    def extract(self, page):  # new names, oldest first; just the newest one on the first page
+        total = page.count(TRACK_MARKER)
+        first = self.count == 0 or total < self.count  # fresh start, or a new (shorter) playlist
+        want = 1 if first else max(1, total - self.count)
+
+        names = self.parse(tail(page, want)) if total else []
+        if len(names) != want:  # markup isn't what the cheap path expects; parse the lot
+            names = self.parse(page)
+            total = len(names)
+            first = self.count == 0 or total < self.count
+            want = 1 if first else max(1, total - self.count)
+            names = names[-want:]
+
+        if not first and total == self.count and names[-1:] == [self.last]:
+            names = []  # page changed elsewhere, no new track
+        self.count = total
+        self.fresh = first  # names are where the playlist stood, not what was just added
+        if names:
+            self.last = names[-1]
+        return names
+
+
+def pooled(size):  # requests.Session keeping up to size connections per host
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=size, pool_maxsize=size, max_retries=0)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def tail(page, n):  # page from the start of the n-th last track name div on
+    pos = len(page)
+    for _ in range(n):
+        pos = page.rfind(TRACK_MARKER, 0, pos)
+        if pos == -1:
+            return page
+    return page[page.rfind('<', 0, pos):]
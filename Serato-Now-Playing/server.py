@@ -0,0 +1,204 @@
+'''
+Optional now-playing server for browser overlays and bots.
+
+Runs an asyncio loop on its own thread and serves:
+
+    GET /now      current track as JSON
+    GET /recent   recent plays as JSON (?n=10)
+    GET /events   Server-Sent Events stream, one event per track change
+    GET /ws       WebSocket, one text message per track change
+    GET /metrics  latency metrics in the Prometheus text format, when enabled
+
+publish() only schedules work on the server loop, so the poller never waits on
+clients. Each change is encoded once; every subscriber awaits the same shared
+future and writes the same bytes, so the per-change cost doesn't grow with the
+number of subscribers on the publishing side.
+'''
+
+import asyncio
+import base64
+import hashlib
+import json
+import struct
+import threading
+from time import time
+from urllib.parse import parse_qs, urlsplit
+
+WS_GUID = b'258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+MAX_HEADER = 16384
+RECENT_MAX = 100
+
+
+class NowPlayingServer:  # HTTP + SSE + WebSocket on a background asyncio loop
+    def __init__(self, history, host='127.0.0.1', port=8899, metrics=None):
+        self.history = history
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.current = b'{}'  # JSON of the current track
+        self.changed = None  # future resolved with (sse bytes, ws bytes, next future) on each change
+        self.clients = 0
+        self.ready = threading.Event()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name='server', daemon=True)
+        self.thread.start()
+        self.ready.wait(5)
+        return self.server is not None
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(5)
+
+    def publish(self, text, rec=None):  # from any thread; returns immediately
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self._announce, text, rec, time())
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self.server.sockets[0].getsockname()[1]
+            self.changed = self.loop.create_future()
+        except OSError as e:
+            print("now playing server could not start: %s" % e)
+            self.server = None
+            loop, self.loop = self.loop, None  # publish() is a no-op from here on
+            loop.close()
+            return
+        finally:
+            self.ready.set()
+        print("now playing server on http://%s:%d/" % (self.host, self.port))
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            for task in asyncio.all_tasks(self.loop):
+                task.cancel()
+            self.loop.run_until_complete(asyncio.sleep(0))
+            self.loop.close()
+
+    def _announce(self, text, rec, when):  # on the loop: encode once, wake every subscriber
+        self.current = json.dumps(trackjson(text, rec, when), ensure_ascii=False).encode()
+        fut, self.changed = self.changed, self.loop.create_future()
+        fut.set_result((b'data: ' + self.current + b'\n\n', wsframe(self.current), self.changed))
+
+    async def _handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+            if len(head) > MAX_HEADER:
+                return
+            lines = head.decode('latin-1').split('\r\n')
+            method, target, _ = (lines[0].split(' ') + ['', ''])[:3]
+            headers = {}
+            for line in lines[1:]:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+            url = urlsplit(target)
+
+            if method != 'GET':
+                await respond(writer, 405, b'{"error": "GET only"}')
+            elif url.path == '/now':
+                await respond(writer, 200, self.current)
+            elif url.path == '/recent':
+                n = parse_qs(url.query).get('n', ['10'])[0]
+                n = min(int(n), RECENT_MAX) if n.isdigit() else 10
+                plays = [{'artist': p.artist, 'title': p.title, 'time': p.time} for p in self.history.recent(n)]
+                await respond(writer, 200, json.dumps(plays, ensure_ascii=False).encode())
+            elif url.path == '/metrics' and self.metrics is not None and self.metrics.enabled:
+                await respond(writer, 200, self.metrics.prometheus().encode(), 'text/plain; version=0.0.4')
+            elif url.path == '/events':
+                await self._events(writer)
+            elif url.path == '/ws' and headers.get('upgrade', '').lower() == 'websocket':
+                await self._websocket(reader, writer, headers.get('sec-websocket-key', ''))
+            else:
+                await respond(writer, 404, b'{"error": "not found"}')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        except asyncio.CancelledError:  # server shutting down
+            pass
+        finally:
+            writer.close()
+
+    async def _events(self, writer):
+        writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n'
+                     b'Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n'
+                     b'data: ' + self.current + b'\n\n')
+        await self._subscribe(writer, 0, self.changed)
+
+    async def _websocket(self, reader, writer, key):
+        accept = base64.b64encode(hashlib.sha1(key.encode() + WS_GUID).digest())
+        writer.write(b'HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n'
+                     b'Sec-WebSocket-Accept: ' + accept + b'\r\n\r\n' + wsframe(self.current))
+        push = asyncio.ensure_future(self._subscribe(writer, 1, self.changed))
+        try:
+            await wsread(reader, writer)  # returns when the client closes
+        finally:
+            push.cancel()
+
+    async def _subscribe(self, writer, which, changed):  # write every change after the one already sent
+        # changed is the future taken along with the current track, so a change during a drain isn't missed
+        self.clients += 1
+        try:
+            await writer.drain()
+            while True:
+                msg = await asyncio.shield(changed)
+                changed = msg[2]
+                writer.write(msg[which])
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+
+
+def trackjson(text, rec, when):
+    if rec is None or text == '':
+        return {}
+    return {'text': text, 'artist': rec.artist, 'title': rec.title, 'album': rec.album, 'genre': rec.genre,
+            'bpm': rec.bpm or '', 'key': rec.key or '', 'deck': rec.deck, 'time': when}
+
+
+async def respond(writer, status, body, ctype='application/json'):
+    reason = {200: 'OK', 404: 'Not Found', 405: 'Method Not Allowed'}[status]
+    writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: %s; charset=utf-8\r\n'
+                 b'Access-Control-Allow-Origin: *\r\nContent-Length: %d\r\nConnection: close\r\n\r\n'
+                 % (status, reason.encode(), ctype.encode(), len(body)) + body)
+    await writer.drain()
+
+
+def wsframe(payload, opcode=0x1):  # unmasked server frame
+    n = len(payload)
+    if n < 126:
+        head = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return head + payload
+
+
+async def wsread(reader, writer):  # answer pings, return on close; clients only listen
+    while True:
+        b1, b2 = await reader.readexactly(2)
+        opcode = b1 & 0x0f
+        n = b2 & 0x7f
+        if n == 126:
+            n = struct.unpack('!H', await reader.readexactly(2))[0]
+        elif n == 127:
+            n = struct.unpack('!Q', await reader.readexactly(8))[0]
+        mask = await reader.readexactly(4) if b2 & 0x80 else b'\0\0\0\0'
+        data = bytes(b ^ mask[i % 4] for i, b in enumerate(await reader.readexactly(n)))
+        if opcode == 0x8:  # close
+            writer.write(wsframe(data[:2], 0x8))
+            await writer.drain()
+            return
+        if opcode == 0x9:  # ping
+            writer.write(wsframe(data, 0xA))
+            await writer.drain()
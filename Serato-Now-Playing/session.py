@@ -0,0 +1,254 @@
+'''
+Incremental reader for Serato's binary History/Sessions files.
+
+A session file is a flat run of chunks, each one a 4-byte ASCII tag followed by a
+big-endian uint32 length and that many bytes of payload ('vrsn', 'oses', 'oent', ...).
+Serato only ever appends to the active session, so instead of re-reading and
+splitting the whole file on every poll, SessionReader remembers per file the offset
+just past the last complete chunk and only reads what was appended since.
+
+Each 'oent' chunk wraps an 'adat' chunk, which is itself a run of fields laid out as
+a uint32 field id, a uint32 length and the field data. parse_track() decodes those
+straight off a memoryview into a TrackRecord without copying the chunk.
+'''
+
+import os
+import struct
+from time import time
+
+CHUNK_HEAD = struct.Struct('>4sI')  # tag + payload length
+TRACK_TAG = b'oent'
+DATA_TAG = b'adat'
+FIELD_HEAD = struct.Struct('>II')  # field id + data length
+SCAN_BLOCK = 65536  # bytes read per step when scanning backwards on a cold start
+MTIME_SLACK = 2  # seconds; coarse filesystem timestamps (FAT, HFS+) can hide a change this recent
+
+# adat field ids
+FIELD_ROW = 1
+FIELD_PATH = 2
+FIELD_TITLE = 6
+FIELD_ARTIST = 7
+FIELD_ALBUM = 8
+FIELD_GENRE = 9
+FIELD_START = 28  # unix time the track was loaded
+FIELD_END = 29  # unix time the track was ejected
+FIELD_DECK = 31
+FIELD_PLAYTIME = 45  # seconds played, only written once the track is ejected
+FIELD_PLAYED = 50
+FIELD_LOADED = 51  # written while a track sits on a deck without having been played
+
+TEXT_FIELDS = {FIELD_PATH: 'path', FIELD_TITLE: 'title', FIELD_ARTIST: 'artist',
+               FIELD_ALBUM: 'album', FIELD_GENRE: 'genre'}
+INT_FIELDS = {FIELD_ROW: 'row', FIELD_START: 'start', FIELD_END: 'end', FIELD_DECK: 'deck',
+              FIELD_PLAYTIME: 'playtime'}
+
+
+class TrackRecord:  # one decoded 'oent' entry
+    __slots__ = ('row', 'path', 'title', 'artist', 'album', 'genre', 'deck', 'start', 'end',
+                 'playtime', 'played', 'bpm', 'key')
+
+    def __init__(self, artist='', title=''):
+        self.row = self.deck = self.start = self.end = self.playtime = None
+        self.bpm = self.key = None  # from the library database, see library.py
+        self.path = self.album = self.genre = ''
+        self.artist = artist
+        self.title = title
+        self.played = True
+
+    @classmethod
+    def from_text(cls, text):  # "Artist - Title" as shown on a Serato Live playlist
+        artist, _, title = text.replace('\n', '').replace('\t', '').strip().partition(' - ')
+        return cls(artist.strip(), title.strip())
+
+    @property
+    def playing(self):  # on a deck and played, not ejected or merely loaded
+        return self.played and self.playtime is None
+
+    def __repr__(self):
+        return 'TrackRecord(row=%r, deck=%r, artist=%r, title=%r, played=%r)' % (
+            self.row, self.deck, self.artist, self.title, self.played)
+
+
+class SessionIndex:  # newest/oldest session file, only re-listed when the folder itself changes
+    def __init__(self):
+        self.directory = None
+        self.mtime = None  # st_mtime_ns of directory at the last scan
+        self.scanned = 0  # wall clock time of the last scan
+        self.first = self.last = None
+
+    def newest(self, directory):
+        self._refresh(directory)
+        return self.last
+
+    def oldest(self, directory):
+        self._refresh(directory)
+        return self.first
+
+    def resume(self, directory, mtime, scanned, first, last):  # a scan from an earlier run, see checkpoint.py
+        self.directory, self.mtime, self.scanned = directory, mtime, scanned
+        self.first, self.last = first, last
+
+    def _refresh(self, directory):
+        st = os.stat(directory)
+        if directory == self.directory and st.st_mtime_ns == self.mtime and \
+                self.scanned - st.st_mtime > MTIME_SLACK:
+            return
+
+        first = last = None
+        first_mtime = last_mtime = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.name.startswith('.') or not entry.is_file():  # .DS_Store & co
+                    continue
+                mtime = entry.stat().st_mtime
+                if last is None or mtime >= last_mtime:
+                    last, last_mtime = entry.path, mtime
+                if first is None or mtime < first_mtime:
+                    first, first_mtime = entry.path, mtime
+
+        self.directory = directory
+        self.mtime = st.st_mtime_ns
+        self.scanned = time()
+        self.first, self.last = first, last
+
+
+class SessionReader:  # remember where we left off in each session file
+    def __init__(self):
+        self.state = {}  # path -> (inode, offset past last complete chunk, last oent payload)
+        self.parsed = {}  # path -> (oent payload, TrackRecord) for the newest chunk
+
+    def decode(self, path, chunk):  # TrackRecord for a chunk last_chunk(path) returned
+        cached = self.parsed.get(path)
+        if cached is None or cached[0] is not chunk:  # only decode when a new chunk showed up
+            cached = self.parsed[path] = (chunk, parse_track(chunk))
+        return cached[1]
+
+    def last_chunk(self, path):  # payload of the newest 'oent' chunk, or None
+        st = os.stat(path)
+        state = self.state.get(path)
+
+        if state is None or state[0] != st.st_ino or st.st_size < state[1]:
+            # first look at this file, or it was replaced/truncated underneath us
+            state = self._cold_start(path, st)
+        elif st.st_size > state[1]:
+            state = self._read_appended(path, state, st.st_size)
+
+        self.state[path] = state
+        return state[2]
+
+    def save(self, path):  # (inode, offset, last oent payload) for resume() in a later run, or None
+        state = self.state.get(path)
+        if state is None:
+            return None
+        ino, offset, last = state
+        return ino, offset, None if last is None else bytes(last)
+
+    def resume(self, path, ino, offset, last):  # carry on from save(); last_chunk() still checks inode and size
+        self.state[path] = (ino, offset, last)
+
+    def _read_appended(self, path, state, size):
+        ino, offset, last = state
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            buf = f.read(size - offset)
+
+        used, last, ok = walk_chunks(buf, last)
+        if not ok:  # lost sync with the chunk stream; start over from the end
+            return self._cold_start(path, os.stat(path))
+        return ino, offset + used, last
+
+    def _cold_start(self, path, st):
+        with open(path, 'rb') as f:
+            for pos in rscan(f, st.st_size, TRACK_TAG):
+                f.seek(pos)
+                buf = f.read(st.st_size - pos)
+                used, last, ok = walk_chunks(buf, None)
+                if ok and last is not None:
+                    return st.st_ino, pos + used, last
+
+            # no track chunk yet (fresh session), just skip over the header chunks
+            f.seek(0)
+            used, last, ok = walk_chunks(f.read(st.st_size), None)
+
+        return st.st_ino, used if ok else 0, last
+
+
+def walk_chunks(buf, last):  # step through complete chunks in buf, keeping the last 'oent'
+    buf = memoryview(buf)
+    pos = 0
+    while pos + CHUNK_HEAD.size <= len(buf):
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        if not tag.isalpha():
+            return pos, last, False
+        end = pos + CHUNK_HEAD.size + length
+        if end > len(buf):  # Serato is still writing this one
+            break
+        if tag == TRACK_TAG:
+            last = buf[pos + CHUNK_HEAD.size:end]
+        pos = end
+    return pos, last, True
+
+
+def rscan(f, size, tag):  # yield offsets of tag in f, last occurrence first
+    end = size
+    carry = b''
+    while end > 0:
+        start = max(0, end - SCAN_BLOCK)
+        f.seek(start)
+        block = f.read(end - start) + carry
+        i = len(block)
+        while True:
+            i = block.rfind(tag, 0, i)
+            if i == -1:
+                break
+            yield start + i
+            i += len(tag) - 1  # let the next match overlap this one
+        carry = block[:len(tag) - 1]
+        end = start
+
+
+def parse_track(chunk):  # decode an 'oent' payload into a TrackRecord
+    buf = memoryview(chunk)
+    rec = TrackRecord()
+    pos = 0
+    while pos + CHUNK_HEAD.size <= len(buf):
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        pos += CHUNK_HEAD.size
+        if tag == DATA_TAG:
+            parse_fields(buf[pos:pos + length], rec)
+        pos += length
+    return rec
+
+
+def parse_fields(buf, rec):
+    pos = 0
+    end = len(buf)
+    while pos + FIELD_HEAD.size <= end:
+        fid, length = FIELD_HEAD.unpack_from(buf, pos)
+        start = pos + FIELD_HEAD.size
+        pos = start + length
+
+        name = TEXT_FIELDS.get(fid)
+        if name is not None:
+            setattr(rec, name, str(buf[start:pos], 'utf-16-be', 'replace').rstrip('\0').strip())
+            continue
+        name = INT_FIELDS.get(fid)
+        if name is not None:
+            setattr(rec, name, int.from_bytes(buf[start:pos], 'big'))
+        elif fid == FIELD_PLAYED:
+            rec.played = rec.played and any(buf[start:pos])
+        elif fid == FIELD_LOADED:
+            rec.played = False
+
+
+def iter_tracks(buf):  # every track record in a whole session file image
+    buf = memoryview(buf)
+    pos = 0
+    while pos + CHUNK_HEAD.size <= len(buf):
+        tag, length = CHUNK_HEAD.unpack_from(buf, pos)
+        end = pos + CHUNK_HEAD.size + length
+        if end > len(buf):
+            break
+        if tag == TRACK_TAG:
+            yield parse_track(buf[pos + CHUNK_HEAD.size:end])
+        pos = end
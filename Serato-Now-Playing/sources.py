@@ -0,0 +1,430 @@
+'''
+Extra sources: more Serato libraries and live playlists served by the same process.
+
+Besides the main source in [Settings], config.ini can list any number of
+[Source <name>] sections, each with its own mode, library or URL and output files:
+
+    [Source booth 2]
+    local = True
+    libpath = /Volumes/Booth2/_Serato_
+    file = /streams/booth2.txt
+    json_file = /streams/booth2.json
+    udp = 239.255.42.1:9000
+
+interval, adaptive, delay, template, html_template and artwork default to the [Settings]
+values.
+
+Engine runs them all from one scheduler thread. Local libraries are watched through
+a single inotify descriptor, remote playlists each have a deadline, and whichever
+sources are due get checked on a small shared thread pool, the remote ones through
+one pooled HTTP session. Adding a source adds a watch or a timer, not a thread, an
+HTTP client or a Qt loop.
+
+Every source, the main one included, finds its track and decides whether to publish
+it through the functions below (sessiontrack, playlisttrack, fresh, played), so they
+all behave the same. Extra sources wait out their delay on the main source's Timers,
+and a newer track cancels one still waiting, like it does for the main source.
+'''
+
+import os
+import sys
+import threading
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic, time
+
+from broadcast import FORMATS, UdpConf, destinations
+from engine import Timers
+from history import PlayHistory, trackkey
+from library import Library
+from metrics import Metrics
+from session import SessionIndex, SessionReader, TrackRecord
+from template import Template, TemplateError
+from watcher import Cadence, InotifyWatcher, PollWatcher
+
+SECTION = 'Source '
+WORKERS = 4  # checks running at once, and HTTP connections kept per host
+WATCH_TIMEOUT = 5  # re-check a watched library at least this often
+POLL_STEP = 1  # seconds between checks of a library that can't be watched
+SESSION_AGE = 10  # seconds; older session files are not the current set
+RETRY = 0.5  # seconds before looking again at a session file we couldn't open
+HISTORY = 100  # plays remembered per source, for dedupe
+
+LOCKED = object()  # sessiontrack(): Serato holds the session file, look again in RETRY seconds
+QUIET = Metrics()  # disabled, for extra sources: only the main source is timed
+
+SourceConf = namedtuple('SourceConf', 'name local directory url file json_file html_file interval text_tpl html_tpl '
+                                       'art cadence broadcast delay', defaults=(None, None, None, 0))
+
+
+def readsources(cparser, interval, text_tpl, html_tpl, art=None, cadence=None, udp_format='osc',
+                delay=0):  # -> SourceConfs
+    confs = []
+    for section in cparser.sections():
+        if not section.startswith(SECTION):
+            continue
+
+        def get(key, default=''):
+            return cparser.get(section, key, fallback=default).replace("|_0", " ")
+        try:
+            step = float(get('interval', str(interval)))
+        except ValueError:
+            step = interval
+        try:
+            wait = float(get('delay', str(delay)))
+        except ValueError:
+            wait = delay
+        libpath = get('libpath')
+        confs.append(SourceConf(
+            name=section[len(SECTION):].strip(),
+            local=get('local', 'True') != 'False',
+            directory=sessdir(libpath) if libpath else '',
+            url=get('url'),
+            file=get('file'),
+            json_file=get('json_file'),
+            html_file=get('html_file'),
+            interval=step,
+            text_tpl=compiled(get('template'), text_tpl),
+            html_tpl=compiled(get('html_template'), html_tpl),
+            art=art if get('artwork', 'True') != 'False' else None,
+            cadence=cadence if get('adaptive', 'True') != 'False' else None,
+            broadcast=broadcast(get('udp'), get('udp_format', udp_format)),
+            delay=wait))
+    return tuple(confs)
+
+
+def sessdir(libpath):  # session history of a _Serato_ folder
+    return os.path.abspath(os.path.join(libpath, 'History', 'Sessions'))
+
+
+def broadcast(spec, fmt):  # UdpConf of a section's udp setting, None if it has none
+    udp = destinations(spec)
+    if not udp:
+        return None
+    fmt = fmt.strip().lower()
+    return UdpConf(udp, fmt if fmt in FORMATS else 'osc')
+
+
+def compiled(source, default):
+    if source:
+        try:
+            return Template(source)
+        except TemplateError as e:
+            print(e)
+    return default
+
+
+def sessfile(index, directory, metrics, showlast=True):  # newest session file if it's the current set, else None
+    t0 = metrics.now()
+    try:
+        file = index.newest(directory) if showlast else index.oldest(directory)
+        if file is None or time() - os.path.getmtime(file) > SESSION_AGE:  # no sessions yet, or an old set
+            return None
+        return file
+    except OSError:  # library not there (yet), e.g. a drive that isn't mounted
+        return None
+    finally:
+        metrics.took('scan', t0)
+
+
+def sessiontrack(index, reader, directory, metrics):  # (rec, session file) of the track playing, LOCKED or None
+    sess = sessfile(index, directory, metrics)
+    if sess is None:
+        return None
+
+    # Serato may hold the file locked for a moment: the caller looks again shortly rather than wait here
+    if not os.access(sess, os.R_OK):
+        return LOCKED
+
+    # last track record, only reading what was appended since the previous check
+    t0 = metrics.now()
+    try:
+        chunk = reader.last_chunk(sess)
+    except OSError:
+        return None
+    metrics.took('read', t0)
+    if chunk is None:
+        return None
+    t0 = metrics.now()
+    rec = reader.decode(sess, chunk)
+    metrics.took('parse', t0)
+    if not rec.playing:  # ejected or loaded, but not played
+        return None
+    return rec, sess
+
+
+def playlisttrack(fetcher, extractor, cadence, url, history, metrics):  # newest rec on the live playlist, or None
+    # get and parse the playlist page, if it changed since the last check
+    t0 = metrics.now()
+    page = fetcher.fetch(url)
+    metrics.took('fetch', t0)
+    if page is None:
+        return None
+    t0 = metrics.now()
+    names = extractor.extract(page)
+    metrics.took('parse', t0)
+    if names and cadence is not None:
+        cadence.changed(monotonic(), 0 if extractor.fresh else len(names))
+    if not names or names[-1].strip() == "":
+        return None
+    for name in names[:-1]:  # played and gone again between two checks
+        print("missed: " + name.strip())
+        metrics.count('missed')
+        history.add(TrackRecord.from_text(name))
+    return TrackRecord.from_text(names[-1])
+
+
+def fresh(history, rec, dedupe):  # False if rec was already published in the last dedupe seconds
+    last = history.last()
+    if last is not None and last.key == trackkey(rec):
+        return True  # same track rendered again, e.g. after a settings change
+    return not ((rec.artist or rec.title) and history.seen(rec, dedupe))
+
+
+def played(history, rec):  # remember a published track, unless it's the one already on top
+    last = history.last()
+    if (rec.artist or rec.title) and (last is None or last.key != trackkey(rec)):
+        history.add(rec)
+
+
+class Source:  # one library or playlist: its own reader state, history and outputs
+    def __init__(self, conf, sinks, timers):
+        self.conf = conf
+        self.index = SessionIndex()
+        self.reader = SessionReader()
+        self.fetcher = self.extractor = None
+        self.cadence = Cadence(conf.interval, *conf.cadence) if conf.cadence and not conf.local else None
+        self.library = None  # only with a libpath, whatever the mode
+        if conf.directory:
+            self.library = Library(os.path.join(os.path.dirname(os.path.dirname(conf.directory)), 'database V2'))
+            self.library.warm()
+        self.history = PlayHistory(HISTORY)
+        self.sinks = sinks(conf)
+        self.timers = timers
+        self.pending = None  # Timer of the track waiting out the delay
+        self.dedupe = 0
+        self.track = ''
+        self.watched = False  # local library on the engine's inotify descriptor
+        self.due = 0  # monotonic time of the next check
+        self.busy = False  # check queued or running
+        self.again = False  # library written to during a check
+        self.locked = False  # session file couldn't be opened on the last check
+
+    @property
+    def step(self):  # longest wait between checks
+        if not self.conf.local:
+            return self.conf.interval if self.cadence is None else self.cadence.step(monotonic())
+        return WATCH_TIMEOUT if self.watched else POLL_STEP
+
+    def check(self, http):  # (text, rec) if the track changed, else None
+        rec = self.lasttrack() if self.conf.local else self.playlisttrack(http)
+        if rec is None:
+            return None
+        if self.library is not None:
+            self.library.enrich(rec)
+        if rec.artist == '' and rec.title == '':
+            text = ''
+        else:
+            text = self.conf.text_tpl.render(rec)
+        if text == self.track:
+            return None
+        self.track = text
+        return text, rec
+
+    def publish(self, found, submit):  # submit(fn, *args) runs a delayed write off the timer thread
+        text, rec = found
+
+        # whatever was still waiting out the delay is stale now
+        if self.pending is not None and self.timers.cancel(self.pending):
+            print("[%s] superseded before the delay was up: %s" % (self.conf.name, self.pending.args[1]))
+        self.pending = None
+
+        if not fresh(self.history, rec, self.dedupe):
+            print("[%s] played recently, skipping: %s" % (self.conf.name, text))
+            return
+        if self.conf.delay > 0:
+            self.pending = self.timers.call_later(self.conf.delay, submit, self.emit, text, rec)
+        else:
+            self.emit(text, rec)
+
+    def emit(self, text, rec):
+        played(self.history, rec)
+        self.write(text, rec)
+
+    def cancel(self):  # drop a track still waiting out the delay
+        if self.pending is not None:
+            self.timers.cancel(self.pending)
+            self.pending = None
+
+    def write(self, text, rec=None):  # straight to the sinks; this already runs off the scheduler thread
+        for sink in self.sinks:
+            try:
+                sink.write(text, rec)
+            except OSError as e:
+                print("could not write %s: %s" % (sink.path, e))
+
+    def lasttrack(self):
+        found = sessiontrack(self.index, self.reader, self.conf.directory, QUIET)
+        self.locked = found is LOCKED
+        return None if found is None or found is LOCKED else found[0]
+
+    def playlisttrack(self, http):
+        if self.fetcher is None:
+            from remote import PlaylistExtractor, PlaylistFetcher
+            self.fetcher = PlaylistFetcher(session=http())
+            self.extractor = PlaylistExtractor()
+        return playlisttrack(self.fetcher, self.extractor, self.cadence, self.conf.url, self.history, QUIET)
+
+
+class Engine:  # supervises every extra source from one thread plus a shared pool
+    def __init__(self, sinks, timers=None, workers=WORKERS):
+        self.sinks = sinks  # sinks(conf) -> output sinks for a source
+        self.timers = timers or Timers()  # write delays, shared with the main source when given
+        self.workers = workers
+        self.sources = []
+        self.lock = threading.Lock()
+        self.pool = None
+        self.session = None  # shared requests.Session, once a remote source needs it
+        self.thread = None
+        self.watcher = None  # one for the engine's life, created by start()
+        self.rewatch = True  # sync the watched folders with the sources before the next wait
+        self.rewatch_at = 0  # retry folders that couldn't be watched at this time
+        self._running = threading.Event()  # set while not paused
+        self._stopped = threading.Event()
+
+    def configure(self, confs, dedupe=0):  # swap in a new source list, keeping unchanged sources as they are
+        with self.lock:
+            old = {s.conf: s for s in self.sources}
+            sources = []
+            for conf in confs:
+                source = old.pop(conf, None) or Source(conf, self.sinks, self.timers)
+                source.dedupe = dedupe
+                sources.append(source)
+            self.sources = sources
+            self.rewatch = True
+        for source in old.values():  # dropped from config.ini: blank its outputs
+            source.cancel()
+            source.write('')
+        self.interrupt()
+
+    @property
+    def paused(self):
+        return self.thread is not None and not self._running.is_set()
+
+    def start(self):
+        if self.thread is None:
+            self.watcher = PollWatcher(None, WATCH_TIMEOUT)
+            if sys.platform.startswith('linux'):
+                try:
+                    self.watcher = InotifyWatcher(timeout=WATCH_TIMEOUT)
+                except (OSError, AttributeError):  # no inotify here: every library gets polled
+                    pass
+            self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix='source')
+            self._running.set()
+            self.thread = threading.Thread(target=self.run, name='engine', daemon=True)
+            self.thread.start()
+
+    def pause(self):
+        self._running.clear()
+        self.interrupt()
+
+    def resume(self):
+        self._running.set()
+
+    def stop(self, timeout=5):
+        with self.lock:  # after this, submit() never hands the pool anything
+            self._stopped.set()
+        self._running.set()
+        self.interrupt()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.pool.shutdown(cancel_futures=True)  # let running checks finish, so nothing writes after us
+        for source in self.sources:
+            source.cancel()
+        if self.session is not None:
+            self.session.close()
+
+    def interrupt(self):  # make the scheduler look at its sources again
+        watcher = self.watcher
+        if watcher is not None:
+            watcher.interrupt()
+
+    def submit(self, fn, *args):  # a delayed write, from the timer thread; dropped once stopped
+        with self.lock:
+            if not self._stopped.is_set():
+                self.pool.submit(fn, *args)
+
+    def http(self):  # the shared pooled session, created on the first remote check
+        with self.lock:
+            if self.session is None:
+                from remote import pooled
+                self.session = pooled(self.workers)
+            return self.session
+
+    def run(self):
+        while True:
+            self._running.wait()
+            if self._stopped.is_set():
+                break
+
+            now = monotonic()
+            if self.rewatch or now >= self.rewatch_at:
+                self._watch(now)
+            with self.lock:
+                sources = self.sources
+                for source in sources:
+                    if not source.busy and now >= source.due:
+                        source.busy = True
+                        self.pool.submit(self._check, source)
+                waits = [s.due - now for s in sources if not s.busy]
+
+            self.watcher.wait(max(0, min(waits)) if waits else WATCH_TIMEOUT)
+            if self.watcher.changed:
+                watching = self.watcher.watching()
+                with self.lock:
+                    for source in sources:
+                        if source.conf.local and source.conf.directory in self.watcher.changed:
+                            if source.watched and source.conf.directory not in watching:  # folder deleted
+                                source.watched = False
+                                self.rewatch = True
+                            if source.busy:
+                                source.again = True
+                            else:
+                                source.due = 0
+
+        self.watcher.close()
+
+    def _check(self, source):  # on a pool thread
+        try:
+            found = source.check(self.http)
+            if found:
+                source.publish(found, self.submit)
+        except Exception:  # keep the other sources going
+            traceback.print_exc()
+        finally:
+            with self.lock:
+                if source.again:
+                    source.due = 0
+                else:
+                    source.due = monotonic() + (RETRY if source.locked else source.step)
+                source.again = source.busy = False
+            self.interrupt()
+
+    def _watch(self, now):  # one inotify descriptor for every local library that exists
+        with self.lock:
+            self.rewatch = False
+            self.rewatch_at = float('inf')
+            if not isinstance(self.watcher, InotifyWatcher):
+                return
+            wanted = {s.conf.directory for s in self.sources if s.conf.local and s.conf.directory}
+            for directory in self.watcher.watching() - wanted:  # dropped from config.ini
+                self.watcher.discard(directory)
+            for directory in wanted - self.watcher.watching():
+                try:
+                    self.watcher.add(directory)
+                except OSError:  # not there yet; polled, and tried again later
+                    self.rewatch_at = now + WATCH_TIMEOUT
+            watching = self.watcher.watching()
+            for source in self.sources:
+                source.watched = source.conf.directory in watching
@@ -0,0 +1,186 @@
+'''
+Output templates.
+
+A template is plain text with {field} placeholders filled from a track record
+(artist, title, album, genre, deck, path, ...) and optional groups in square
+brackets. A group holds one or more alternatives separated by |, and renders the
+first alternative whose fields are all non-empty, or nothing if none qualify:
+
+    [{artist} - "{title}"|{artist}|"{title}"]
+
+\\n stands for a line break, and {{ }} [[ ]] || for literal braces, brackets and bars.
+A name that isn't a TrackRecord field is a TemplateError, so a typo is caught when
+the template is compiled, e.g. as the settings window saves it.
+Templates are compiled once (per config snapshot) and remember their last few
+renders, so re-publishing a track doesn't format it again.
+'''
+
+from collections import OrderedDict
+
+from session import TrackRecord
+
+RENDER_CACHE = 16
+FIELDS = frozenset(TrackRecord.__slots__)  # names a {field} may use
+
+DEFAULT_NOTIF = '[{artist} - {title}|{artist}|{title}]'
+DEFAULT_HTML = '<div class="nowplaying"><span class="artist">{artist}</span> ' \
+               '<span class="title">{title}</span></div>\\n'
+
+
+class TemplateError(ValueError):
+    pass
+
+
+class Template:  # compiled template
+    def __init__(self, source, parts=None):  # parts already built (see legacy()), source then just names them
+        self.source = source
+        if parts is None:
+            self.parts, self.fields = parse(source)
+        else:
+            self.parts, self.fields = parts, used(parts)
+        self.cache = OrderedDict()
+
+    def render(self, rec, escape=None):  # escape is applied to field values, e.g. html.escape
+        values = tuple(value(rec, f) for f in self.fields)
+        key = values, escape
+        text = self.cache.get(key)
+        if text is None:
+            data = dict(zip(self.fields, values))
+            if escape is not None:
+                data = {k: escape(v) for k, v in data.items()}
+            text = self.cache[key] = ''.join(render(self.parts, data))
+            if len(self.cache) > RENDER_CACHE:
+                self.cache.popitem(last=False)
+        else:
+            self.cache.move_to_end(key)
+        return text
+
+    def __eq__(self, other):
+        return isinstance(other, Template) and other.source == self.source and other.parts == self.parts
+
+    def __hash__(self):
+        return hash(self.source)
+
+    def __repr__(self):
+        return 'Template(%r)' % self.source
+
+
+def value(rec, field):
+    v = getattr(rec, field, None)
+    return '' if v is None else str(v)
+
+
+def render(parts, data):
+    for kind, arg in parts:
+        if kind == 'text':
+            yield arg
+        elif kind == 'field':
+            yield data[arg]
+        else:  # group: first alternative with all its fields filled in
+            for alt, fields in arg:
+                if all(data[f] for f in fields):
+                    yield from render(alt, data)
+                    break
+
+
+def parse(source):  # -> (parts, every field used), parts being ('text'|'field'|'group', ...)
+    fields = []
+    top = []
+    group = None  # list of alternatives while inside [...]
+    current = top
+    altfields = None
+    text = []
+    i = 0
+
+    def flush():
+        if text:
+            current.append(('text', ''.join(text)))
+            del text[:]
+
+    while i < len(source):
+        c = source[i]
+        nxt = source[i + 1] if i + 1 < len(source) else ''
+        if c in '{}[]|' and nxt == c:  # doubled: literal
+            text.append(c)
+            i += 2
+            continue
+        if c == '\\' and nxt == 'n':
+            text.append('\n')
+            i += 2
+            continue
+
+        if c == '{':
+            end = source.find('}', i)
+            if end == -1:
+                raise TemplateError('unclosed { in template: %r' % source)
+            name = source[i + 1:end].strip()
+            if not name.isidentifier():
+                raise TemplateError('bad field name %r in template: %r' % (name, source))
+            if name not in FIELDS:
+                raise TemplateError('unknown field {%s} in template: %r' % (name, source))
+            flush()
+            current.append(('field', name))
+            if name not in fields:
+                fields.append(name)
+            if altfields is not None:
+                altfields.append(name)
+            i = end + 1
+        elif c == '[':
+            if group is not None:
+                raise TemplateError('groups can\'t be nested: %r' % source)
+            flush()
+            group, current, altfields = [], [], []
+            i += 1
+        elif c == '|' and group is not None:
+            flush()
+            group.append((current, altfields))
+            current, altfields = [], []
+            i += 1
+        elif c == ']' and group is not None:
+            flush()
+            group.append((current, altfields))
+            top.append(('group', group))
+            group, current, altfields = None, top, None
+            i += 1
+        elif c in '{}[]':
+            raise TemplateError('unbalanced %s in template: %r' % (c, source))
+        else:
+            text.append(c)
+            i += 1
+
+    if group is not None:
+        raise TemplateError('unclosed [ in template: %r' % source)
+    flush()
+    return top, fields
+
+
+def used(parts):  # every field in parts, in order of first use
+    fields = []
+    for kind, arg in parts:
+        if kind == 'field':
+            names = [arg]
+        elif kind == 'group':
+            names = [f for _, altfields in arg for f in altfields]
+        else:
+            names = []
+        fields.extend(f for f in names if f not in fields)
+    return fields
+
+
+def legacy(a_pref, a_suff, s_pref, s_suff, quote, multi):  # Template matching the prefix/suffix settings
+    # built as parts rather than source, so prefixes and suffixes stay literal whatever characters they hold
+    q = '"' if quote else ''
+    artist = literal(a_pref) + [('field', 'artist')] + literal(a_suff)
+    song = literal(s_pref + q) + [('field', 'title')] + literal(q + s_suff)
+    if multi:
+        parts = [('group', [(artist, ['artist']), ([], [])]), ('text', '\n'),
+                 ('group', [(song, ['title']), ([], [])])]
+    else:
+        parts = [('group', [(artist + [('text', ' - ')] + song, ['artist', 'title']),
+                            (artist, ['artist']), (song, ['title'])])]
+    name = 'legacy(%r)' % ((a_pref, a_suff, s_pref, s_suff, bool(quote), bool(multi)),)
+    return Template(name, parts)
+
+
+def literal(s):
+    return [('text', s)] if s else []
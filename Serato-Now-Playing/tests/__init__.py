@@ -0,0 +1,4 @@
+'''
+Tests for the Now Playing core, run from the Serato-Now-Playing folder:
+    python -m pytest tests
+'''
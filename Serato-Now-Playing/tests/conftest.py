@@ -0,0 +1,21 @@
+'''
+Helpers shared by the tests: from tests.conftest import play, wait
+'''
+
+from time import monotonic, sleep
+
+from benchmarks import synth
+
+
+def wait(cond, timeout=5):  # poll cond() until it holds, failing after timeout seconds
+    end = monotonic() + timeout
+    while not cond():
+        if monotonic() > end:
+            raise AssertionError('timed out')
+        sleep(0.005)
+
+
+def play(session, row, artist, title):  # append a played track to a session file, as Serato does
+    with open(session, 'ab') as f:
+        f.write(synth.track(row, artist, title))
+
@@ -0,0 +1,53 @@
+'''
+UdpSink: OSC and JSON datagrams to a local listener.
+'''
+
+import json
+import socket
+import struct
+
+import pytest
+
+from broadcast import UdpConf, UdpSink, destinations, osc
+from session import TrackRecord
+
+
+def track(deck=1, bpm=''):
+    rec = TrackRecord('A', 'T')
+    rec.deck, rec.bpm = deck, bpm
+    return rec
+
+
+@pytest.fixture
+def listener():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('127.0.0.1', 0))
+    sock.settimeout(2)
+    yield sock
+    sock.close()
+
+
+def test_json(listener):
+    sink = UdpSink(UdpConf((('127.0.0.1', listener.getsockname()[1]),), 'json'))
+    assert sink.write('A - T', track())
+    assert json.loads(listener.recv(65536))['deck'] == 1
+
+    assert sink.write('A - T', track(deck=2, bpm='124.00'))  # same track, other deck: not the cached datagram
+    sent = json.loads(listener.recv(65536))
+    assert (sent['deck'], sent['bpm']) == (2, '124.00')
+
+    sink.write('', None)
+    assert listener.recv(65536) == b'{}'
+
+
+def test_osc(listener):
+    sink = UdpSink(UdpConf((('127.0.0.1', listener.getsockname()[1]),), 'osc'))
+    sink.write('A - T', track(deck=2, bpm='124.00'))
+    data = listener.recv(65536)
+    assert data == osc('A - T', track(deck=2, bpm='124.00'))
+    assert data.startswith(b'#bundle\0')
+    assert b'/nowplaying/deck\0\0\0\0,i\0\0' + struct.pack('>i', 2) in data
+
+
+def test_destinations():
+    assert destinations('10.0.0.5:9000, [::1]:7000 bad host:x') == (('10.0.0.5', 9000), ('::1', 7000))
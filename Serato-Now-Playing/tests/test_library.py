@@ -0,0 +1,110 @@
+'''
+database V2 lookups, and how they behave while Serato rewrites the file.
+'''
+
+import itertools
+import os
+from time import monotonic, sleep
+
+import pytest
+
+from benchmarks import synth
+from library import Library
+from session import TrackRecord
+
+MTIMES = itertools.count(1)
+
+
+def database(path, *tracks):  # (artist, title, key) per track
+    with open(path, 'wb') as f:
+        f.write(synth.database(0))
+        for row, (artist, title, key) in enumerate(tracks, 1):
+            f.write(synth.dbtrack(row, artist, title, key=key))
+    mtime = next(MTIMES) * 10 ** 9
+    os.utime(path, ns=(mtime, mtime))  # a new mtime, however fast the test runs
+
+
+def settle(lib, timeout=5):
+    end = monotonic() + timeout
+    while lib.building:
+        assert monotonic() < end, 'rebuild did not finish'
+        sleep(0.005)
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'database V2')
+
+
+def test_lookup(path):
+    database(path, ('A', 'T', 'Am'), ('B', 'U', 'Cm'))
+    lib = Library(path)
+    lib.refresh()
+    assert lib.lookup(artist='b', title='u').key == 'Cm'
+    assert lib.lookup('/Music/A - T.mp3').key == 'Am'
+    assert lib.lookup(artist='nobody') is None
+    rec = lib.enrich(TrackRecord('A', 'T'))
+    assert (rec.key, rec.genre, rec.path) == ('Am', 'House', 'Music/A - T.mp3')
+
+
+def test_rewrite_answers_from_old_index(path):
+    database(path, ('A', 'T', 'Am'), ('B', 'U', 'Cm'))
+    lib = Library(path)
+    lib.refresh()
+
+    with lib.build_lock:  # a slow rebuild still running
+        database(path, ('A', 'T', 'Dm'), ('B', 'U', 'Cm'))
+        t0 = monotonic()
+        assert lib.lookup(artist='B', title='U').key == 'Cm'  # offset unchanged: old index still finds it
+        assert monotonic() - t0 < 0.5
+        assert lib.building
+    settle(lib)
+    assert lib.lookup(artist='A', title='T').key == 'Dm'
+
+
+def test_moved_track_not_mistaken(path):
+    database(path, ('A', 'T', 'Am'), ('B', 'U', 'Cm'))
+    lib = Library(path)
+    lib.refresh()
+
+    with lib.build_lock:
+        database(path, ('B', 'U', 'Cm'), ('A', 'T', 'Am'))  # same size, tracks swapped
+        assert lib.lookup(artist='A', title='T') is None  # its old offset now holds B - U
+    settle(lib)
+    assert lib.lookup(artist='A', title='T').key == 'Am'
+
+
+def test_append(path):
+    database(path, ('A', 'T', 'Am'))
+    lib = Library(path)
+    lib.refresh()
+    indexed = lib.indexed
+    with open(path, 'ab') as f:
+        f.write(synth.dbtrack(2, 'B', 'U', key='Cm'))
+    lib.refresh()
+    assert lib.indexed > indexed
+    assert lib.lookup(artist='A', title='T').key == 'Am'
+    assert lib.lookup(artist='B', title='U').key == 'Cm'
+
+
+def test_missing(tmp_path):
+    lib = Library(str(tmp_path / 'nothing'))
+    assert lib.lookup(artist='A', title='T') is None
+
+
+def test_rebuild_while_truncated(path):
+    big, small = synth.database(20000), synth.database(10)
+    with open(path, 'wb') as f:
+        f.write(big)
+    lib = Library(path)
+    lib.warm()
+    for _ in range(50):  # Serato rewriting in place while the index is being built
+        with open(path, 'r+b') as f:
+            f.truncate(len(small))
+            f.write(small)
+        lib.warm()
+        with open(path, 'r+b') as f:
+            f.write(big)
+    settle(lib)
+    lib.refresh()
+    assert lib.lookup(artist='%s 3' % synth.ARTISTS[3], title=synth.TITLES[3]) is not None
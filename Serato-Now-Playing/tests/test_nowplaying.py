@@ -0,0 +1,68 @@
+'''
+The core end to end: a temp _Serato_ library, the headless start-up, and the tray's pause/resume.
+'''
+
+import os
+
+import pytest
+
+import nowplaying
+from benchmarks import synth
+from tests.conftest import play, wait
+
+
+def text(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@pytest.fixture
+def app(tmp_path):
+    libpath = str(tmp_path / '_Serato_')
+    directory = nowplaying.sessdir(libpath)
+    os.makedirs(directory)
+    session = os.path.join(directory, '1.session')
+    with open(session, 'wb') as f:
+        f.write(synth.header())
+    cfg = str(tmp_path / 'config.ini')
+    with open(os.path.join(nowplaying.bundle_dir, 'bin', 'config.ini')) as src, open(cfg, 'w') as dst:
+        dst.write(src.read())
+    out = str(tmp_path / 'np.txt')
+    nowplaying.confstore.use(cfg, {'local': 'True', 'libpath': libpath, 'file': out, 'delay': '0', 'dedupe': '0'})
+    nowplaying.init()
+    nowplaying.start()
+    wait(lambda: nowplaying.watcher is not None)  # first check done, session folder watched
+    yield session, out
+    nowplaying.shutdown()
+
+
+def test_pause_resume(app):
+    session, out = app
+    play(session, 1, 'A', 'T')
+    wait(lambda: text(out) == 'A - T')
+
+    nowplaying.pause()
+    assert nowplaying.paused()
+    nowplaying.resume()
+    assert not nowplaying.paused()
+
+    play(session, 2, 'B', 'U')
+    wait(lambda: text(out) == 'B - U')
+
+
+def test_overrides_not_saved(tmp_path):
+    cfg = str(tmp_path / 'config.ini')
+    with open(os.path.join(nowplaying.bundle_dir, 'bin', 'config.ini')) as src, open(cfg, 'w') as dst:
+        dst.write(src.read().replace('file =', 'file = saved.txt'))
+    store = nowplaying.ConfigStore(cfg, {'file': 'override.txt'})
+    assert store.get().file == 'override.txt'
+
+    c = store.saved()  # what the settings window shows
+    assert c.file == 'saved.txt'
+    c.put('True', c.libpath, c.url, c.file, str(c.interval), str(c.delay), str(c.multi), str(c.quote), c.a_pref,
+          c.a_suff, c.s_pref, c.s_suff, 'True')
+    assert nowplaying.ConfigFile(cfg).file == 'saved.txt'
+    assert store.reload().file == 'override.txt'
@@ -0,0 +1,55 @@
+'''
+Output sinks: what they write, and that their render cache never serves stale fields.
+'''
+
+import json
+
+from output import HtmlSink, JsonSink, OutputWriter, TextSink
+from session import TrackRecord
+from template import Template
+
+
+def track(artist, title, deck=1, bpm=''):
+    rec = TrackRecord(artist, title)
+    rec.deck, rec.bpm = deck, bpm
+    return rec
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_sinks(tmp_path):
+    text, js, page = (str(tmp_path / name) for name in ('np.txt', 'np.json', 'np.html'))
+    writer = OutputWriter()
+    writer.configure([TextSink(text), JsonSink(js), HtmlSink(page, Template('<b>{artist}</b>'))])
+    writer.publish('A & B - T', track('A & B', 'T'))
+    assert writer.flush(5)
+    assert read(text) == 'A & B - T'
+    assert json.loads(read(js))['artist'] == 'A & B'
+    assert read(page) == '<b>A &amp; B</b>'
+
+    writer.publish('')
+    assert writer.flush(5)
+    assert (read(text), read(js), read(page)) == ('', '{}', '')
+
+
+def test_same_track_other_fields(tmp_path):
+    js, page = str(tmp_path / 'np.json'), str(tmp_path / 'np.html')
+    sinks = [JsonSink(js), HtmlSink(page, Template('{deck} {bpm}'))]
+    for sink in sinks:
+        sink.write('A - T', track('A', 'T'))
+    assert json.loads(read(js))['deck'] == 1
+    assert read(page) == '1 '
+
+    for sink in sinks:  # played again, on the other deck, with the BPM known now
+        assert sink.write('A - T', track('A', 'T', deck=2, bpm='124.00'))
+    assert json.loads(read(js))['deck'] == 2 and json.loads(read(js))['bpm'] == '124.00'
+    assert read(page) == '2 124.00'
+
+
+def test_unchanged_not_rewritten(tmp_path):
+    sink = TextSink(str(tmp_path / 'np.txt'))
+    assert sink.write('A - T', track('A', 'T'))
+    assert not sink.write('A - T', track('A', 'T'))
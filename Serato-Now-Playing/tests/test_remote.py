@@ -0,0 +1,121 @@
+'''
+PlaylistFetcher against a local stand-in for the Serato Live playlist page.
+'''
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from timeit import default_timer as timer
+
+import pytest
+
+pytest.importorskip('requests')
+from remote import PlaylistFetcher  # noqa: E402
+from benchmarks import synth  # noqa: E402
+
+TIMEOUT = 0.3
+
+
+class Playlist(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, so connection reuse is visible
+    tracks = 1
+    validators = True  # send an ETag and honour If-None-Match
+    hang = None  # Event the handler waits on instead of answering, while set to one
+    hits = 0
+    not_modified = 0
+    connections = set()
+
+    def do_GET(self):
+        cls = type(self)
+        cls.hits += 1
+        cls.connections.add(self.client_address)
+        if cls.hang is not None:
+            cls.hang.wait(5)
+            return
+        etag = '"%d"' % cls.tracks
+        if cls.validators and self.headers.get('If-None-Match') == etag:
+            cls.not_modified += 1
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = synth.playlist_html(cls.tracks).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        if cls.validators:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def url():
+    Playlist.tracks, Playlist.validators, Playlist.hang = 1, True, None
+    Playlist.hits = Playlist.not_modified = 0
+    Playlist.connections = set()
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Playlist)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield 'http://127.0.0.1:%d/playlists/test/live' % server.server_port
+    if Playlist.hang is not None:
+        Playlist.hang.set()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def fetcher():
+    fetcher = PlaylistFetcher(timeout=(TIMEOUT, TIMEOUT), backoff_base=10)
+    yield fetcher
+    fetcher.close()
+
+
+def test_not_modified(url, fetcher):
+    assert 'playlist-trackname' in fetcher.fetch(url)
+    assert fetcher.fetch(url) is None
+    assert Playlist.not_modified == 1
+
+    Playlist.tracks = 2
+    assert fetcher.fetch(url) is not None
+
+
+def test_identical_body(url, fetcher):
+    Playlist.validators = False
+    assert fetcher.fetch(url) is not None
+    assert fetcher.fetch(url) is None
+    assert Playlist.hits == 2 and Playlist.not_modified == 0
+
+
+def test_one_connection(url, fetcher):
+    for tracks in range(1, 11):
+        Playlist.tracks = tracks
+        fetcher.fetch(url)
+    assert Playlist.hits == 10
+    assert len(Playlist.connections) == 1
+
+
+def test_hang_then_backoff(url, fetcher):
+    fetcher.fetch(url)
+    Playlist.hang = threading.Event()
+
+    t0 = timer()
+    assert fetcher.fetch(url) is None
+    assert TIMEOUT <= timer() - t0 < TIMEOUT * 3  # one read timeout, not a stall
+    assert fetcher.failures == 1
+    hits = Playlist.hits
+
+    t0 = timer()
+    assert fetcher.fetch(url) is None  # inside the backoff window
+    assert timer() - t0 < TIMEOUT
+    assert Playlist.hits == hits
+
+
+def test_reset_on_url_change(url, fetcher):
+    assert fetcher.fetch(url) is not None
+    assert fetcher.fetch(url) is None
+    assert fetcher.fetch(url + '?other') is not None  # same page, but validators belong to the old URL
+    assert Playlist.not_modified == 1
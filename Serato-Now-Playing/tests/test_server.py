@@ -0,0 +1,86 @@
+'''
+NowPlayingServer: JSON endpoints and the change streams.
+'''
+
+import asyncio
+import json
+import socket
+
+from history import PlayHistory
+from server import NowPlayingServer
+from session import TrackRecord
+
+
+def track(artist, title):
+    rec = TrackRecord()
+    rec.artist, rec.title = artist, title
+    return rec
+
+
+def request(port, path):
+    sock = socket.create_connection(('127.0.0.1', port), timeout=5)
+    sock.sendall(b'GET %s HTTP/1.1\r\nHost: test\r\n\r\n' % path.encode())
+    return sock
+
+
+def test_now_and_events():
+    server = NowPlayingServer(PlayHistory(), port=0)
+    assert server.start()
+    try:
+        server.publish('A - T', track('A', 'T'))
+        events = request(server.port, '/events').makefile('rb')
+        while events.readline() != b'\r\n':  # headers
+            pass
+        first = json.loads(events.readline()[len(b'data: '):])
+        assert first['title'] == 'T'
+
+        server.publish('B - U', track('B', 'U'))
+        events.readline()
+        assert json.loads(events.readline()[len(b'data: '):])['title'] == 'U'
+
+        body = request(server.port, '/now').makefile('rb').read()
+        assert json.loads(body.split(b'\r\n\r\n', 1)[1])['artist'] == 'B'
+    finally:
+        server.stop()
+
+
+class Writer:  # announces a change while the subscriber drains its first write
+    def __init__(self, server):
+        self.server = server
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def drain(self):
+        if self.server.current == b'{}':
+            self.server._announce('A - T', track('A', 'T'), 0)
+        elif len(self.written) == 1:
+            raise ConnectionError  # got the change; done
+
+
+def test_change_during_first_drain():
+    async def run():
+        server = NowPlayingServer(PlayHistory())
+        server.loop = asyncio.get_running_loop()
+        server.changed = server.loop.create_future()
+        writer = Writer(server)
+        await asyncio.wait_for(server._subscribe(writer, 0, server.changed), 1)
+        return writer.written
+
+    written = asyncio.run(run())
+    assert len(written) == 1 and b'"title": "T"' in written[0]
+
+
+def test_port_taken():
+    taken = socket.socket()
+    taken.bind(('127.0.0.1', 0))
+    taken.listen()
+    try:
+        server = NowPlayingServer(PlayHistory(), port=taken.getsockname()[1])
+        assert not server.start()
+        assert server.loop is None
+        server.publish('A - T', track('A', 'T'))  # nothing queued on a loop that never runs
+        server.stop()
+    finally:
+        taken.close()
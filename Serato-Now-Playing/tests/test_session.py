@@ -0,0 +1,113 @@
+'''
+Session file chunks: walk_chunks, rscan, parse_track and the incremental SessionReader.
+'''
+
+import io
+
+import session
+from benchmarks import synth
+from session import SessionReader, parse_track, rscan, walk_chunks
+
+
+def payload(chunk):  # an 'oent' chunk without its head
+    return chunk[8:]
+
+
+def test_walk_complete():
+    one, two = synth.track(1, 'A', 'T'), synth.track(2, 'B', 'U')
+    buf = synth.header() + one + two
+    used, last, ok = walk_chunks(buf, None)
+    assert ok and used == len(buf)
+    assert bytes(last) == payload(two)
+
+
+def test_walk_truncated():
+    one, two = synth.track(1, 'A', 'T'), synth.track(2, 'B', 'U')
+    for cut in (1, 7, 8, len(two) - 1):  # inside the head, right after it, one byte short
+        buf = synth.header() + one + two[:cut]
+        used, last, ok = walk_chunks(buf, None)
+        assert ok and used == len(synth.header() + one)
+        assert bytes(last) == payload(one)
+
+
+def test_walk_keeps_last_without_new_track():
+    used, last, ok = walk_chunks(synth.chunk(b'oses', b''), b'before')
+    assert ok and used == 8 and last == b'before'
+
+
+def test_walk_lost_sync():
+    buf = synth.track(1, 'A', 'T') + b'\x00\x01\x02\x03garbage'
+    used, last, ok = walk_chunks(buf, None)
+    assert not ok and used == len(synth.track(1, 'A', 'T'))
+
+
+def test_rscan():
+    buf = b'x' * 10 + b'oent' + b'y' * 100 + b'oent'
+    f = io.BytesIO(buf)
+    assert list(rscan(f, len(buf), b'oent')) == [114, 10]
+
+
+def test_rscan_across_blocks(monkeypatch):
+    monkeypatch.setattr(session, 'SCAN_BLOCK', 5)
+    buf = b'abc' + b'oent' + b'defghi'  # the tag straddles a block boundary
+    assert list(rscan(io.BytesIO(buf), len(buf), b'oent')) == [3]
+
+
+def test_parse_track():
+    rec = parse_track(payload(synth.track(7, 'Björk', 'Jóga 🎧', deck=2, album='Homogenic', genre='Pop')))
+    assert (rec.row, rec.artist, rec.title, rec.album, rec.genre, rec.deck) == \
+        (7, 'Björk', 'Jóga 🎧', 'Homogenic', 'Pop', 2)
+    assert rec.playing
+
+
+def test_parse_states():
+    assert not parse_track(payload(synth.track(1, 'A', 'T', playtime=200))).playing  # ejected
+    assert not parse_track(payload(synth.track(1, 'A', 'T', loaded=True))).playing
+    assert not parse_track(payload(synth.track(1, 'A', 'T', played=False))).playing
+
+
+def test_parse_odd_length_utf16():
+    adat = synth.field(synth.F_ARTIST, 'AB'.encode('utf-16-be') + b'\x00') + \
+        synth.text(synth.F_TITLE, 'T')
+    rec = parse_track(synth.chunk(b'adat', adat))
+    assert rec.artist.startswith('AB') and rec.title == 'T'
+
+
+def test_parse_unknown_tags():
+    adat = synth.field(999, b'\x01\x02\x03') + synth.text(synth.F_ARTIST, 'A') + \
+        synth.field(12345, b'') + synth.text(synth.F_TITLE, 'T')
+    rec = parse_track(synth.chunk(b'zzzz', b'\xff' * 5) + synth.chunk(b'adat', adat))
+    assert (rec.artist, rec.title) == ('A', 'T')
+
+
+def test_parse_truncated_field():
+    adat = synth.text(synth.F_ARTIST, 'A') + synth.text(synth.F_TITLE, 'Title')[:-4]
+    rec = parse_track(synth.chunk(b'adat', adat))
+    assert rec.artist == 'A' and rec.title.startswith('Tit')
+
+
+def test_reader_incremental(tmp_path):
+    path = str(tmp_path / '1.session')
+    reader = SessionReader()
+    with open(path, 'wb') as f:
+        f.write(synth.header())
+    assert reader.last_chunk(path) is None
+
+    two = synth.track(2, 'B', 'U')
+    with open(path, 'ab') as f:
+        f.write(synth.track(1, 'A', 'T') + two[:10])  # Serato half way through the second one
+    assert reader.decode(path, reader.last_chunk(path)).artist == 'A'
+    with open(path, 'ab') as f:
+        f.write(two[10:])
+    assert reader.decode(path, reader.last_chunk(path)).artist == 'B'
+
+
+def test_reader_truncated_file(tmp_path):
+    path = str(tmp_path / '1.session')
+    reader = SessionReader()
+    with open(path, 'wb') as f:
+        f.write(synth.session(5))
+    assert reader.decode(path, reader.last_chunk(path)).row == 5
+    with open(path, 'wb') as f:  # a new session over the same path
+        f.write(synth.header() + synth.track(1, 'A', 'T'))
+    assert reader.decode(path, reader.last_chunk(path)).artist == 'A'
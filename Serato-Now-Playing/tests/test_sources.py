@@ -0,0 +1,97 @@
+'''
+Extra sources: the shared lookup and dedupe, and the write delay through the Engine.
+'''
+
+import configparser
+import os
+from time import sleep
+
+from benchmarks import synth
+from engine import Timers
+from history import PlayHistory
+from session import TrackRecord
+from sources import Engine, SourceConf, fresh, played, readsources
+from template import Template
+from tests.conftest import play, wait
+
+TPL = Template('{artist} - {title}')
+
+
+class Sink:
+    def __init__(self, conf):
+        self.path = conf.file
+        self.texts = []
+
+    def write(self, text, rec=None):
+        self.texts.append(text)
+
+
+def library(tmp):
+    directory = os.path.join(str(tmp), 'History', 'Sessions')
+    os.makedirs(directory)
+    session = os.path.join(directory, '1.session')
+    with open(session, 'wb') as f:
+        f.write(synth.header())
+    return directory, session
+
+
+def run(tmp, delay):
+    directory, session = library(tmp)
+    sinks = []
+
+    def getsinks(conf):
+        sinks.append(Sink(conf))
+        return sinks[-1:]
+    engine = Engine(getsinks, Timers())
+    engine.configure([SourceConf('booth', True, directory, '', 'out.txt', '', '', 10.0, TPL, TPL, delay=delay)])
+    engine.start()
+    return engine, session, sinks[0]
+
+
+def test_publish(tmp_path):
+    engine, session, sink = run(tmp_path, 0)
+    try:
+        play(session, 1, 'A', 'T')
+        wait(lambda: sink.texts == ['A - T'])
+    finally:
+        engine.stop()
+
+
+def test_delay_supersedes(tmp_path):
+    engine, session, sink = run(tmp_path, 0.5)
+    try:
+        play(session, 1, 'A', 'T')
+        wait(lambda: engine.sources[0].pending is not None)
+        play(session, 2, 'B', 'U')
+        wait(lambda: sink.texts, 3)
+        sleep(0.6)
+        assert sink.texts == ['B - U']  # A was still waiting when B came up
+    finally:
+        engine.stop()
+
+
+def test_readsources():
+    cparser = configparser.ConfigParser()
+    cparser.read_dict({'Source local': {'libpath': '/music/_Serato_', 'delay': '3'},
+                       'Source remote': {'local': 'False', 'url': 'https://serato.com/playlists/x/live'}})
+    local, remote = readsources(cparser, 10.0, TPL, TPL, delay=1.5)
+    assert local.directory.endswith(os.path.join('History', 'Sessions')) and local.delay == 3
+    assert remote.directory == '' and remote.delay == 1.5
+
+    engine = Engine(lambda conf: [])
+    engine.configure([local, remote])
+    assert engine.sources[0].library is not None
+    assert engine.sources[1].library is None
+
+
+def test_fresh():
+    history = PlayHistory()
+    a, b = TrackRecord('A', 'T'), TrackRecord('B', 'U')
+    assert fresh(history, a, 30)
+    played(history, a)
+    played(history, a)
+    assert len(history) == 1
+    assert fresh(history, a, 30)  # the current track, rendered again
+    played(history, b)
+    assert not fresh(history, a, 30)
+    assert fresh(history, a, 0)
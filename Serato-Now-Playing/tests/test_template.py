@@ -0,0 +1,63 @@
+'''
+Templates, and the legacy prefix/suffix format matching what the settings used to produce.
+'''
+
+import itertools
+
+import pytest
+
+from session import TrackRecord
+from template import Template, TemplateError, legacy
+
+AFFIXES = ('', ' ', 'by ', ' |', '[', ']', '{', '}', '|', '[[', '\\n', '\\', '"')
+
+
+def baseline(artist, title, a_pref, a_suff, s_pref, s_suff, quote, multi):  # gettrack() before templates
+    artist = a_pref + artist + a_suff if artist else ''
+    if not title:
+        song = ''
+    elif quote:
+        song = s_pref + '"' + title + '"' + s_suff
+    else:
+        song = s_pref + title + s_suff
+    if multi:
+        return artist + '\n' + song
+    if song == '' or artist == '':
+        return artist + song
+    return artist + ' - ' + song
+
+
+def track(artist, title):
+    rec = TrackRecord()
+    rec.artist, rec.title = artist, title
+    return rec
+
+
+@pytest.mark.parametrize('quote,multi', list(itertools.product((0, 1), repeat=2)))
+def test_legacy_matches_baseline(quote, multi):
+    for pref, suff in itertools.product(AFFIXES, repeat=2):
+        for artist, title in (('A', 'T'), ('A', ''), ('', 'T')):
+            for a_pref, a_suff, s_pref, s_suff in ((pref, suff, '', ''), ('', '', pref, suff),
+                                                   (pref, suff, pref, suff)):
+                tpl = legacy(a_pref, a_suff, s_pref, s_suff, quote, multi)
+                assert tpl.render(track(artist, title)) == \
+                    baseline(artist, title, a_pref, a_suff, s_pref, s_suff, quote, multi)
+
+
+def test_legacy_equality():
+    assert legacy('[', ']', '', '', 1, 0) == legacy('[', ']', '', '', 1, 0)
+    assert legacy('[', ']', '', '', 1, 0) != legacy('[', ']', '', '', 1, 1)
+    assert legacy('', '', '', '', 0, 0).fields == ['artist', 'title']
+
+
+def test_groups_and_literals():
+    tpl = Template('[{artist} - {title}|{artist}|{title}] [[{album}]] {{x}} a||b\\nend')
+    assert tpl.render(track('A', 'T')) == 'A - T [] {x} a|b\nend'
+    assert tpl.render(track('', 'T')) == 'T [] {x} a|b\nend'
+    assert tpl.render(track('', '')) == ' [] {x} a|b\nend'
+
+
+@pytest.mark.parametrize('source', ['{artist', '[{artist}', '[[{artist}]', '{bad name}', '[a[b]]', 'a}', '{artst} - {title}'])
+def test_errors(source):
+    with pytest.raises(TemplateError):
+        Template(source)
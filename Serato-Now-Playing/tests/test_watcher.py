@@ -0,0 +1,88 @@
+'''
+InotifyWatcher, and how the Engine keeps one for its whole life.
+'''
+
+import os
+import sys
+import threading
+
+import pytest
+
+import sources
+from engine import Timers
+from sources import Engine, SourceConf
+from template import Template
+from tests.conftest import play, wait
+from watcher import InotifyWatcher
+
+pytestmark = pytest.mark.skipif(not sys.platform.startswith('linux'), reason='inotify is Linux only')
+TPL = Template('{artist} - {title}')
+
+
+def test_wakes_on_write(tmp_path):
+    watcher = InotifyWatcher(str(tmp_path), timeout=5)
+    try:
+        threading.Timer(0.05, lambda: (tmp_path / '1.session').write_bytes(b'x')).start()
+        assert watcher.wait()
+        assert watcher.changed == {str(tmp_path)}
+    finally:
+        watcher.close()
+
+
+def test_interrupt_after_close(tmp_path):
+    watcher = InotifyWatcher(str(tmp_path))
+    watcher.close()
+    out = str(tmp_path / 'np.txt')
+    files = [open(out, 'wb') for _ in range(4)]  # likely reusing the closed descriptor numbers
+    try:
+        watcher.interrupt()
+        watcher.close()
+    finally:
+        for f in files:
+            f.close()
+    assert os.path.getsize(out) == 0
+
+
+def test_deleted_folder_reported(tmp_path):
+    folder = tmp_path / 'Sessions'
+    folder.mkdir()
+    watcher = InotifyWatcher(timeout=5)
+    try:
+        watcher.add(str(folder))
+        folder.rmdir()
+        assert watcher.wait()
+        assert str(folder) in watcher.changed and watcher.watching() == set()
+    finally:
+        watcher.close()
+
+
+def test_engine_adds_folder_once_it_appears(tmp_path, monkeypatch):
+    monkeypatch.setattr(sources, 'WATCH_TIMEOUT', 0.1)
+    directory = str(tmp_path / '_Serato_' / 'History' / 'Sessions')
+    written = []
+
+    class Sink:
+        path = 'test'
+
+        def write(self, text, rec=None):
+            written.append(text)
+    engine = Engine(lambda conf: [Sink()], Timers())
+    engine.configure([SourceConf('booth', True, directory, '', 'out.txt', '', '', 10.0, TPL, TPL)])
+    engine.start()
+    try:
+        watcher = engine.watcher
+        os.makedirs(directory)
+        wait(lambda: directory in watcher.watching())
+        assert engine.watcher is watcher  # added to, never rebuilt
+        session = os.path.join(directory, '1.session')
+        play(session, 1, 'A', 'T')
+        wait(lambda: written == ['A - T'])
+    finally:
+        engine.stop()
+
+
+def test_submit_after_stop():
+    engine = Engine(lambda conf: [], Timers())
+    engine.start()
+    engine.stop()
+    engine.submit(print, 'never')  # e.g. a delay running out during shutdown: dropped, no RuntimeError
@@ -0,0 +1,537 @@
+'''
+Tray icon and settings window. Only this module imports Qt; the headless entry
+point never loads it.
+
+The core calls its notifiers from the poller and timer threads, and Qt widgets
+may only be touched from the main thread. Bus carries such events across: post()
+from any thread stores the event and, unless one of its kind is already waiting,
+queues a signal to the main thread, where the newest event of each kind is handed
+to its handler. A burst of track changes shows one notification, the latest, and
+the poller never waits on the event loop.
+'''
+
+import os
+import sys
+import threading
+from time import localtime, strftime
+from PyQt5.QtCore import QObject, Qt, pyqtSignal
+from PyQt5.QtWidgets import QApplication, QSystemTrayIcon, QMenu, QAction, QLabel, QRadioButton, QScrollArea, \
+    QVBoxLayout, QHBoxLayout, QCheckBox, QPushButton, QLineEdit, QFileDialog, QWidget, QFrame
+from PyQt5.QtGui import QIcon, QFont
+from template import DEFAULT_NOTIF, Template, TemplateError
+import nowplaying as core
+
+# define global variables
+ini = 0
+app = win = tray = bus = None
+RECENT_ITEMS = 10  # tracks listed in the tray's Recently Played menu
+ico = os.path.abspath(os.path.join(core.bundle_dir, "bin/icon.ico"))
+
+
+class SettingsUI:  # create settings form window
+    def __init__(self, store, icn):
+        self.store = store
+        self.icon = icn
+        self.scroll = QScrollArea()
+        self.window = QWidget()
+        self.separator = QFrame()
+        self.scroll.setWindowIcon(QIcon(icn))
+        self.layoutV = QVBoxLayout()
+        self.layoutH0 = QHBoxLayout()
+        self.layoutH0a = QHBoxLayout()
+        self.layoutH1 = QHBoxLayout()
+        self.layoutH2 = QHBoxLayout()
+        self.layoutH3 = QHBoxLayout()
+        self.layoutH4 = QHBoxLayout()
+        self.layoutH5 = QHBoxLayout()
+        self.layoutH6a = QHBoxLayout()
+        self.layoutH6b = QHBoxLayout()
+        self.layoutH6c = QHBoxLayout()
+        self.layoutH6d = QHBoxLayout()
+        self.layoutH7 = QHBoxLayout()
+        self.layoutH8 = QHBoxLayout()
+        self.fBold = QFont()
+        self.fBold.setBold(True)
+        self.scroll.setWindowTitle('Now Playing v1.4.0 - Settings')
+
+        self.scroll.setWidgetResizable(True)
+        self.scroll.setWindowFlag(Qt.CustomizeWindowHint, True)
+        self.scroll.setWindowFlag(Qt.WindowCloseButtonHint, False)
+        # self.scroll.setWindowFlag(Qt.WindowMinMaxButtonsHint, False)
+        self.scroll.setWindowFlag(Qt.WindowMinimizeButtonHint, False)
+        self.scroll.setWidget(self.window)
+        self.scroll.setMinimumWidth(625)
+        self.scroll.resize(625, 825)
+
+        # error section
+        self.errLabel = QLabel()
+        self.errLabel.setStyleSheet('color: red')
+        # remote
+        self.localLabel = QLabel('Track Retrieval Mode')
+        self.localLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.localLabel)
+        self.remoteDesc = QLabel('Local mode (default) uses Serato\'s local history log for track data.\
+\nRemote mode retrieves remote track data from Serato Live Playlists.')
+        self.remoteDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.remoteDesc)
+        # radios
+        self.localRadio = QRadioButton('Local')
+        self.localRadio.setChecked(True)
+        self.localRadio.toggled.connect(lambda: self.on_radiobutton_select(self.localRadio))
+        self.localRadio.setMaximumWidth(60)
+
+        self.remoteRadio = QRadioButton('Remote')
+        self.remoteRadio.toggled.connect(lambda: self.on_radiobutton_select(self.remoteRadio))
+        self.layoutH0.addWidget(self.localRadio)
+        self.layoutH0.addWidget(self.remoteRadio)
+        self.layoutV.addLayout(self.layoutH0)
+
+        # library path
+        self.libLabel = QLabel('Serato Library Path')
+        self.libLabel.setFont(self.fBold)
+        self.libDesc = QLabel('Location of Serato library folder.\ni.e., \\THE_PATH_TO\\_Serato_')
+        self.libDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.libLabel)
+        self.layoutV.addWidget(self.libDesc)
+        self.libButton = QPushButton('Browse for folder')
+        self.layoutH0a.addWidget(self.libButton)
+        self.libButton.clicked.connect(self.on_libbutton_clicked)
+        self.libEdit = QLineEdit()
+        self.layoutH0a.addWidget(self.libEdit)
+        self.layoutV.addLayout(self.layoutH0a)
+        # url
+        self.urlLabel = QLabel('URL')
+        self.urlLabel.setFont(self.fBold)
+        self.urlDesc = QLabel('Web address of your Serato Playlist.\ne.g., https://serato.com/playlists/USERNAME/live')
+        self.urlDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.urlLabel)
+        self.urlEdit = QLineEdit()
+        self.layoutV.addWidget(self.urlDesc)
+        self.layoutV.addWidget(self.urlEdit)
+        self.urlLabel.setHidden(True)
+        self.urlEdit.setHidden(True)
+        self.urlDesc.setHidden(True)
+        # separator line
+        self.separator.setFrameShape(QFrame.HLine)
+        # self.separator.setFrameShadow(QFrame.Sunken)
+        self.layoutV.addWidget(self.separator)
+        # file
+        self.fileLabel = QLabel('File')
+        self.fileLabel.setFont(self.fBold)
+        self.fileDesc = QLabel('The file to which current track info is written. (Must be plain text: .txt)')
+        self.fileDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.fileLabel)
+        self.layoutV.addWidget(self.fileDesc)
+        self.fileButton = QPushButton('Browse for file')
+        self.layoutH1.addWidget(self.fileButton)
+        self.fileButton.clicked.connect(self.on_filebutton_clicked)
+        self.fileEdit = QLineEdit()
+        self.layoutH1.addWidget(self.fileEdit)
+        self.layoutV.addLayout(self.layoutH1)
+        # interval
+        self.intervalLabel = QLabel('Polling Interval')
+        self.intervalLabel.setFont(self.fBold)
+        self.intervalDesc = QLabel('Amount of time, in seconds, \
+that must elapse before checking for new track info. (Default = 10.0)')
+        self.intervalDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.intervalLabel)
+        self.layoutV.addWidget(self.intervalDesc)
+        self.intervalEdit = QLineEdit()
+        self.intervalEdit.setMaximumSize(40, 35)
+        self.layoutV.addWidget(self.intervalEdit)
+        self.intervalLabel.setHidden(True)
+        self.intervalDesc.setHidden(True)
+        self.intervalEdit.setHidden(True)
+        # delay
+        self.delayLabel = QLabel('Write Delay')
+        self.delayLabel.setFont(self.fBold)
+        self.delayDesc = QLabel('Amount of time, in seconds, \
+to delay writing the new track info once it\'s retrieved. (Default = 0)')
+        self.delayDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.delayLabel)
+        self.layoutV.addWidget(self.delayDesc)
+        self.delayEdit = QLineEdit()
+        self.delayEdit.setMaximumWidth(40)
+        self.layoutV.addWidget(self.delayEdit)
+        # multi-line
+        self.multiLabel = QLabel('Multiple Line Indicator')
+        self.multiLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.multiLabel)
+        self.multiCbox = QCheckBox()
+        self.multiCbox.setMaximumWidth(25)
+        self.layoutH2.addWidget(self.multiCbox)
+        self.multiDesc = QLabel('Write Artist and Song \
+data on separate lines.')
+        self.multiDesc.setStyleSheet('color: grey')
+        self.layoutH2.addWidget(self.multiDesc)
+        self.layoutV.addLayout(self.layoutH2)
+        # quotes
+        self.quoteLabel = QLabel('Song Quote Indicator')
+        self.quoteLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.quoteLabel)
+        self.quoteCbox = QCheckBox()
+        self.quoteCbox.setMaximumWidth(25)
+        self.layoutH3.addWidget(self.quoteCbox)
+        self.quoteDesc = QLabel('Surround the song title \
+with quotes.')
+        self.quoteDesc.setStyleSheet('color: grey')
+        self.layoutH3.addWidget(self.quoteDesc)
+        self.layoutV.addLayout(self.layoutH3)
+        # prefixes
+        self.prefixLabel = QLabel('Prefixes')
+        self.prefixLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.prefixLabel)
+        self.a_prefixDesc = QLabel('Artist - String to be written before artist info.')
+        self.a_prefixDesc.setStyleSheet('color: grey')
+        self.s_prefixDesc = QLabel('Song - String to be written before song info.')
+        self.s_prefixDesc.setStyleSheet('color: grey')
+        self.layoutH6a.addWidget(self.a_prefixDesc)
+        self.layoutH6a.addWidget(self.s_prefixDesc)
+        self.a_prefixEdit = QLineEdit()
+        self.s_prefixEdit = QLineEdit()
+        self.layoutH6b.addWidget(self.a_prefixEdit)
+        self.layoutH6b.addWidget(self.s_prefixEdit)
+        self.layoutV.addLayout(self.layoutH6a)
+        self.layoutV.addLayout(self.layoutH6b)
+        # suffixes
+        self.suffixLabel = QLabel('Suffixes')
+        self.suffixLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.suffixLabel)
+        self.a_suffixDesc = QLabel('Artist - String to be written after artist info.')
+        self.a_suffixDesc.setStyleSheet('color: grey')
+        self.s_suffixDesc = QLabel('Song - String to be written after song info.')
+        self.s_suffixDesc.setStyleSheet('color: grey')
+        self.layoutH6c.addWidget(self.a_suffixDesc)
+        self.layoutH6c.addWidget(self.s_suffixDesc)
+        self.a_suffixEdit = QLineEdit()
+        self.s_suffixEdit = QLineEdit()
+        self.layoutH6d.addWidget(self.a_suffixEdit)
+        self.layoutH6d.addWidget(self.s_suffixEdit)
+        self.layoutV.addLayout(self.layoutH6c)
+        self.layoutV.addLayout(self.layoutH6d)
+        # templates
+        self.templateLabel = QLabel('Templates')
+        self.templateLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.templateLabel)
+        self.templateDesc = QLabel('Fields: {artist} {title} {album} {genre} {deck}.  [a|b] shows the first \
+part whose fields are all set.\n\\n starts a new line.  e.g., [{artist} - "{title}"|{title}]')
+        self.templateDesc.setStyleSheet('color: grey')
+        self.layoutV.addWidget(self.templateDesc)
+        self.templateText = QLabel('File')
+        self.templateText.setMinimumWidth(75)
+        self.layoutH7.addWidget(self.templateText)
+        self.templateEdit = QLineEdit()
+        self.templateEdit.setPlaceholderText('Blank uses the prefixes, suffixes, quotes and multiple line options')
+        self.layoutH7.addWidget(self.templateEdit)
+        self.layoutV.addLayout(self.layoutH7)
+        self.notifTemplateText = QLabel('Notification')
+        self.notifTemplateText.setMinimumWidth(75)
+        self.layoutH8.addWidget(self.notifTemplateText)
+        self.notifTemplateEdit = QLineEdit()
+        self.notifTemplateEdit.setPlaceholderText(DEFAULT_NOTIF)
+        self.layoutH8.addWidget(self.notifTemplateEdit)
+        self.layoutV.addLayout(self.layoutH8)
+        # notify
+        self.notifLabel = QLabel('Notification Indicator')
+        self.notifLabel.setFont(self.fBold)
+        self.layoutV.addWidget(self.notifLabel)
+        self.notifCbox = QCheckBox()
+        self.notifCbox.setMaximumWidth(25)
+        self.layoutH5.addWidget(self.notifCbox)
+        self.notifDesc = QLabel('Show OS system notification \
+when new song is retrieved.')
+        self.notifDesc.setStyleSheet('color: grey')
+        self.layoutH5.addWidget(self.notifDesc)
+        self.layoutV.addLayout(self.layoutH5)
+        # error area
+        self.layoutV.addWidget(self.errLabel)
+        # cancel btn
+        self.cancelButton = QPushButton('Cancel')
+        self.cancelButton.setMaximumSize(80, 35)
+        self.layoutH4.addWidget(self.cancelButton)
+        self.cancelButton.clicked.connect(self.on_cancelbutton_clicked)
+        # save btn
+        self.saveButton = QPushButton('Save')
+        self.saveButton.setMaximumSize(80, 35)
+        self.layoutH4.addWidget(self.saveButton)
+        self.saveButton.clicked.connect(self.on_savebutton_clicked)
+        self.layoutV.addLayout(self.layoutH4)
+
+        self.window.setLayout(self.layoutV)
+
+    def upd_win(self):
+        c = self.store.saved()  # command line overrides are for this run only, never saved
+        if c.local:
+            self.localRadio.setChecked(True)
+            self.remoteRadio.setChecked(False)
+        else:
+            self.localRadio.setChecked(False)
+            self.remoteRadio.setChecked(True)
+        self.libEdit.setText(c.libpath)
+        self.urlEdit.setText(c.url)
+        self.fileEdit.setText(c.file)
+        self.intervalEdit.setText(str(c.interval))
+        self.delayEdit.setText(str(c.delay))
+        self.multiCbox.setChecked(c.multi)
+        self.quoteCbox.setChecked(c.quote)
+        self.a_prefixEdit.setText(c.a_pref)
+        self.a_suffixEdit.setText(c.a_suff)
+        self.s_prefixEdit.setText(c.s_pref)
+        self.s_suffixEdit.setText(c.s_suff)
+        self.notifCbox.setChecked(c.notif)
+        self.templateEdit.setText(c.template)
+        self.notifTemplateEdit.setText(c.notif_template)
+
+    def upd_conf(self):
+
+        local = str(self.localRadio.isChecked())
+        libpath = self.libEdit.text()
+        url = self.urlEdit.text()
+        file = self.fileEdit.text()
+        interval = self.intervalEdit.text()
+        delay = self.delayEdit.text()
+        multi = str(self.multiCbox.isChecked())
+        quote = str(self.quoteCbox.isChecked())
+        a_pref = self.a_prefixEdit.text().replace(" ", "|_0")
+        a_suff = self.a_suffixEdit.text().replace(" ", "|_0")
+        s_pref = self.s_prefixEdit.text().replace(" ", "|_0")
+        s_suff = self.s_suffixEdit.text().replace(" ", "|_0")
+        notif = str(self.notifCbox.isChecked())
+        template = self.templateEdit.text().replace(" ", "|_0")
+        notif_template = self.notifTemplateEdit.text().replace(" ", "|_0")
+
+        c = self.store.saved()
+        c.put(local, libpath, url, file, interval, delay, multi, quote, a_pref, a_suff, s_pref, s_suff, notif,
+              template, notif_template)
+        self.store.reload()
+
+    # radio button action
+    def on_radiobutton_select(self, b):
+        if b.text() == 'Local':
+            self.urlLabel.setHidden(True)
+            self.urlEdit.setHidden(True)
+            self.urlDesc.setHidden(True)
+            self.intervalLabel.setHidden(True)
+            self.intervalDesc.setHidden(True)
+            self.intervalEdit.setHidden(True)
+            self.libLabel.setHidden(False)
+            self.libEdit.setHidden(False)
+            self.libDesc.setHidden(False)
+            self.libButton.setHidden(False)
+            self.window.hide()
+            self.errLabel.setText('')
+            self.window.show()
+        else:
+            self.urlLabel.setHidden(False)
+            self.urlEdit.setHidden(False)
+            self.urlDesc.setHidden(False)
+            self.intervalLabel.setHidden(False)
+            self.intervalDesc.setHidden(False)
+            self.intervalEdit.setHidden(False)
+            self.libLabel.setHidden(True)
+            self.libEdit.setHidden(True)
+            self.libDesc.setHidden(True)
+            self.libButton.setHidden(True)
+            self.window.hide()
+            self.errLabel.setText('')
+            self.window.show()
+
+    # file button action
+    def on_filebutton_clicked(self):
+        filename = QFileDialog.getOpenFileName(self.window, 'Open file', '.', '*.txt')
+        if filename:
+            self.fileEdit.setText(filename[0])
+
+    # file button action
+    def on_libbutton_clicked(self):
+        libdir = QFileDialog.getExistingDirectory(self.window, 'Select directory')
+        if libdir:
+            self.libEdit.setText(libdir)
+
+    # cancel button action
+    def on_cancelbutton_clicked(self):
+        tray.actConfig.setEnabled(True)
+        self.upd_win()
+        self.close()
+        self.errLabel.setText('')
+
+    # save button action
+    def on_savebutton_clicked(self):
+        if self.remoteRadio.isChecked():
+            if 'https://serato.com/playlists' not in self.urlEdit.text() and \
+                    'https://www.serato.com/playlists' not in self.urlEdit.text() or \
+                    len(self.urlEdit.text()) < 30:
+                self.errLabel.setText('* URL is invalid')
+                self.window.hide()
+                self.window.show()
+                return
+
+        if self.localRadio.isChecked():
+            if '_Serato_' not in self.libEdit.text():
+                self.errLabel.setText('* Serato Library Path is required.  Should point to "_Serato_" folder')
+                self.window.hide()
+                self.window.show()
+                return
+
+        if self.fileEdit.text() == "":
+            self.errLabel.setText('* File is required')
+            self.window.hide()
+            self.window.show()
+            return
+
+        for edit in (self.templateEdit, self.notifTemplateEdit):
+            try:
+                Template(edit.text())
+            except TemplateError as e:
+                self.errLabel.setText('* ' + str(e))
+                self.window.hide()
+                self.window.show()
+                return
+
+        self.upd_conf()
+        self.close()
+        self.errLabel.setText('')
+
+        global ini
+        if ini == 0:
+            ini = 1
+            tray.actPause.setText('Pause')
+            tray.actPause.setEnabled(True)
+            core.start()
+
+    def show(self):
+        tray.actConfig.setEnabled(False)
+        self.upd_win()
+        self.scroll.show()
+        self.scroll.setFocus()
+
+    def close(self):
+        tray.actConfig.setEnabled(True)
+        self.scroll.hide()
+
+    def exit(self):
+        self.scroll.close()
+
+
+class Bus(QObject):  # coalescing hand-off from any thread to handlers on the Qt main thread
+    waiting = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()  # lives on the thread that creates it: build() runs on the main thread
+        self.lock = threading.Lock()
+        self.handlers = {}  # kind -> handler(value), called on the main thread
+        self.pending = {}  # kind -> newest value not handled yet
+        self.waiting.connect(self._deliver, Qt.QueuedConnection)
+
+    def on(self, kind, handler):
+        self.handlers[kind] = handler
+
+    def post(self, kind, value):  # any thread; returns at once
+        with self.lock:
+            queued = bool(self.pending)
+            self.pending[kind] = value  # replaces an older one still waiting
+        if not queued:
+            self.waiting.emit()
+
+    def poster(self, kind):  # callable(value) posting kind, e.g. for core.notifiers
+        return lambda value: self.post(kind, value)
+
+    def _deliver(self):  # main thread
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        for kind, value in pending.items():
+            handler = self.handlers.get(kind)
+            if handler is not None:
+                handler(value)
+
+
+class Tray:  # create tray icon menu
+    def __init__(self, ):
+        # create systemtray UI
+        self.icon = QIcon(ico)
+        self.tray = QSystemTrayIcon()
+        self.tray.setIcon(self.icon)
+        self.tray.setToolTip("Now Playing ▶")
+        self.tray.setVisible(True)
+        self.menu = QMenu()
+
+        # create systemtray options and actions
+        self.actTitle = QAction("Now Playing v1.4")
+        self.menu.addAction(self.actTitle)
+        self.actTitle.setEnabled(False)
+
+        self.actConfig = QAction("Settings")
+        self.actConfig.triggered.connect(win.show)
+        self.menu.addAction(self.actConfig)
+
+        self.recentMenu = QMenu("Recently Played")
+        self.recentMenu.aboutToShow.connect(self.showrecent)
+        self.menu.addMenu(self.recentMenu)
+        self.menu.addSeparator()
+
+        self.actPause = QAction()
+        self.actPause.triggered.connect(self.togglepause)
+        self.menu.addAction(self.actPause)
+        self.actPause.setEnabled(False)
+
+        self.actExit = QAction("Exit")
+        self.actExit.triggered.connect(self.cleanquit)
+        self.menu.addAction(self.actExit)
+
+        # add menu to the systemtray UI
+        self.tray.setContextMenu(self.menu)
+
+    def showrecent(self):  # fill the submenu from the play history as it opens
+        self.recentMenu.clear()
+        plays = core.history.recent(RECENT_ITEMS)
+        if not plays:
+            self.recentMenu.addAction("Nothing yet").setEnabled(False)
+        for play in plays:
+            name = ' - '.join(x for x in (play.artist, play.title) if x)
+            self.recentMenu.addAction(strftime('%H:%M', localtime(play.time)) + '  ' + name).setEnabled(False)
+
+    def togglepause(self):
+        if core.paused():
+            self.unpause()
+        else:
+            self.pause()
+
+    def unpause(self):  # unpause polling
+        core.resume()
+        self.actPause.setText('Pause')
+
+    def pause(self):  # pause polling
+        core.pause()
+        self.actPause.setText('Resume')
+
+    def cleanquit(self):  # quit app and cleanup
+        self.tray.setVisible(False)
+        core.shutdown()
+        sys.exit()
+
+    def notify(self, tip):  # main thread only; other threads go through the bus
+        self.tray.showMessage('Now Playing ▶ ', tip, 0)
+
+
+def build():  # create the application, settings window and tray icon
+    global app, win, tray, bus
+    app = QApplication(sys.argv[:1])
+    app.setQuitOnLastWindowClosed(False)
+    win = SettingsUI(core.confstore, ico)
+    tray = Tray()
+    bus = Bus()
+    bus.on('notify', tray.notify)
+    core.notifiers.append(bus.poster('notify'))
+
+
+def init():  # initiate main processes
+    global ini
+    conf = core.confstore.get()
+    core.init()
+    if conf.file == '':
+        win.show()
+    else:
+        ini = 1
+        tray.actPause.setText('Pause')
+        tray.actPause.setEnabled(True)
+        core.start()
@@ -0,0 +1,216 @@
+'''
+Wake the local-mode poller when Serato writes to History/Sessions.
+
+On Linux this uses inotify (through ctypes, so there is nothing extra to install) and
+blocks until a session file is written to. Everywhere else, or if inotify can't be
+set up (e.g. the folder doesn't exist yet), PollWatcher keeps the old fixed-step
+polling behaviour.
+
+Remote mode has nothing to watch, so PollWatcher waits out a Cadence instead of a
+fixed interval. The Cadence learns how long tracks last from the times the poller
+saw the playlist change. It checks rarely early in a track and more often around
+the lengths seen before, between the configured min and max step.
+'''
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import threading
+from bisect import bisect_left
+from collections import deque
+from math import sqrt
+from time import monotonic
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_IGNORED = 0x00008000  # watch removed, e.g. its folder was deleted
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEAD = struct.Struct('iIII')  # wd, mask, cookie, name length
+
+# Cadence
+LEARN = 3  # track lengths seen before the step adapts; until then it's the fixed interval
+KEEP = 24  # most recent track lengths the step goes by
+LONGEST = 20 * 60  # seconds; a longer gap between changes is a break, not a track
+BANDWIDTH = 0.25  # share of the typical length over which track ends are averaged
+
+
+class Cadence:  # remote polling step learned from how long tracks have been lasting
+    def __init__(self, interval, low, high):
+        self.interval = interval  # step while there's too little to go by
+        self.low = low
+        self.high = high
+        self.lengths = deque(maxlen=KEEP)
+        self.sorted = []
+        self.last = None  # monotonic time of the last change
+
+    def changed(self, now, tracks=1):  # a poll at now found tracks new ones; 0: a track already playing
+        if not tracks:
+            if self.last is None:  # the first page, or the same one again after a reset
+                self.last = now
+            return
+        if self.last is not None and now - self.last <= LONGEST * tracks:
+            self.lengths.extend([(now - self.last) / tracks] * tracks)  # missed ones get an even share
+            self.sorted = sorted(self.lengths)
+        self.last = now
+
+    def step(self, now):  # seconds to wait before the next poll
+        n = len(self.sorted)
+        if n < LEARN:
+            return self.interval
+        elapsed = now - self.last
+        typical = self.sorted[n // 2]
+        width = max(self.low, typical * BANDWIDTH)
+        lo, mid, hi = (bisect_left(self.sorted, t) for t in (elapsed - width, elapsed, elapsed + width))
+        if mid == n:  # longer than any track so far, e.g. a long mix: the plain interval again
+            return self.interval
+        hazard = (hi - lo) / (2 * width) / (n - mid)  # chance per second that this track ends now
+        # spacing checks by 1/sqrt(hazard) gets the least latency for the requests spent;
+        # scaled so that a track as likely to end at any moment gets the configured interval
+        step = self.interval / sqrt(hazard * typical) if hazard else self.high
+        return max(self.low, min(self.high, step))
+
+
+class PollWatcher:  # fallback: wait a fixed step between checks, or one a Cadence sets
+    def __init__(self, directory, step=1, cadence=None):
+        self.directory = directory
+        self.step = step
+        self.cadence = cadence
+        self.changed = set()  # never filled: without events, callers go by their own timers
+        self._wake = threading.Event()
+
+    def wait(self, timeout=None):  # always reports a possible change
+        step = self.step if self.cadence is None else self.cadence.step(monotonic())
+        self._wake.wait(step if timeout is None else min(step, timeout))
+        self._wake.clear()
+        return True
+
+    def interrupt(self):  # cut a pending wait() short, from any thread
+        self._wake.set()
+
+    def watching(self):  # nothing: see InotifyWatcher.watching
+        return set()
+
+    def close(self):
+        self.interrupt()
+
+
+class InotifyWatcher:  # block until a session file in directory (or any add()ed one) is written
+    mask = IN_MODIFY | IN_CLOSE_WRITE | IN_CREATE | IN_MOVED_TO
+
+    def __init__(self, directory=None, timeout=None):  # directory None: nothing watched until add()
+        self.directory = directory
+        self.timeout = timeout  # default for wait(), so a missed event is never waited on forever
+        self.dirs = {}  # watch descriptor -> directory
+        self.changed = set()  # directories written to during the last wait()
+        self.lock = threading.Lock()  # interrupt() and close() from different threads
+        self.closed = False
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._rwake, self._wwake = os.pipe()  # self-pipe so interrupt() can break the select
+        os.set_blocking(self._rwake, False)
+        os.set_blocking(self._wwake, False)
+        if directory is not None:
+            try:
+                self.add(directory)
+            except OSError:
+                self.close()
+                raise
+
+    def add(self, directory):  # watch another folder through the same descriptor
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), self.mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_add_watch failed', directory)
+        self.dirs[wd] = directory
+
+    def discard(self, directory):  # stop watching a folder add()ed before
+        for wd, watched in list(self.dirs.items()):
+            if watched == directory:
+                del self.dirs[wd]
+                self.libc.inotify_rm_watch(self.fd, wd)
+
+    def watching(self):  # folders still watched; a deleted folder drops out on the next wait()
+        return set(self.dirs.values())
+
+    def wait(self, timeout=None):  # True if a session file was written before timeout
+        if timeout is None:
+            timeout = self.timeout
+        self.changed.clear()
+        while True:
+            ready, _, _ = select.select([self.fd, self._rwake], [], [], timeout)
+            if not ready:
+                return False
+            if self._rwake in ready:
+                self._drain_wake()
+                return False
+            if self._drain():
+                return True
+
+    def interrupt(self):  # cut a pending wait() short, from any thread; a no-op once closed
+        with self.lock:
+            if self.closed:  # the descriptor number may belong to another file by now
+                return
+            try:
+                os.write(self._wwake, b'\0')
+            except BlockingIOError:  # already pending
+                pass
+
+    def _drain_wake(self):
+        try:
+            while os.read(self._rwake, 512):
+                pass
+        except BlockingIOError:
+            pass
+
+    def _drain(self):  # read all queued events, True if any touched a session file
+        # (names starting with a dot, like .DS_Store, don't count)
+        hit = False
+        while True:
+            try:
+                buf = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return hit
+            pos = 0
+            while pos < len(buf):
+                wd, mask, _, length = EVENT_HEAD.unpack_from(buf, pos)
+                pos += EVENT_HEAD.size
+                name = buf[pos:pos + length].rstrip(b'\0')
+                pos += length
+                if mask & IN_IGNORED:  # reported as a change, so the caller notices it's gone
+                    if wd in self.dirs:
+                        self.changed.add(self.dirs.pop(wd))
+                        hit = True
+                elif name and not name.startswith(b'.') and wd in self.dirs:
+                    self.changed.add(self.dirs[wd])
+                    hit = True
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            try:
+                os.write(self._wwake, b'\0')  # wake a wait() still blocked on these descriptors
+            except BlockingIOError:
+                pass
+            os.close(self.fd)
+            os.close(self._rwake)
+            os.close(self._wwake)
+            self.fd = -1
+
+
+def watch(directory, step=1, timeout=None):  # best available watcher for directory
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(directory, timeout)
+        except (OSError, AttributeError):  # no inotify in this libc, or no such folder
+            pass
+    return PollWatcher(directory, step)